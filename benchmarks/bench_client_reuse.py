@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Per-call latency of a fresh httpx AsyncClient versus transport's pooled one.
+
+Each iteration performs what flux_generate does before the first result, on
+the async path the server runs: one submit POST and one get_result poll
+against the local mock BFL server. The pooled case uses the client
+transport.get_async_client() shares per key; the fresh case builds a client
+for the call and closes it afterwards.
+
+Usage:
+    python benchmarks/bench_client_reuse.py [--calls 200]
+
+The mock speaks plain HTTP, so the gap measured here is only TCP setup; against
+api.bfl.ai the fresh-client path additionally pays DNS and a TLS handshake.
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "src"))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from flux_adapter import FluxAdapter
+from transport import aclose_clients, build_async_client
+from mock_bfl import start_mock_server, base_url_for
+
+
+async def one_call(adapter: FluxAdapter) -> float:
+    start = time.perf_counter()
+    payload = adapter._build_payload("benchmark prompt", None, None, adapter.options)
+    resp = await adapter._post_with_retries_async(f"{adapter.base_url}/v1/{adapter.model}", payload)
+    data = resp.json()
+    await adapter.poll_once(data["polling_url"], data["id"])
+    return time.perf_counter() - start
+
+
+async def run(label: str, make_adapter: Callable[[], FluxAdapter], calls: int, close_after: bool) -> List[float]:
+    samples = []
+    for _ in range(calls):
+        adapter = make_adapter()
+        samples.append(await one_call(adapter))
+        if close_after:
+            await adapter.client.aclose()
+    ms = sorted(s * 1000 for s in samples)
+    print(
+        f"{label:<16} p50={statistics.median(ms):7.3f}ms "
+        f"p95={ms[int(len(ms) * 0.95) - 1]:7.3f}ms mean={statistics.fmean(ms):7.3f}ms"
+    )
+    return ms
+
+
+async def bench(base_url: str, calls: int) -> None:
+    common = dict(model="flux-dev", use_raw_mode=False, api_key="bench", base_url=base_url)
+
+    def fresh() -> FluxAdapter:
+        # A client of its own per call, as if the adapter were built per request.
+        return FluxAdapter(client=build_async_client("bench"), **common)
+
+    def pooled() -> FluxAdapter:
+        return FluxAdapter(**common)
+
+    await one_call(pooled())  # warm the pooled connection once, as a running server would be
+    fresh_ms = await run("fresh client", fresh, calls, close_after=True)
+    pooled_ms = await run("pooled client", pooled, calls, close_after=False)
+    saved = statistics.median(fresh_ms) - statistics.median(pooled_ms)
+    print(f"median saving per call: {saved:.3f}ms")
+    await aclose_clients()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    server = start_mock_server()
+    try:
+        asyncio.run(bench(base_url_for(server), args.calls))
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
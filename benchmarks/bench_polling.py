@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Compare the fixed 0.5s poll interval with the adaptive, model-aware schedule.
+
+For each model the mock BFL server holds jobs Pending for a random processing
+time. We report GETs per completed image and the delay between the job
+becoming Ready on the server and the adapter returning it.
+
+Usage:
+    python benchmarks/bench_polling.py [--jobs 40] [--warmup 20]
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "src"))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from flux_adapter import FluxAdapter, GenerationOptions
+from polling import LatencyTracker
+from transport import aclose_clients
+from mock_bfl import start_mock_server, base_url_for
+
+# Processing time ranges (seconds) roughly shaped like the real models.
+MODEL_LATENCY = {
+    "flux-schnell": (0.8, 1.6),
+    "flux-pro-1.1": (4.0, 7.0),
+}
+
+
+async def run_jobs(adapter: FluxAdapter, server, model: str, count: int):
+    options = GenerationOptions(model=model)
+
+    async def one(i: int):
+        _, meta = await adapter.generate(f"bench {model} {i}", options=options)
+        returned = time.monotonic()
+        job = server.jobs[meta["request_id"]]
+        return job["polls"], returned - job["ready_at"]
+
+    return await asyncio.gather(*[one(i) for i in range(count)])
+
+
+async def bench(label: str, adaptive: bool, args, server, base_url: str) -> None:
+    adapter = FluxAdapter(
+        model="flux-pro-1.1",
+        use_raw_mode=False,
+        api_key="bench",
+        base_url=base_url,
+        adaptive_polling=adaptive,
+        tracker=LatencyTracker(),
+    )
+    for model in MODEL_LATENCY:
+        await run_jobs(adapter, server, model, args.warmup)
+        results = await run_jobs(adapter, server, model, args.jobs)
+        polls = [p for p, _ in results]
+        lag_ms = sorted(lag * 1000 for _, lag in results)
+        print(
+            f"{label:<9} {model:<13} polls/job={statistics.fmean(polls):5.2f} "
+            f"ready->return p50={statistics.median(lag_ms):6.1f}ms "
+            f"p95={lag_ms[int(len(lag_ms) * 0.95) - 1]:6.1f}ms"
+        )
+
+
+async def main_async(args) -> None:
+    rng = random.Random(args.seed)
+    server = start_mock_server(processing_time=lambda model: rng.uniform(*MODEL_LATENCY.get(model, (1.0, 2.0))))
+    base_url = base_url_for(server)
+    await bench("fixed", False, args, server, base_url)
+    await bench("adaptive", True, args, server, base_url)
+    await aclose_clients()
+    server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=40, help="measured jobs per model")
+    parser.add_argument("--warmup", type=int, default=20, help="jobs per model used to seed latency history")
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
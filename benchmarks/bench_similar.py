@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate prompt index: lookup latency and recall at a given size.
+
+Fills a PromptIndex with --entries synthetic prompts (8-16 words drawn from
+a 20,000-word vocabulary, all with the same parameters), then looks up:
+
+    near   an indexed prompt with its words shuffled and one word replaced
+           (Jaccard ~0.8); recall is the share answered at --threshold
+    miss   a prompt of fresh random words, which must not match
+
+and reports p50/p99/max lookup time per kind.
+
+Usage:
+    python benchmarks/bench_similar.py [--entries 1000000] [--lookups 2000]
+        [--threshold 0.7] [--path /tmp/similar.sqlite3] [--budget-ms 1.0]
+
+With --budget-ms the script exits with status 1 when the p99 of either kind
+exceeds the budget. Adds take about 0.3 ms each, so filling a million entries
+takes over five minutes.
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "src"))
+
+from similar import PromptIndex
+
+PARAMS = {"safety_tolerance": 6, "prompt_upsampling": False, "raw": False, "aspect_ratio": "16:9"}
+
+
+def random_prompt(rng: random.Random, vocabulary: List[str]) -> List[str]:
+    return rng.sample(vocabulary, rng.randint(8, 16))
+
+
+def percentile(samples: List[float], q: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--threshold", type=float, default=0.7)
+    parser.add_argument("--path", default=None, help="SQLite file for the index (default: in memory)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--budget-ms", type=float, default=None, help="fail when a p99 exceeds this")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = [f"w{i}" for i in range(20_000)]
+    index = PromptIndex(path=args.path, ttl=86400, max_entries=args.entries)
+
+    prompts: List[List[str]] = []
+    started = time.perf_counter()
+    for i in range(args.entries):
+        words = random_prompt(rng, vocabulary)
+        if i < args.lookups:
+            prompts.append(words)
+        index.add(f"key-{i}", "flux-pro-1.1", {"prompt": " ".join(words), **PARAMS}, f"https://sample/{i}", {"request_id": str(i)})
+        if (i + 1) % 100_000 == 0:
+            print(f"indexed {i + 1} ({time.perf_counter() - started:.0f}s)", flush=True)
+    print(f"filled {args.entries} entries in {time.perf_counter() - started:.1f}s")
+
+    timings: Dict[str, List[float]] = {"near": [], "miss": []}
+    found = 0
+    for words in prompts:
+        near = list(words)
+        near[rng.randrange(len(near))] = rng.choice(vocabulary)
+        rng.shuffle(near)
+        for kind, query in (("near", near), ("miss", random_prompt(rng, vocabulary))):
+            payload = {"prompt": ", ".join(query).upper(), **PARAMS}
+            start = time.perf_counter()
+            result = index.lookup("flux-pro-1.1", payload, args.threshold)
+            timings[kind].append((time.perf_counter() - start) * 1000)
+            if kind == "near" and result is not None:
+                found += 1
+            elif kind == "miss" and result is not None:
+                print(f"unexpected match for a random prompt: score {result[2]:.2f}")
+
+    failed = False
+    for kind, ms in timings.items():
+        ms.sort()
+        p99 = percentile(ms, 0.99)
+        print(f"{kind:<6} p50={percentile(ms, 0.5):.3f}ms p99={p99:.3f}ms max={ms[-1]:.3f}ms")
+        failed |= args.budget_ms is not None and p99 > args.budget_ms
+    print(f"recall at {args.threshold}: {found / len(prompts):.1%} of {len(prompts)} near-duplicates")
+    index.close()
+    if failed:
+        print(f"FAIL: p99 lookup exceeds the {args.budget_ms}ms budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
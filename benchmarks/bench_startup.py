@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Cold start: time from spawning `python main.py` to the first tools/list response.
+
+Each run starts a fresh server process over the MCP stdio transport, sends
+initialize and tools/list, and stops the process again.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 10] [--budget-ms 1500]
+
+With --budget-ms the script exits with status 1 when the median time
+exceeds the budget, so it can gate CI.
+
+Most of the time is FastMCP: importing it (with pydantic, starlette and
+httpx, which mcp.shared.session imports) and registering the tools. The
+server's own modules add about 10 ms, so importing httpx lazily in them
+does not show up in these numbers.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+from mcp import ClientSession
+from mcp.client.stdio import StdioServerParameters, stdio_client
+
+project_root = Path(__file__).parent.parent
+
+
+async def time_to_tools_list() -> float:
+    env = dict(os.environ)
+    env.setdefault("BFL_API_KEY", "bench-startup")
+    params = StdioServerParameters(command=sys.executable, args=[str(project_root / "main.py")], env=env, cwd=str(project_root))
+    with open(os.devnull, "w") as errlog:
+        started = time.perf_counter()
+        async with stdio_client(params, errlog=errlog) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                tools = await session.list_tools()
+                elapsed = time.perf_counter() - started
+    if not tools.tools:
+        raise RuntimeError("server listed no tools")
+    return elapsed
+
+
+async def run(runs: int) -> List[float]:
+    # One unmeasured start warms the page cache for the interpreter and site-packages.
+    await time_to_tools_list()
+    return [await time_to_tools_list() * 1000 for _ in range(runs)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=None, help="fail when the median exceeds this")
+    args = parser.parse_args()
+
+    ms = sorted(asyncio.run(run(args.runs)))
+    median = statistics.median(ms)
+    print(f"time to tools/list p50={median:8.1f}ms p95={ms[max(0, int(round(len(ms) * 0.95)) - 1)]:8.1f}ms max={ms[-1]:8.1f}ms")
+
+    if args.budget_ms is not None:
+        if median > args.budget_ms:
+            print(f"FAIL: median {median:.1f}ms exceeds the {args.budget_ms:.0f}ms budget")
+            sys.exit(1)
+        print(f"OK: median {median:.1f}ms within the {args.budget_ms:.0f}ms budget")
+
+
+if __name__ == "__main__":
+    main()
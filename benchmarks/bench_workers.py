@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Throughput of the streamable HTTP mode from 1 to N worker processes.
+
+Starts the mock BFL API, then for each count in --workers launches the
+server with FLUX_TRANSPORT=streamable-http and that many FLUX_HTTP_WORKERS
+(sharing a fresh FLUX_SHARED_DIR), and drives it from --clients client
+processes keeping --concurrency flux_generate calls in flight each for
+--duration seconds. Admission limits are raised so the server, not the
+simulated per-key limits, is what is measured; the mock defaults to short
+generations for the same reason.
+
+After each run it checks shared job state: a job started with flux_submit
+on one connection is read back with flux_status and flux_result on fresh
+connections, which the kernel spreads over the workers.
+
+Reports images/s, speedup over the first count, latency p50/p99 and errors.
+More workers than CPU cores cannot help; the mock also runs on this machine
+and its upstream request rate is printed so it can be ruled out as the
+bottleneck.
+
+Usage:
+    python benchmarks/bench_workers.py [--workers 1,2,4] [--clients 4]
+        [--concurrency 16] [--duration 10] [--json]
+        [mock flags: --latency "*=uniform:0.2:0.4" ...]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List
+
+import httpx
+from mcp import ClientSession
+from mcp.client.streamable_http import streamable_http_client
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(Path(__file__).parent))
+
+from mock_bfl import add_server_arguments, base_url_for, server_from_args
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def call(url: str, tool: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """One tool call on a fresh connection."""
+    async with streamable_http_client(url) as (read, write, _):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            response = await session.call_tool(tool, arguments)
+            return json.loads(response.content[0].text)
+
+
+async def wait_ready(url: str, process: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with status {process.returncode}")
+        try:
+            await call(url, "health_check", {})
+            return
+        except Exception:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.5)
+
+
+async def drive(url: str, concurrency: int, duration: float, client: int) -> List[Dict[str, Any]]:
+    results: List[Dict[str, Any]] = []
+    deadline = time.monotonic() + duration
+    async with streamable_http_client(url, http_client=httpx.AsyncClient(timeout=120)) as (read, write, _):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+
+            async def worker(index: int) -> None:
+                n = 0
+                while time.monotonic() < deadline:
+                    started = time.perf_counter()
+                    try:
+                        response = await session.call_tool(
+                            "flux_generate", {"prompt": f"bench {client}-{index}-{n}", "model": "flux-schnell"}
+                        )
+                        body = json.loads(response.content[0].text)
+                    except Exception as e:
+                        body = {"status": "error", "error_type": type(e).__name__}
+                    results.append({
+                        "seconds": time.perf_counter() - started,
+                        "status": body.get("status"),
+                        "error_type": body.get("error_type"),
+                    })
+                    n += 1
+
+            await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return results
+
+
+def client_process(args: tuple) -> List[Dict[str, Any]]:
+    url, concurrency, duration, client = args
+    return asyncio.run(drive(url, concurrency, duration, client))
+
+
+async def check_shared_jobs(url: str, checks: int = 8) -> Dict[str, Any]:
+    submitted = await call(url, "flux_submit", {"prompt": f"shared job {uuid.uuid4().hex}", "model": "flux-schnell"})
+    job_id = submitted.get("job_id")
+    if job_id is None:
+        return {"ok": False, "error": submitted.get("message")}
+    statuses = [await call(url, "flux_status", {"job_id": job_id}) for _ in range(checks)]
+    result = await call(url, "flux_result", {"job_id": job_id, "wait_timeout": 30})
+    health = [await call(url, "health_check", {}) for _ in range(checks)]
+    workers = {h["process"]["pid"] for h in health}
+    found = sum(1 for s in statuses if s.get("job_id") == job_id)
+    return {
+        "ok": found == checks and result.get("status") == "success",
+        "status_found": f"{found}/{checks}",
+        "result": result.get("status"),
+        "workers_answering": len(workers),
+    }
+
+
+def run_workers(args, workers: int, base_url: str, mock) -> Dict[str, Any]:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/mcp"
+    shared_dir = tempfile.mkdtemp(prefix="flux-bench-workers-")
+    env = dict(os.environ)
+    env.update({
+        "BFL_API_KEY": "bench-workers",
+        "BFL_API_KEYS": "",
+        "BFL_BASE_URL": base_url,
+        "FLUX_TRANSPORT": "streamable-http",
+        "FLUX_HTTP_PORT": str(port),
+        "FLUX_HTTP_WORKERS": str(workers),
+        "FLUX_HTTP_LOG_LEVEL": "warning",
+        "FLUX_SHARED_DIR": shared_dir,
+        "FLUX_SUBMIT_RATE": "10000",
+        "FLUX_SUBMIT_BURST": "10000",
+        "FLUX_MAX_ACTIVE_TASKS": "10000",
+        "FLUX_POLL_MAX_QPS": "10000",
+        "FLUX_POLL_MAX_IN_FLIGHT": "256",
+    })
+    for item in args.server_env:
+        key, _, value = item.partition("=")
+        env[key] = value
+
+    with open(args.server_log, "a") as log:
+        process = subprocess.Popen(
+            [sys.executable, str(project_root / "main.py")], env=env, cwd=str(project_root), stdout=log, stderr=log
+        )
+    try:
+        asyncio.run(wait_ready(url, process))
+        before = Counter(mock.counters)
+        started = time.perf_counter()
+        with multiprocessing.get_context("spawn").Pool(args.clients) as pool:
+            batches = pool.map(client_process, [(url, args.concurrency, args.duration, c) for c in range(args.clients)])
+        wall = time.perf_counter() - started
+        upstream = Counter(mock.counters)
+        upstream.subtract(before)
+        shared = asyncio.run(check_shared_jobs(url))
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    results = [r for batch in batches for r in batch]
+    ok = [r["seconds"] for r in results if r["status"] == "success"]
+    summary: Dict[str, Any] = {
+        "workers": workers,
+        "requests": len(results),
+        "succeeded": len(ok),
+        "throughput_per_s": round(len(ok) / wall, 1),
+        "errors": dict(Counter(r["error_type"] or "unknown" for r in results if r["status"] != "success")),
+        "upstream_per_s": round(sum(upstream.values()) / wall, 1),
+        "shared_jobs": shared,
+    }
+    if ok:
+        summary["latency_s"] = {"p50": round(percentile(ok, 0.5), 3), "p99": round(percentile(ok, 0.99), 3)}
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts to compare")
+    parser.add_argument("--clients", type=int, default=4, help="client processes")
+    parser.add_argument("--concurrency", type=int, default=16, help="calls in flight per client process")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load per worker count")
+    parser.add_argument("--server-env", action="append", default=[], metavar="KEY=VALUE", help="extra environment for the server")
+    parser.add_argument("--server-log", default=os.devnull, help="file receiving the server's output")
+    parser.add_argument("--json", action="store_true")
+    add_server_arguments(parser)
+    parser.set_defaults(latency="*=uniform:0.2:0.4", sample_kb=16)
+    args = parser.parse_args()
+
+    mock = server_from_args(args)
+    base_url = base_url_for(mock)
+    runs = []
+    try:
+        for workers in (int(w) for w in args.workers.split(",") if w.strip()):
+            runs.append(run_workers(args, workers, base_url, mock))
+            if not args.json:
+                run = runs[-1]
+                lat = run.get("latency_s", {})
+                speedup = run["throughput_per_s"] / runs[0]["throughput_per_s"] if runs[0]["throughput_per_s"] else 0
+                print(
+                    f"workers={run['workers']:<3} {run['throughput_per_s']:>7} images/s  x{speedup:.2f}  "
+                    f"p50 {lat.get('p50')}s  p99 {lat.get('p99')}s  upstream {run['upstream_per_s']} req/s  "
+                    f"errors {run['errors'] or 0}  shared jobs {'ok' if run['shared_jobs']['ok'] else run['shared_jobs']}",
+                    flush=True,
+                )
+    finally:
+        mock.shutdown()
+    if args.json:
+        print(json.dumps({"cpu_count": os.cpu_count(), "runs": runs}, indent=2))
+    else:
+        print(f"(cpu_count={os.cpu_count()})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Load test: drive the MCP server over stdio against the mock BFL API.
+
+Starts the mock (unless --base-url points at one already running), launches
+--sessions server processes through the MCP stdio client and keeps
+--concurrency flux_generate calls in flight per session until --requests
+calls have completed. Reports throughput, latency percentiles, errors by
+type, per-process thread count and peak RSS and per-key admissions (from
+health_check), and the upstream requests the mock received. With --keys N
+each server gets a pool of N API keys (load-test-0 ... load-test-N-1); the
+mock's --max-active limit applies per key, and --key-status
+load-test-1=401 makes one of them fail.
+
+Usage:
+    python benchmarks/load_test.py [--sessions 2] [--concurrency 16] [--requests 200]
+        [--models flux-schnell,flux-dev] [--unique 1.0] [--keys 1] [--json]
+        [mock flags: --latency ... --rate-limit-rate 0.05 --failure-rate 0.01 ...]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List
+
+from mcp import ClientSession
+from mcp.client.stdio import StdioServerParameters, stdio_client
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(Path(__file__).parent))
+
+from mock_bfl import add_server_arguments, base_url_for, server_from_args
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def build_workload(args) -> asyncio.Queue:
+    rng = random.Random(args.seed)
+    models = [m.strip() for m in args.models.split(",") if m.strip()]
+    # With --unique < 1 prompts repeat, which exercises the cache and request coalescing.
+    distinct = max(1, int(args.requests * args.unique))
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(args.requests):
+        n = i if distinct >= args.requests else rng.randrange(distinct)
+        queue.put_nowait({"prompt": f"load test prompt {n}", "model": models[n % len(models)]})
+    return queue
+
+
+async def run_session(index: int, args, base_url: str, queue: asyncio.Queue, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    env = dict(os.environ)
+    env.update({
+        "BFL_API_KEY": "load-test",
+        "BFL_API_KEYS": ",".join(f"load-test-{i}" for i in range(args.keys)) if args.keys > 1 else "",
+        "BFL_BASE_URL": base_url,
+    })
+    for item in args.server_env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    params = StdioServerParameters(command=sys.executable, args=[str(project_root / "main.py")], env=env, cwd=str(project_root))
+
+    with open(args.server_log, "a") as errlog:
+        async with stdio_client(params, errlog=errlog) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+
+                async def worker() -> None:
+                    while True:
+                        try:
+                            request = queue.get_nowait()
+                        except asyncio.QueueEmpty:
+                            return
+                        started = time.perf_counter()
+                        try:
+                            response = await session.call_tool("flux_generate", request)
+                            body = json.loads(response.content[0].text)
+                        except Exception as e:
+                            body = {"status": "error", "error_type": type(e).__name__}
+                        meta = body.get("meta") or {}
+                        results.append({
+                            "session": index,
+                            "model": request["model"],
+                            "seconds": time.perf_counter() - started,
+                            "status": body.get("status"),
+                            "error_type": body.get("error_type"),
+                            "source": "cache" if meta.get("cached") else "coalesced" if meta.get("coalesced") else "api",
+                        })
+
+                await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+                health = await session.call_tool("health_check", {})
+                return json.loads(health.content[0].text)
+
+
+def report(args, results: List[Dict[str, Any]], health: List[Dict[str, Any]], upstream: Counter, wall: float) -> Dict[str, Any]:
+    ok = [r for r in results if r["status"] == "success"]
+    latencies = [r["seconds"] for r in ok]
+    summary: Dict[str, Any] = {
+        "sessions": args.sessions,
+        "concurrency_per_session": args.concurrency,
+        "requests": len(results),
+        "succeeded": len(ok),
+        "errors": dict(Counter(r["error_type"] or "unknown" for r in results if r["status"] != "success")),
+        "sources": dict(Counter(r["source"] for r in ok)),
+        "wall_seconds": round(wall, 2),
+        "throughput_per_s": round(len(ok) / wall, 2) if wall else None,
+        "server_processes": [h.get("process", {}) for h in health],
+        "api_keys": [
+            [
+                {
+                    "key_id": k["key_id"],
+                    "admitted": k.get("admission", {}).get("admitted"),
+                    "usable": k["usable"],
+                    "rejections": k["rejections"],
+                }
+                for k in h.get("api_keys", [])
+            ]
+            for h in health
+        ],
+        "upstream": dict(upstream),
+    }
+    if latencies:
+        summary["latency_s"] = {
+            "p50": round(percentile(latencies, 0.50), 3),
+            "p95": round(percentile(latencies, 0.95), 3),
+            "p99": round(percentile(latencies, 0.99), 3),
+            "max": round(max(latencies), 3),
+            "mean": round(statistics.mean(latencies), 3),
+        }
+        by_model: Dict[str, List[float]] = {}
+        for r in ok:
+            by_model.setdefault(r["model"], []).append(r["seconds"])
+        summary["latency_by_model_s"] = {
+            model: {"n": len(v), "p50": round(percentile(v, 0.5), 3), "p95": round(percentile(v, 0.95), 3)}
+            for model, v in sorted(by_model.items())
+        }
+    if upstream.get("submit"):
+        summary["polls_per_submit"] = round(upstream.get("poll", 0) / upstream["submit"], 2)
+    return summary
+
+
+async def main_async(args) -> None:
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        server = server_from_args(args)
+        base_url = base_url_for(server)
+
+    queue = build_workload(args)
+    results: List[Dict[str, Any]] = []
+    started = time.perf_counter()
+    health = await asyncio.gather(*(run_session(i, args, base_url, queue, results) for i in range(args.sessions)))
+    wall = time.perf_counter() - started
+
+    upstream = Counter(server.counters) if server is not None else Counter()
+    summary = report(args, results, health, upstream, wall)
+    if server is not None:
+        server.shutdown()
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+    print(f"{summary['succeeded']}/{summary['requests']} succeeded in {summary['wall_seconds']}s "
+          f"({summary['throughput_per_s']} images/s) with {args.sessions} session(s) x {args.concurrency} in flight")
+    if "latency_s" in summary:
+        lat = summary["latency_s"]
+        print(f"latency p50 {lat['p50']}s  p95 {lat['p95']}s  p99 {lat['p99']}s  max {lat['max']}s")
+        for model, stats in summary["latency_by_model_s"].items():
+            print(f"  {model:<16} n={stats['n']:<5} p50 {stats['p50']}s  p95 {stats['p95']}s")
+    print(f"answered by: {summary['sources']}")
+    if summary["errors"]:
+        print(f"errors: {summary['errors']}")
+    for i, proc in enumerate(summary["server_processes"]):
+        print(f"server {i}: threads={proc.get('threads')} asyncio_tasks={proc.get('asyncio_tasks')} max_rss={proc.get('max_rss_mb')} MB")
+        if args.keys > 1:
+            for key in summary["api_keys"][i]:
+                print(f"  {key['key_id']}: admitted={key['admitted']} usable={key['usable']} rejections={key['rejections']}")
+    if summary["upstream"]:
+        print(f"upstream requests: {summary['upstream']} (polls/submit {summary.get('polls_per_submit')})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=1, help="server processes, one stdio session each")
+    parser.add_argument("--concurrency", type=int, default=8, help="flux_generate calls in flight per session")
+    parser.add_argument("--requests", type=int, default=100, help="total calls across all sessions")
+    parser.add_argument("--models", default="flux-schnell,flux-pro-1.1")
+    parser.add_argument("--unique", type=float, default=1.0, help="fraction of distinct prompts (lower exercises cache/coalescing)")
+    parser.add_argument("--keys", type=int, default=1, help="API keys per server (BFL_API_KEYS pool)")
+    parser.add_argument("--base-url", default=None, help="use an already running mock instead of starting one")
+    parser.add_argument("--server-env", action="append", default=[], metavar="KEY=VALUE", help="extra environment for the server")
+    parser.add_argument("--server-log", default=os.devnull, help="file receiving the servers' stderr")
+    parser.add_argument("--json", action="store_true")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the per-call code paths of the adapter and server.
+
+Cases:
+    build_payload        FluxAdapter._build_payload for a text-only request
+    cache_key            request fingerprint computed on every generate()
+    data_url_<N>mb_cold  _to_data_url_if_needed on an N MB file, empty encoder cache
+    data_url_<N>mb_warm  the same file again, served from the encoder cache
+    adapter_construct    a new FluxAdapter, as the tools did before adapters were shared
+    tool_setup           what flux_generate does before the first request
+                         (GenerationOptions + choosing a key from the pool)
+    poll_loop            wait_for_result for one job that answers Pending,
+                         Processing, Ready, against an in-process stub transport
+    generate_stub        generate() end to end (submit + poll) against the stub
+    mcp_call_tool        FastMCP.call_tool dispatch of a trivial tool
+    mcp_roundtrip        the same call through an in-memory client session
+
+Every case is calibrated to run for about --min-time per round; the median
+of --rounds rounds is reported per operation.
+
+Usage:
+    python benchmarks/microbench.py --save benchmarks/baseline.json
+    # ...change src/flux_adapter.py...
+    python benchmarks/microbench.py --compare benchmarks/baseline.json [--threshold 0.15]
+    python benchmarks/microbench.py --only data_url --sizes 1,10
+
+--compare exits with status 1 if any case is slower than the baseline by
+more than --threshold (a fraction). Baselines are machine-specific.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Union
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "src"))
+
+os.environ.setdefault("BFL_API_KEY", "microbench")
+
+import httpx
+from mcp.shared.memory import create_connected_server_and_client_session
+
+from cache import cache_key
+from flux_adapter import FluxAdapter, GenerationOptions
+from input_images import InputImageEncoder
+from polling import FixedPollSchedule
+import main as server_main
+
+# Per-request INFO logging from FastMCP and httpx would dominate the timings.
+for name in ("mcp", "httpx"):
+    logging.getLogger(name).setLevel(logging.WARNING)
+
+Op = Callable[[], Union[None, Awaitable[None]]]
+
+
+def stub_transport() -> httpx.MockTransport:
+    """Answers every submit at once and every job with Pending, Processing, then Ready."""
+    polls: Dict[str, int] = {}
+    sequence = ("Pending", "Processing", "Ready")
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.method == "POST":
+            request_id = f"job-{len(polls)}"
+            polls[request_id] = 0
+            return httpx.Response(200, json={"id": request_id, "polling_url": "http://stub/v1/get_result"})
+        request_id = request.url.params["id"]
+        status = sequence[min(polls.get(request_id, 0), len(sequence) - 1)]
+        polls[request_id] = polls.get(request_id, 0) + 1
+        result = {"sample": f"http://stub/samples/{request_id}.jpg"} if status == "Ready" else None
+        return httpx.Response(200, json={"id": request_id, "status": status, "result": result})
+
+    return httpx.MockTransport(handler)
+
+
+def stub_adapter(client: httpx.AsyncClient) -> FluxAdapter:
+    adapter = FluxAdapter(model="flux-schnell", use_raw_mode=False, base_url="http://stub", client=client)
+    # No sleeping between polls: only the loop's own overhead is measured.
+    adapter.poll_schedule = lambda model: FixedPollSchedule(0.0)
+    return adapter
+
+
+def make_image(directory: Path, megabytes: int) -> Path:
+    path = directory / f"input-{megabytes}mb.png"
+    with path.open("wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(os.urandom(megabytes * 1024 * 1024 - 8))
+    return path
+
+
+def build_cases(tmp: Path, sizes: List[int], client: httpx.AsyncClient) -> Dict[str, Op]:
+    adapter = FluxAdapter(model="flux-pro-1.1", use_raw_mode=False, base_url="http://stub")
+    options = GenerationOptions(model="flux-pro-1.1", seed=42)
+    payload = adapter._build_payload("a lighthouse at dusk, volumetric fog", None, None, options)
+    cases: Dict[str, Op] = {
+        "build_payload": lambda: adapter._build_payload("a lighthouse at dusk, volumetric fog", None, 3.5, options),
+        "cache_key": lambda: cache_key(options.model, payload),
+    }
+
+    for mb in sizes:
+        path = str(make_image(tmp, mb))
+        warm = FluxAdapter(model="flux-kontext-pro", use_raw_mode=False, base_url="http://stub")
+        warm._to_data_url_if_needed(path)
+
+        def cold(path=path):
+            adapter.input_encoder = InputImageEncoder()
+            adapter._to_data_url_if_needed(path)
+
+        cases[f"data_url_{mb}mb_cold"] = cold
+        cases[f"data_url_{mb}mb_warm"] = lambda warm=warm, path=path: warm._to_data_url_if_needed(path)
+
+    cases["adapter_construct"] = lambda: FluxAdapter(model="flux-pro-1.1", use_raw_mode=False, base_url="http://stub")
+
+    def tool_setup():
+        GenerationOptions(model="flux-pro-1.1", raw=False, aspect_ratio="16:9", seed=None)
+        server_main.key_pool.choose()
+
+    cases["tool_setup"] = tool_setup
+
+    polling = stub_adapter(client)
+    submitted = iter(range(10 ** 12))
+
+    async def poll_loop():
+        await polling.wait_for_result(f"poll-{next(submitted)}", "http://stub/v1/get_result")
+
+    cases["poll_loop"] = poll_loop
+
+    generating = stub_adapter(client)
+
+    async def generate_stub():
+        await generating.generate("a lighthouse at dusk", use_cache=False)
+
+    cases["generate_stub"] = generate_stub
+
+    async def mcp_call_tool():
+        await server_main.mcp.call_tool("flux_status", {"job_id": "missing"})
+
+    cases["mcp_call_tool"] = mcp_call_tool
+    return cases
+
+
+async def measure(op: Op, rounds: int, min_time: float) -> Dict[str, Any]:
+    async def run(iterations: int) -> float:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            result = op()
+            if asyncio.iscoroutine(result):
+                await result
+        return time.perf_counter() - start
+
+    # Calibrate: grow the iteration count until one round takes min_time.
+    iterations = 1
+    while True:
+        elapsed = await run(iterations)
+        if elapsed >= min_time or iterations >= 1_000_000:
+            break
+        iterations = max(iterations * 2, int(iterations * min_time / max(elapsed, 1e-9)))
+    per_op = sorted([elapsed / iterations] + [await run(iterations) / iterations for _ in range(rounds - 1)])
+    return {
+        "median_us": round(statistics.median(per_op) * 1e6, 3),
+        "min_us": round(per_op[0] * 1e6, 3),
+        "iterations": iterations,
+        "rounds": rounds,
+    }
+
+
+async def run_all(args) -> Dict[str, Dict[str, Any]]:
+    results: Dict[str, Dict[str, Any]] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        async with httpx.AsyncClient(transport=stub_transport()) as client:
+            cases = build_cases(Path(tmp), args.sizes, client)
+            async with create_connected_server_and_client_session(server_main.mcp._mcp_server) as session:
+
+                async def mcp_roundtrip():
+                    await session.call_tool("flux_status", {"job_id": "missing"})
+
+                cases["mcp_roundtrip"] = mcp_roundtrip
+                for name, op in cases.items():
+                    if args.only and not any(part in name for part in args.only.split(",")):
+                        continue
+                    results[name] = await measure(op, args.rounds, args.min_time)
+                    print(f"{name:<24}{results[name]['median_us']:>14.2f} us/op  (min {results[name]['min_us']:.2f}, "
+                          f"{results[name]['iterations']} x {args.rounds})", flush=True)
+    return results
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline_path: Path, threshold: float) -> bool:
+    baseline = json.loads(baseline_path.read_text())["results"]
+    regressed = False
+    print(f"\n{'case':<24}{'baseline us':>14}{'now us':>14}{'change':>10}")
+    for name, now in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:<24}{'-':>14}{now['median_us']:>14.2f}{'new':>10}")
+            continue
+        change = now["median_us"] / before["median_us"] - 1 if before["median_us"] else 0.0
+        flag = ""
+        if change > threshold:
+            flag, regressed = "  REGRESSION", True
+        elif change < -threshold:
+            flag = "  faster"
+        print(f"{name:<24}{before['median_us']:>14.2f}{now['median_us']:>14.2f}{change:>+10.1%}{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per round after calibration")
+    parser.add_argument("--sizes", default="1,10,50", help="input image sizes in MB for the data_url cases")
+    parser.add_argument("--only", default="", help="comma-separated substrings of case names to run")
+    parser.add_argument("--save", type=Path, help="write results as a JSON baseline")
+    parser.add_argument("--compare", type=Path, help="compare against a saved baseline")
+    parser.add_argument("--threshold", type=float, default=0.15, help="slowdown that counts as a regression")
+    args = parser.parse_args()
+    args.sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+
+    results = asyncio.run(run_all(args))
+
+    if args.save:
+        args.save.write_text(json.dumps({
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "results": results,
+        }, indent=2) + "\n")
+        print(f"\nBaseline written to {args.save}")
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Black Forest Labs API.
+
+Implements POST /v1/{model}, GET /v1/get_result and the sample URLs it hands
+out, so the adapter can be exercised without a real API key. Each job reports
+Pending while queued, then Processing with a rising progress value, then
+Ready (or Error for the configured share of failed jobs). Processing time per
+model, injected 500/429/503 responses and per-key concurrency limits are all
+configurable; see start_mock_server and --help.
+
+Usage:
+    python benchmarks/mock_bfl.py [--port 8765] [--latency "flux-dev=lognormal:3:0.4,*=uniform:1:2"]
+        [--submit-error-rate 0.02] [--rate-limit-rate 0.05] [--poll-error-rate 0.01]
+        [--failure-rate 0.01] [--queue-fraction 0.3] [--max-active 24] [--seed 1]
+        [--sample-image image.jpg]
+"""
+
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, Optional
+from urllib.parse import urlparse, parse_qs
+
+
+def _distribution(spec: str, rng: random.Random) -> Callable[[], float]:
+    kind, *params = spec.split(":")
+    values = [float(p) for p in params]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: rng.uniform(values[0], values[1])
+    if kind == "lognormal":
+        # Parameterized by median and sigma, which is how latency is usually described.
+        median, sigma = values
+        return lambda: rng.lognormvariate(math.log(median), sigma)
+    raise ValueError(f"Unknown latency distribution: {spec!r} (use fixed:S, uniform:A:B or lognormal:MEDIAN:SIGMA)")
+
+
+def latency_profile(spec: str, seed: Optional[int] = None) -> Callable[[str], float]:
+    """
+    Build a processing_time callable from "model=dist,...,*=dist".
+
+    dist is fixed:S, uniform:A:B or lognormal:MEDIAN:SIGMA (seconds). A bare
+    dist applies to every model.
+    """
+    rng = random.Random(seed)
+    lock = threading.Lock()
+    by_model: Dict[str, Callable[[], float]] = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        model, _, dist = part.rpartition("=")
+        by_model[model or "*"] = _distribution(dist, rng)
+    default = by_model.get("*", lambda: 0.0)
+
+    def processing_time(model: str) -> float:
+        with lock:
+            return max(0.0, by_model.get(model, default)())
+
+    return processing_time
+
+
+class MockBFLHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so clients can keep connections alive between requests.
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without TCP_NODELAY a kept-alive
+    # connection stalls on delayed ACKs and hides the benefit of reuse.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict, headers: dict = None) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _chance(self, rate: float) -> bool:
+        if rate <= 0:
+            return False
+        with self.server.lock:
+            return self.server.random.random() < rate
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        server = self.server
+        with server.lock:
+            server.counters["submit"] += 1
+        if not self.path.startswith("/v1/"):
+            self._send_json(404, {"detail": "Not Found"})
+            return
+        api_key = self.headers.get("x-key", "")
+        status = server.key_status.get(api_key)
+        if status is not None:
+            with server.lock:
+                server.counters[f"submit_{status}"] += 1
+            self._send_json(status, {"detail": f"Key rejected with {status}"})
+            return
+        if self._chance(server.submit_error_rate):
+            with server.lock:
+                server.counters["submit_500"] += 1
+            self._send_json(500, {"detail": "Internal Server Error"})
+            return
+        if self._chance(server.rate_limit_rate):
+            with server.lock:
+                server.counters["submit_429"] += 1
+                server.rejected += 1
+            self._send_json(429, {"detail": "Rate limit exceeded"}, {"Retry-After": "1"})
+            return
+
+        model = self.path[len("/v1/"):]
+        request_id = uuid.uuid4().hex
+        now = time.monotonic()
+        processing = server.processing_time(model)
+        with server.lock:
+            if server.max_active is not None:
+                active = sum(1 for job in server.jobs.values() if job["ready_at"] > now and job["key"] == api_key)
+                if active >= server.max_active:
+                    server.counters["submit_429"] += 1
+                    server.rejected += 1
+                    self._send_json(429, {"detail": "Too many active tasks"}, {"Retry-After": "1"})
+                    return
+            server.jobs[request_id] = {
+                "model": model,
+                "key": api_key,
+                "submitted_at": now,
+                "processing_at": now + processing * server.queue_fraction,
+                "ready_at": now + processing,
+                "failed": server.random.random() < server.failure_rate,
+                "polls": 0,
+            }
+        host, port = server.server_address[:2]
+        self._send_json(200, {
+            "id": request_id,
+            "polling_url": f"http://{host}:{port}/v1/get_result",
+        })
+
+    def _send_sample(self) -> None:
+        # Deterministic bytes (or the configured image), written in chunks like a CDN would stream them.
+        with self.server.lock:
+            self.server.counters["sample"] += 1
+        image = self.server.sample_image
+        size = len(image) if image is not None else self.server.sample_bytes
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(size))
+        self.end_headers()
+        if image is not None:
+            for offset in range(0, size, 65536):
+                self.wfile.write(image[offset:offset + 65536])
+            return
+        chunk = bytes(range(256)) * 256
+        for offset in range(0, size, len(chunk)):
+            self.wfile.write(chunk[:size - offset])
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.startswith("/samples/"):
+            self._send_sample()
+            return
+        if url.path != "/v1/get_result":
+            self._send_json(404, {"detail": "Not Found"})
+            return
+        server = self.server
+        request_id = parse_qs(url.query).get("id", [""])[0]
+        with server.lock:
+            server.counters["poll"] += 1
+            job = server.jobs.get(request_id)
+            if job is not None:
+                job["polls"] += 1
+        if job is None:
+            self._send_json(404, {"id": request_id, "status": "Task not found"})
+            return
+        if self._chance(server.poll_error_rate):
+            with server.lock:
+                server.counters["poll_503"] += 1
+            self._send_json(503, {"detail": "Service Unavailable"})
+            return
+
+        now = time.monotonic()
+        if now < job["processing_at"]:
+            self._send_json(200, {"id": request_id, "status": "Pending", "result": None})
+            return
+        if now < job["ready_at"]:
+            span = job["ready_at"] - job["processing_at"]
+            progress = round((now - job["processing_at"]) / span, 2) if span > 0 else 0.0
+            self._send_json(200, {"id": request_id, "status": "Processing", "result": None, "progress": progress})
+            return
+        if job["failed"]:
+            self._send_json(200, {"id": request_id, "status": "Error", "result": None, "details": "Mock failure"})
+            return
+        host, port = server.server_address[:2]
+        self._send_json(200, {
+            "id": request_id,
+            "status": "Ready",
+            "result": {"sample": f"http://{host}:{port}/samples/{request_id}.jpg"},
+        })
+
+
+def start_mock_server(
+    host: str = "127.0.0.1",
+    port: int = 0,
+    processing_time=None,
+    max_active=None,
+    sample_bytes: int = 256 * 1024,
+    *,
+    submit_error_rate: float = 0.0,
+    rate_limit_rate: float = 0.0,
+    poll_error_rate: float = 0.0,
+    failure_rate: float = 0.0,
+    queue_fraction: float = 1.0,
+    seed: Optional[int] = None,
+    key_status: Optional[Dict[str, int]] = None,
+    sample_image: Optional[bytes] = None,
+) -> ThreadingHTTPServer:
+    """
+    Start the mock API on a background thread and return the server.
+
+    processing_time is a callable taking the model name and returning seconds
+    until the job is Ready (default: immediately; see latency_profile). The
+    first queue_fraction of that time reports Pending, the rest Processing.
+    With max_active set, a submit that would exceed that many unfinished jobs
+    of its x-key gets a 429 with Retry-After, like the real per-key limit.
+    key_status maps API keys to the status every submit with them gets
+    (e.g. 401 for a revoked key, 402 for one out of credits).
+
+    submit_error_rate and rate_limit_rate answer that share of submits with
+    500 / 429, poll_error_rate answers polls with 503, and failure_rate ends
+    jobs in status Error. Per-job state, including the poll count, is kept in
+    server.jobs; request counts by kind in server.counters; rejected submits
+    in server.rejected. Sample URLs serve sample_bytes bytes of image/jpeg,
+    or sample_image when given (a real image, e.g. for previews).
+    """
+    server = ThreadingHTTPServer((host, port), MockBFLHandler)
+    server.daemon_threads = True
+    server.jobs = {}
+    server.lock = threading.Lock()
+    server.random = random.Random(seed)
+    server.processing_time = processing_time or (lambda model: 0.0)
+    server.max_active = max_active
+    server.key_status = dict(key_status or {})
+    server.rejected = 0
+    server.counters = Counter()
+    server.sample_bytes = sample_bytes
+    server.sample_image = sample_image
+    server.submit_error_rate = submit_error_rate
+    server.rate_limit_rate = rate_limit_rate
+    server.poll_error_rate = poll_error_rate
+    server.failure_rate = failure_rate
+    server.queue_fraction = min(max(queue_fraction, 0.0), 1.0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def base_url_for(server: ThreadingHTTPServer) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+def add_server_arguments(parser: argparse.ArgumentParser) -> None:
+    """Mock behaviour flags, shared with load_test.py."""
+    parser.add_argument("--latency", default="flux-schnell=uniform:0.8:1.6,*=lognormal:4:0.35",
+                        help="processing time per model: model=dist,...,*=dist (fixed:S, uniform:A:B, lognormal:MEDIAN:SIGMA)")
+    parser.add_argument("--queue-fraction", type=float, default=0.3, help="share of processing time reported as Pending")
+    parser.add_argument("--submit-error-rate", type=float, default=0.0, help="share of submits answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of submits answered with 429")
+    parser.add_argument("--poll-error-rate", type=float, default=0.0, help="share of polls answered with 503")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of jobs that end in status Error")
+    parser.add_argument("--max-active", type=int, default=None, help="per-key limit on unfinished jobs (429 beyond it)")
+    parser.add_argument("--key-status", action="append", default=[], metavar="KEY=STATUS",
+                        help="answer every submit made with KEY with STATUS (e.g. 401, 402)")
+    parser.add_argument("--sample-kb", type=int, default=256, help="size of each sample image")
+    parser.add_argument("--sample-image", default=None, metavar="PATH", help="serve this file as every sample image")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def server_from_args(args: argparse.Namespace, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    return start_mock_server(
+        host,
+        port,
+        processing_time=latency_profile(args.latency, args.seed),
+        max_active=args.max_active,
+        sample_bytes=args.sample_kb * 1024,
+        submit_error_rate=args.submit_error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        poll_error_rate=args.poll_error_rate,
+        failure_rate=args.failure_rate,
+        queue_fraction=args.queue_fraction,
+        seed=args.seed,
+        key_status={key: int(status) for key, _, status in (s.rpartition("=") for s in args.key_status)},
+        sample_image=Path(args.sample_image).read_bytes() if args.sample_image else None,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+    server = server_from_args(args, port=args.port)
+    print(f"Mock BFL API listening on {base_url_for(server)}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
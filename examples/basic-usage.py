@@ -82,6 +82,40 @@ async def generate_multiple_images():
                         print(f"❌ Error generating image {i}: {response_data.get('message')}")
 
 
+async def generate_batch_example():
+    """Example of generating several images concurrently with one batch call."""
+    
+    async with stdio_client(StdioServerParameters(
+        command="uv",
+        args=["run", "main"]
+    )) as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            
+            async def on_progress(progress, total, message):
+                print(f"⏳ {int(progress)}/{int(total)} {message or ''}")
+            
+            result = await session.call_tool(
+                "flux_generate_batch",
+                {
+                    "items": [
+                        {"prompt": "A serene lake with mountains in the background"},
+                        {"prompt": "A futuristic cityscape at night with neon lights"},
+                        {"prompt": "A cute cat wearing a space helmet", "aspect_ratio": "1:1"}
+                    ],
+                    "max_concurrency": 3
+                },
+                progress_callback=on_progress
+            )
+            
+            response_data = json.loads(result.content[0].text)
+            for item in response_data["results"]:
+                if item["status"] == "success":
+                    print(f"✅ Image {item['index'] + 1}: {item['image']}")
+                else:
+                    print(f"❌ Image {item['index'] + 1}: {item.get('message')}")
+
+
 async def advanced_parameters_example():
     """Example using advanced parameters for image generation."""
     
@@ -133,8 +167,13 @@ async def main():
         print("-" * 35)
         await generate_multiple_images()
         
+        # Batch example
+        print("\n3. Batch Generation")
+        print("-" * 22)
+        await generate_batch_example()
+        
         # Advanced parameters example
-        print("\n3. Advanced Parameters")
+        print("\n4. Advanced Parameters")
         print("-" * 25)
         await advanced_parameters_example()
         
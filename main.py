@@ -4,7 +4,7 @@ Main entry point for the Flux MCP Server.
 This is what Dedalus runs when deploying the server.
 """
 
-from src.main import mcp
+from src.main import mcp, run
 
 if __name__ == "__main__":
-    mcp.run()
+    run()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Summarize a FLUX_TRACE_FILE written by the MCP server.
+
+Reads the trace file and its rotated backups (trace.jsonl.1, .2, ...) and
+prints p50/p95/p99 for every phase (queue, submit, wait, per-status time,
+download, total) per model and source (api, cache, similar, coalesced), plus error
+counts by type.
+
+Usage:
+    python scripts/analyze_traces.py traces/flux-trace.jsonl [--model flux-dev] [--json]
+"""
+
+import argparse
+import json
+import sys
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+
+def trace_files(path: Path) -> List[Path]:
+    """The file itself plus its rotated backups, oldest first."""
+    backups = [p for p in path.parent.glob(f"{path.name}.*") if p.suffix[1:].isdigit()]
+    backups.sort(key=lambda p: int(p.suffix[1:]), reverse=True)
+    return backups + ([path] if path.exists() else [])
+
+
+def read_records(paths: List[Path]) -> Iterator[dict]:
+    for path in paths:
+        with path.open(encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # A partially written last line after a crash.
+                    continue
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize(records: Iterator[dict], model: str = None) -> Tuple[Dict, Dict]:
+    phases: Dict[Tuple[str, str], Dict[str, List[float]]] = defaultdict(lambda: defaultdict(list))
+    errors: Dict[str, Counter] = defaultdict(Counter)
+    for record in records:
+        if model and record.get("model") != model:
+            continue
+        if record.get("status") == "error":
+            errors[record.get("model")][record.get("error_type", "unknown")] += 1
+            continue
+        group = phases[(record.get("model"), record.get("source"))]
+        for name, value in record.get("phases", {}).items():
+            group[name].append(value)
+
+    summary = {}
+    for (model_name, source), group in sorted(phases.items()):
+        summary[f"{model_name} [{source}]"] = {
+            name: {
+                "n": len(values),
+                "p50": round(percentile(values, 0.50), 1),
+                "p95": round(percentile(values, 0.95), 1),
+                "p99": round(percentile(values, 0.99), 1),
+            }
+            for name, values in sorted(group.items())
+        }
+    return summary, {m: dict(c) for m, c in errors.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("trace_file", type=Path)
+    parser.add_argument("--model", help="only report this model")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = parser.parse_args()
+
+    paths = trace_files(args.trace_file)
+    if not paths:
+        sys.exit(f"No trace file at {args.trace_file}")
+    summary, errors = summarize(read_records(paths), args.model)
+
+    if args.json:
+        print(json.dumps({"phases": summary, "errors": errors}, indent=2))
+        return
+
+    for group, phases in summary.items():
+        print(group)
+        print(f"  {'phase':<16}{'n':>7}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}")
+        for name, stats in phases.items():
+            print(f"  {name:<16}{stats['n']:>7}{stats['p50']:>11.1f}{stats['p95']:>11.1f}{stats['p99']:>11.1f}")
+        print()
+    for model_name, counts in errors.items():
+        print(f"{model_name} errors: " + ", ".join(f"{t}={n}" for t, n in sorted(counts.items())))
+
+
+if __name__ == "__main__":
+    main()
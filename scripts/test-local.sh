@@ -32,6 +32,14 @@ pip install --upgrade pip
 echo "📦 Installing dependencies..."
 pip install fastmcp python-dotenv requests pydantic
 
+# Load test against the local mock BFL API; needs no API key
+if [ "$1" = "--load" ]; then
+    echo "📈 Running load test against the mock BFL API..."
+    pip install -e .
+    python benchmarks/load_test.py "${@:2}"
+    exit 0
+fi
+
 # Load environment variables from config/.env if it exists
 if [ -f "config/.env" ]; then
     echo "📋 Loading environment variables from config/.env..."
@@ -39,7 +47,7 @@ if [ -f "config/.env" ]; then
 fi
 
 # Check for API key
-if [ -z "$BFL_API_KEY" ]; then
+if [ -z "$BFL_API_KEY" ] && [ -z "$BFL_API_KEYS" ]; then
     echo "⚠️  BFL_API_KEY not set. Please set it:"
     echo "   export BFL_API_KEY='your_api_key_here'"
     echo ""
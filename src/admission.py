@@ -0,0 +1,328 @@
+import asyncio
+import random
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, Mapping, Optional, Set
+
+try:
+    from . import metrics
+    from .polling import poll_hint
+    from .scheduler import PRIORITIES, FairQueue
+except ImportError:
+    import metrics
+    from polling import poll_hint
+    from scheduler import PRIORITIES, FairQueue
+
+if TYPE_CHECKING:
+    from .shared import SharedLimits
+
+
+# Statuses worth retrying a submission for; other 4xx responses will not change on retry.
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+# With shared limits: how long a snapshot of them answers paused_for(),
+# estimated_wait() and stats() before it is read again, and how soon
+# admission tries again after the store failed.
+SNAPSHOT_TTL = 1.0
+STORE_RETRY = 0.5
+
+
+def rate_limit_delay(headers: Mapping[str, str]) -> Optional[float]:
+    """Seconds to hold off submitting, from Retry-After or exhausted rate-limit headers."""
+    delay = poll_hint(headers)
+    if delay is not None:
+        return delay
+    remaining = headers.get("x-ratelimit-remaining")
+    reset = headers.get("x-ratelimit-reset")
+    if remaining is not None and reset is not None:
+        try:
+            if float(remaining) <= 0:
+                reset_value = float(reset)
+                # Some APIs send an epoch timestamp, others a relative number of seconds.
+                return max(0.0, reset_value - time.time()) if reset_value > 1e9 else max(0.0, reset_value)
+        except ValueError:
+            return None
+    return None
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """Exponential backoff with full jitter for retry number attempt (0-based)."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class AdmissionController:
+    """
+    Client-side admission for submissions under one API key.
+
+    Callers wait in a FairQueue (priority classes, weighted fair sharing
+    across clients). Whenever an active-task slot (held until the job
+    finishes polling, mirroring the API's per-key concurrency limit) and a
+    token from the submit-rate bucket are both available, the queue's next
+    ticket is admitted. Choosing only at that moment means queued work is
+    preempted by higher-priority arrivals until it is actually submitted. A
+    429 or exhausted rate-limit header pauses the whole queue until the
+    server's reset time instead of letting every caller retry on its own.
+    A rate of 0 turns the token bucket off; slots and pauses still apply.
+
+    With shared (shared.SharedLimits), the token bucket, the active-task
+    count and pauses are those of every worker process using the key, kept
+    in the shared store; the queue, and so priorities and fairness, stay
+    per process. active and admitted still count this process only. The
+    store is only called from threads: admission runs in a task, released
+    slots are handed back by it, and the read-only methods answer from a
+    snapshot refreshed in the background. A failing store delays admissions
+    but never fails a release.
+    """
+
+    def __init__(
+        self,
+        *,
+        rate: float = 2.0,
+        burst: int = 5,
+        max_active: int = 24,
+        weights: Optional[Mapping[str, float]] = None,
+        max_queue_wait: float = 30.0,
+        shared: Optional["SharedLimits"] = None,
+    ):
+        if rate < 0:
+            raise ValueError(f"Submit rate must be >= 0 (0 for no limit), got {rate}")
+        self.rate = rate
+        self.burst = burst
+        self.max_active = max_active
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._queue = FairQueue(weights=weights, max_wait=max_queue_wait)
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.shared = shared
+        self.active = 0
+        self.admitted = 0
+        self.throttled = 0
+        # Shared mode only: slots released here but not yet in the store, the
+        # admission task, and the last snapshot of the store.
+        self._releases = 0
+        self._pumping: Optional[asyncio.Task] = None
+        self._repump = False
+        self._background: Set[asyncio.Task] = set()
+        self._snapshot: Dict[str, float] = {"tokens": float(burst), "active": 0, "paused_until": 0.0}
+        self._snapshot_at = float("-inf")
+        self._refreshing = False
+        self.store_errors = 0
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    async def acquire(self, priority: str = "interactive", client: str = "") -> None:
+        """
+        Wait for a turn; the caller must call release() when the job is finished.
+        Raises ValueError for a priority not in scheduler.PRIORITIES.
+        """
+        ticket = self._queue.push(priority, client)
+        ticket.future = asyncio.get_running_loop().create_future()
+        self._pump()
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            if ticket.future.done() and not ticket.future.cancelled():
+                # Admitted just as the caller gave up: hand the slot back.
+                self.release()
+            else:
+                self._queue.discard(ticket)
+            raise
+        metrics.queue_wait_seconds.observe(time.monotonic() - ticket.enqueued_at, priority=priority)
+
+    async def reserve(self) -> None:
+        """
+        Take an active-task slot without queueing or a submit token, for a job
+        already running at the API. It counts against max_active even when
+        that means exceeding it, since the API counts it too.
+        """
+        self.active += 1
+        if self.shared is not None:
+            try:
+                await asyncio.to_thread(self.shared.reserve)
+            except Exception:
+                # Only the other workers' view of the key is off; the job still runs.
+                self.store_errors += 1
+
+    def release(self) -> None:
+        self.active -= 1
+        if self.shared is not None:
+            # Handed back to the store by the admission task.
+            self._releases += 1
+        self._pump()
+
+    def throttle(self, delay: float) -> None:
+        """Pause new admissions for delay seconds (e.g. after a 429)."""
+        self.throttled += 1
+        self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+        if self.shared is not None:
+            self._snapshot["paused_until"] = max(self._snapshot["paused_until"], self._blocked_until)
+            self._in_background(self.shared.pause, self.rate, self.burst, delay)
+
+    def paused_for(self) -> float:
+        """Seconds left of a pause set by throttle(), 0 when admitting normally."""
+        paused = max(0.0, self._blocked_until - time.monotonic())
+        if self.shared is not None:
+            paused = max(paused, self._shared_snapshot()["paused_for"])
+        return paused
+
+    def _pump(self) -> None:
+        """Admit queued tickets while slots and tokens allow; otherwise retry when a token is due."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self.shared is not None:
+            if self._pumping is None or self._pumping.done():
+                self._pumping = asyncio.get_running_loop().create_task(self._pump_shared())
+            else:
+                self._repump = True
+            return
+        while self._queue and self.active < self.max_active:
+            wait = self._token_wait()
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._pump)
+                return
+            ticket = self._queue.pop()
+            if ticket is None:
+                return
+            if ticket.future.done():
+                # Its caller was cancelled and has not run its cleanup yet.
+                continue
+            self._tokens -= 1
+            self.active += 1
+            self.admitted += 1
+            ticket.future.set_result(None)
+
+    async def _pump_shared(self) -> None:
+        # Runs again when _pump() was called meanwhile, and retries after
+        # STORE_RETRY when the store failed; released slots are kept until
+        # they are in the store.
+        while True:
+            self._repump = False
+            try:
+                wait = await self._admit_shared()
+            except Exception:
+                self.store_errors += 1
+                wait = STORE_RETRY
+            if not self._repump:
+                break
+        if wait > 0 and (self._queue or self._releases):
+            self._timer = asyncio.get_running_loop().call_later(wait, self._pump)
+
+    async def _admit_shared(self) -> float:
+        """
+        The local loop of _pump() with the token and slot taken from the
+        shared store in one transaction. Returns the seconds to wait before
+        trying again, 0 when the queue is empty. A slot freed by another
+        worker is noticed by the timer, not by a release() here.
+        """
+        if self._releases:
+            released, self._releases = self._releases, 0
+            try:
+                await asyncio.to_thread(self.shared.release, released)
+            except BaseException:
+                self._releases += released
+                raise
+        while self._queue:
+            wait = max(self._blocked_until - time.monotonic(), 0.0) or await asyncio.to_thread(
+                self.shared.take, self.rate, self.burst, self.max_active
+            )
+            if wait > 0:
+                return wait
+            ticket = self._queue.pop()
+            if ticket is None or ticket.future.done():
+                # Its caller gave up while the slot was being taken.
+                self._releases += 1
+                self._repump = True
+                continue
+            self.active += 1
+            self.admitted += 1
+            ticket.future.set_result(None)
+        return 0.0
+
+    def _in_background(self, fn: Callable[..., Any], *args: Any) -> None:
+        task = asyncio.get_running_loop().create_task(asyncio.to_thread(fn, *args))
+        self._background.add(task)
+        task.add_done_callback(self._background_done)
+
+    def _background_done(self, task: asyncio.Task) -> None:
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.store_errors += 1
+
+    def _shared_snapshot(self) -> Dict[str, float]:
+        """Tokens, active tasks and pause of all workers, at most SNAPSHOT_TTL old unless the store is failing."""
+        if time.monotonic() - self._snapshot_at > SNAPSHOT_TTL and not self._refreshing:
+            self._refreshing = True
+            try:
+                self._in_background(self._refresh_snapshot)
+            except RuntimeError:
+                # No event loop to keep free.
+                self._refresh_snapshot()
+        snapshot = self._snapshot
+        return {
+            "tokens": snapshot["tokens"],
+            "active": snapshot["active"],
+            "paused_for": max(0.0, snapshot["paused_until"] - time.monotonic()),
+        }
+
+    def _refresh_snapshot(self) -> None:
+        try:
+            snapshot = self.shared.snapshot(self.rate, self.burst)
+        finally:
+            self._refreshing = False
+        now = time.monotonic()
+        self._snapshot = {
+            "tokens": snapshot["tokens"],
+            "active": snapshot["active"],
+            "paused_until": max(now + snapshot["paused_for"], self._blocked_until),
+        }
+        self._snapshot_at = now
+
+    def estimated_wait(self, priority: str = "interactive", job_seconds: float = 0.0) -> float:
+        """
+        Rough seconds a submission of this priority queued now would wait for
+        admission: the rate limit or a 429 pause for everything queued ahead
+        of it, or, when every slot is taken, job_seconds per max_active jobs
+        ahead of it.
+        """
+        now = time.monotonic()
+        tokens = min(float(self.burst), self._tokens + (now - self._updated) * self.rate)
+        active, paused = self.active, self._blocked_until - now
+        if self.shared is not None:
+            snapshot = self._shared_snapshot()
+            tokens, active, paused = snapshot["tokens"], snapshot["active"], max(paused, snapshot["paused_for"])
+        ahead = sum(self._queue.depth(p) for p in PRIORITIES[:PRIORITIES.index(priority) + 1])
+        wait = max(0.0, paused, (ahead + 1 - tokens) / self.rate if self.rate > 0 else 0.0)
+        over = active + ahead + 1 - self.max_active
+        if over > 0:
+            wait = max(wait, over / self.max_active * job_seconds)
+        return wait
+
+    def _token_wait(self) -> float:
+        now = time.monotonic()
+        self._tokens = min(float(self.burst), self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        wait = self._blocked_until - now
+        if wait > 0:
+            return wait
+        if self._tokens >= 1 or self.rate <= 0:
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def stats(self) -> Dict[str, Any]:
+        queue = self._queue.stats()
+        stats: Dict[str, Any] = {
+            "active": self.active,
+            "max_active": self.max_active,
+            "queued": self.queued,
+            "queued_by_priority": queue["queued"],
+            "overtaken": queue["overtaken"],
+            "admitted": self.admitted,
+            "throttled": self.throttled,
+        }
+        if self.shared is not None:
+            stats["active_all_workers"] = self._shared_snapshot()["active"]
+            stats["store_errors"] = self.store_errors
+        return stats
@@ -0,0 +1,134 @@
+import asyncio
+import hashlib
+import json
+import mimetypes
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+try:
+    from .singleflight import SingleFlight
+    from .transport import get_download_client
+except ImportError:
+    from singleflight import SingleFlight
+    from transport import get_download_client
+
+
+_EXTENSIONS = {"image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp"}
+
+
+def _safe_name(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", name)[:128]
+
+
+def _extension(content_type: str, url: str) -> str:
+    ext = _EXTENSIONS.get(content_type) or mimetypes.guess_extension(content_type or "") or ""
+    if not ext:
+        ext = Path(urlparse(url).path).suffix
+    return ext if len(ext) <= 6 else ""
+
+
+class ArtifactStore:
+    """
+    Local copies of generated images, so consumers are not left holding an
+    expired sample URL.
+
+    Images are streamed to disk chunk by chunk (never held in memory whole),
+    written to a .part file and renamed into place once complete. A JSON
+    manifest with the SHA-256 and size is written next to each file, and an
+    image that is already on disk is not downloaded again. At most
+    max_concurrency downloads run at once; concurrent requests for the same
+    image share one download.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        *,
+        max_concurrency: int = 4,
+        chunk_size: int = 64 * 1024,
+        timeout: float = 60.0,
+    ):
+        self.directory = Path(directory)
+        self.max_concurrency = max_concurrency
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._flights = SingleFlight()
+        self.downloads = 0
+        self.reused = 0
+        self.failures = 0
+        self.bytes_written = 0
+
+    async def fetch(self, url: str, name: str) -> Dict[str, Any]:
+        """Return the manifest for name, downloading url first if it is not on disk yet."""
+        name = _safe_name(name)
+        manifest = await asyncio.to_thread(self._load_manifest, name)
+        if manifest is not None:
+            self.reused += 1
+            return manifest
+        manifest, _ = await self._flights.do(name, lambda: self._download(url, name))
+        return dict(manifest)
+
+    def _load_manifest(self, name: str) -> Optional[Dict[str, Any]]:
+        try:
+            manifest = json.loads((self.directory / f"{name}.json").read_text())
+            if os.path.getsize(manifest["path"]) == manifest["bytes"]:
+                return manifest
+        except (OSError, ValueError, KeyError):
+            pass
+        return None
+
+    async def _download(self, url: str, name: str) -> Dict[str, Any]:
+        async with self._slots:
+            await asyncio.to_thread(self.directory.mkdir, parents=True, exist_ok=True)
+            part = self.directory / f"{name}.part"
+            digest = hashlib.sha256()
+            size = 0
+            try:
+                async with get_download_client().stream("GET", url, timeout=self.timeout) as resp:
+                    resp.raise_for_status()
+                    content_type = resp.headers.get("content-type", "").split(";")[0].strip()
+                    f = await asyncio.to_thread(open, part, "wb")
+                    try:
+                        async for chunk in resp.aiter_bytes(self.chunk_size):
+                            digest.update(chunk)
+                            size += len(chunk)
+                            await asyncio.to_thread(f.write, chunk)
+                    finally:
+                        await asyncio.to_thread(f.close)
+            except BaseException:
+                self.failures += 1
+                await asyncio.to_thread(part.unlink, missing_ok=True)
+                raise
+
+        path = (self.directory / f"{name}{_extension(content_type, url)}").resolve()
+        manifest = {
+            "path": str(path),
+            "uri": path.as_uri(),
+            "sha256": digest.hexdigest(),
+            "bytes": size,
+            "content_type": content_type or None,
+        }
+        await asyncio.to_thread(self._commit, part, path, name, manifest)
+        self.downloads += 1
+        self.bytes_written += size
+        return manifest
+
+    def _commit(self, part: Path, path: Path, name: str, manifest: Dict[str, Any]) -> None:
+        os.replace(part, path)
+        tmp = self.directory / f"{name}.json.part"
+        tmp.write_text(json.dumps(manifest, indent=2))
+        os.replace(tmp, self.directory / f"{name}.json")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "directory": str(self.directory),
+            "downloads": self.downloads,
+            "reused": self.reused,
+            "failures": self.failures,
+            "bytes_written": self.bytes_written,
+            "in_flight": self._flights.in_flight,
+        }
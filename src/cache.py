@@ -0,0 +1,143 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+if TYPE_CHECKING:
+    import sqlite3
+
+
+def open_database(path: str) -> "sqlite3.Connection":
+    """
+    Connect to the SQLite file at path, creating its directory, in WAL mode
+    with synchronous=NORMAL so worker processes sharing the file read while
+    one of them writes. ":memory:" gives a private in-memory database.
+
+    sqlite3 is imported here, on first use, so a server that enables none of
+    the SQLite-backed features (persistent cache, journal, shared state,
+    prompt index) never loads it.
+    """
+    import sqlite3
+
+    if path == ":memory:":
+        return sqlite3.connect(path, check_same_thread=False)
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    db = sqlite3.connect(path, timeout=10.0, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    return db
+
+
+def cache_key(model: str, payload: Dict[str, Any]) -> str:
+    """Canonical hash of the request FluxAdapter sends to /v1/{model}."""
+    canonical = json.dumps({"model": model, "payload": payload}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class GenerationCache:
+    """
+    Cache of (sample, meta) results keyed by cache_key().
+
+    An in-memory LRU tier sits in front of an optional SQLite tier. Entries in
+    both tiers expire after ttl seconds because BFL sample URLs do.
+    """
+
+    def __init__(self, *, max_entries: int = 256, ttl: float = 600.0, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self._memory: "OrderedDict[str, Tuple[float, str, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional["sqlite3.Connection"] = None
+        self._puts = 0
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+        if path:
+            self._db = open_database(path)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS generations ("
+                "key TEXT PRIMARY KEY, expires_at REAL NOT NULL, sample TEXT NOT NULL, meta TEXT NOT NULL)"
+            )
+            self._db.commit()
+
+    def get(self, key: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, sample, meta = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return sample, dict(meta)
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT expires_at, sample, meta FROM generations WHERE key = ? AND expires_at > ?",
+                    (key, now),
+                ).fetchone()
+                if row is not None:
+                    expires_at, sample, meta_json = row
+                    meta = json.loads(meta_json)
+                    self._remember(key, expires_at, sample, meta)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return sample, dict(meta)
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, sample: str, meta: Dict[str, Any]) -> None:
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, expires_at, sample, meta)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO generations (key, expires_at, sample, meta) VALUES (?, ?, ?, ?)",
+                    (key, expires_at, sample, json.dumps(meta)),
+                )
+                self._puts += 1
+                if self._puts % 100 == 0:
+                    self._db.execute("DELETE FROM generations WHERE expires_at <= ?", (time.time(),))
+                self._db.commit()
+
+    def _remember(self, key: str, expires_at: float, sample: str, meta: Dict[str, Any]) -> None:
+        self._memory[key] = (expires_at, sample, dict(meta))
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def aget(self, key: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        # SQLite lookups are blocking file I/O; keep them off the event loop.
+        if self._db is None:
+            return self.get(key)
+        return await asyncio.to_thread(self.get, key)
+
+    async def aput(self, key: str, sample: str, meta: Dict[str, Any]) -> None:
+        if self._db is None:
+            self.put(key, sample, meta)
+        else:
+            await asyncio.to_thread(self.put, key, sample, meta)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "memory_entries": len(self._memory),
+                "persistent": self._db is not None,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -1,11 +1,79 @@
 import os
 import time
-import base64
-from pathlib import Path
-from typing import Optional, Tuple, Dict, Any
-import requests
+import hashlib
+import contextlib
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional, Tuple, Dict, Any, Awaitable, Callable, ContextManager, List
 import asyncio
 
+# httpx, like requests, is imported on first use (see transport).
+if TYPE_CHECKING:
+    import httpx
+    import requests
+
+try:
+    from .admission import RETRYABLE_STATUS, AdmissionController, backoff_delay, rate_limit_delay
+    from .artifacts import ArtifactStore
+    from .breaker import BreakerRegistry, CircuitBreaker, CircuitOpenError
+    from .cache import GenerationCache, cache_key
+    from .input_images import InputImageEncoder
+    from .journal import JobJournal
+    from .keypool import key_id
+    from . import metrics
+    from .polling import AdaptivePollSchedule, FixedPollSchedule, LatencyTracker, PollMultiplexer, latency_tracker, poll_hint
+    from .similar import PromptIndex
+    from .singleflight import SingleFlight
+    from .tracing import Timeline, TraceLog
+    from .transport import get_async_client, get_session
+except ImportError:
+    from admission import RETRYABLE_STATUS, AdmissionController, backoff_delay, rate_limit_delay
+    from artifacts import ArtifactStore
+    from breaker import BreakerRegistry, CircuitBreaker, CircuitOpenError
+    from cache import GenerationCache, cache_key
+    from input_images import InputImageEncoder
+    from journal import JobJournal
+    from keypool import key_id
+    import metrics
+    from polling import AdaptivePollSchedule, FixedPollSchedule, LatencyTracker, PollMultiplexer, latency_tracker, poll_hint
+    from similar import PromptIndex
+    from singleflight import SingleFlight
+    from tracing import Timeline, TraceLog
+    from transport import get_async_client, get_session
+
+
+# Receives each get_result body (plus a synthetic "Submitted" event) while a request is in flight.
+StatusCallback = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+def _best_effort() -> ContextManager[None]:
+    """
+    Guard for the side channels of a generation: status callbacks, the trace
+    log, the journal and the prompt index. Their errors are swallowed, since
+    none of them may fail the generation itself.
+    """
+    return contextlib.suppress(Exception)
+
+
+async def _emit_status(callback: StatusCallback, body: Dict[str, Any]) -> None:
+    with _best_effort():
+        await callback(body)
+
+
+@dataclass(frozen=True)
+class GenerationOptions:
+    """Per-request generation parameters, kept separate from the HTTP transport."""
+    model: str = "flux-pro-1.1"
+    raw: bool = False
+    aspect_ratio: Optional[str] = "16:9"
+    width: int = 1024
+    height: int = 1024
+    safety_tolerance: int = 6
+    prompt_upsampling: bool = False
+    seed: Optional[int] = None
+    # Admission scheduling only; never sent to the API (see scheduler.FairQueue).
+    priority: str = "interactive"
+    client: str = ""
+
 
 class FluxAdapter:
     def __init__(
@@ -24,117 +92,766 @@ class FluxAdapter:
         connect_timeout: int = 10,
         read_timeout: int = 120,
         max_post_retries: int = 3,
+        session: Optional["requests.Session"] = None,
+        client: Optional["httpx.AsyncClient"] = None,
+        adaptive_polling: bool = True,
+        tracker: Optional[LatencyTracker] = None,
+        poller: Optional[PollMultiplexer] = None,
+        cache: Optional[GenerationCache] = None,
+        singleflight: Optional[SingleFlight] = None,
+        admission: Optional[AdmissionController] = None,
+        breakers: Optional[BreakerRegistry] = None,
+        artifacts: Optional[ArtifactStore] = None,
+        input_encoder: Optional[InputImageEncoder] = None,
+        trace_log: Optional[TraceLog] = None,
+        journal: Optional[JobJournal] = None,
+        prompt_index: Optional[PromptIndex] = None,
+        status_listeners: Optional[Dict[str, List[StatusCallback]]] = None,
     ):
         self.api_key = api_key or os.getenv("BFL_API_KEY")
         if not self.api_key:
             raise ValueError("BFL_API_KEY not set")
+        # Names the key in the journal and health output without revealing it.
+        self.key_id = key_id(self.api_key)
 
         self.base_url = base_url.rstrip("/")
-        self.model = model
-        self.use_raw_mode = use_raw_mode
-        self.aspect_ratio = aspect_ratio
-        self.width = width
-        self.height = height
-        self.safety_tolerance = safety_tolerance
-        self.prompt_upsampling = prompt_upsampling
+        # Constructor options are the defaults; callers may pass different
+        # GenerationOptions per request and still share this adapter.
+        self.options = GenerationOptions(
+            model=model,
+            raw=use_raw_mode,
+            aspect_ratio=aspect_ratio,
+            width=width,
+            height=height,
+            safety_tolerance=safety_tolerance,
+            prompt_upsampling=prompt_upsampling,
+        )
         self.poll_timeout = poll_timeout
         self.connect_timeout = connect_timeout
         self.read_timeout = read_timeout
         self.max_post_retries = max_post_retries
+        self.adaptive_polling = adaptive_polling
+        self.latency_tracker = tracker or latency_tracker
+        # When set, polling is delegated to a shared multiplexer instead of a private loop.
+        self.poller = poller
+        self.cache = cache
+        # Identical payloads already in flight share one submission and poll loop.
+        self.singleflight = singleflight
+        # Shared by adapters that share a singleflight, so a caller coalesced
+        # onto a request submitted with another key still sees its polls.
+        self._status_listeners: Dict[str, List[StatusCallback]] = {} if status_listeners is None else status_listeners
+        # Per-key submit rate / active-task limits; a slot is held from submit() until polling ends.
+        self.admission = admission
+        # Circuit breakers per endpoint: "submit:<model>" and "poll".
+        self.breakers = breakers
+        self.artifacts = artifacts
+        # Caches encoded input images; shared with other adapters when passed in.
+        self.input_encoder = input_encoder or InputImageEncoder()
+        # Optional JSONL file receiving every generation's timeline.
+        self.trace_log = trace_log
+        # Optional journal of accepted submissions, so polling can resume after a restart.
+        self.journal = journal
+        # Optional index of past prompts for answering near-duplicates (similarity_threshold).
+        self.prompt_index = prompt_index
 
-        self._session = requests.Session()
-        self._session.headers.update({
-            "accept": "application/json",
-            "x-key": self.api_key,
-            "Content-Type": "application/json",
-        })
+        # Pooled keep-alive session for the sync path, resolved on first use so
+        # that servers which only generate asynchronously never import requests.
+        self._session = session
+        # The async client is resolved lazily because it must be created on the running loop.
+        self._client = client
 
-    async def generate(self, prompt_text: str, *, input_image: Optional[str] = None, guidance_scale: Optional[float] = None) -> Tuple[str, Dict]:
-        return await asyncio.to_thread(self._generate_sync, prompt_text, input_image, guidance_scale)
+    @property
+    def model(self) -> str:
+        return self.options.model
 
-    # ---------------- internal (sync) ----------------
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        return self._client or get_async_client(self.api_key, self.base_url)
+
+    @property
+    def session(self) -> "requests.Session":
+        return self._session or get_session(self.api_key, self.base_url)
+
+    async def generate(
+        self,
+        prompt_text: str,
+        *,
+        input_image: Optional[str] = None,
+        guidance_scale: Optional[float] = None,
+        options: Optional[GenerationOptions] = None,
+        use_cache: bool = True,
+        on_status: Optional[StatusCallback] = None,
+        download: bool = False,
+        timings: bool = False,
+        similarity_threshold: Optional[float] = None,
+    ) -> Tuple[str, Dict]:
+        """
+        Generate an image and return (sample_url, meta).
+
+        With a cache configured, an identical earlier request is answered from
+        it (meta["cached"] is True). use_cache=False skips the lookup but still
+        stores the fresh result. With single-flight enabled, a request identical
+        to one already in flight waits for that one (meta["coalesced"] is True).
+        on_status is awaited with every poll response the request sees, including
+        when it is coalesced onto another caller's request. download=True also
+        saves the image locally as soon as it is Ready (see materialize()).
+        timings=True adds the request's timeline to meta["timings"]; with a
+        trace_log configured every timeline is also written there.
+        With a prompt_index and similarity_threshold (0-1), a cache miss is
+        answered by an earlier generation with the same parameters whose
+        prompt is at least that similar; meta["similar"] holds the score and
+        the earlier prompt.
+        """
+        options = options or self.options
+        started = time.monotonic()
+        timeline = Timeline(options.model)
+        try:
+            sample, meta = await self._generate(
+                prompt_text, input_image, guidance_scale, options, use_cache, on_status, download, timeline,
+                similarity_threshold,
+            )
+        except Exception as e:
+            metrics.errors_total.inc(model=options.model, type=type(e).__name__)
+            timeline.mark("error", type=type(e).__name__)
+            self.record_trace(timeline, "api", error=e)
+            raise
+        if meta.get("cached"):
+            source = "cache"
+        elif meta.get("similar"):
+            source = "similar"
+        elif meta.get("coalesced"):
+            source = "coalesced"
+        else:
+            source = "api"
+        metrics.generation_seconds.observe(time.monotonic() - started, model=options.model, source=source)
+        self.record_trace(timeline, source, meta)
+        if timings:
+            meta["timings"] = timeline.to_dict()
+        return sample, meta
+
+    def record_trace(
+        self,
+        timeline: Timeline,
+        source: str,
+        meta: Optional[Dict[str, Any]] = None,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        """Append timeline to the trace log, if one is configured."""
+        if self.trace_log is None:
+            return
+        record = {
+            "model": timeline.model,
+            "source": source,
+            "status": "error" if error is not None else "success",
+            "request_id": (meta or {}).get("request_id"),
+            **timeline.to_dict(),
+        }
+        if error is not None:
+            record["error_type"] = type(error).__name__
+        with _best_effort():
+            self.trace_log.write(record)
+
+    async def _generate(
+        self,
+        prompt_text: str,
+        input_image: Optional[str],
+        guidance_scale: Optional[float],
+        options: GenerationOptions,
+        use_cache: bool,
+        on_status: Optional[StatusCallback],
+        download: bool,
+        timeline: Timeline,
+        similarity_threshold: Optional[float] = None,
+    ) -> Tuple[str, Dict[str, Any]]:
+        payload = await self.prepare_payload(prompt_text, input_image=input_image, guidance_scale=guidance_scale, options=options)
+        if input_image:
+            # The payload then holds a data URL that can be megabytes long.
+            key = await asyncio.to_thread(cache_key, options.model, payload)
+        else:
+            key = cache_key(options.model, payload)
+
+        if use_cache:
+            cached = await self.lookup_cached(payload, options, key)
+            if cached is not None:
+                timeline.mark("cache_hit")
+                sample, meta = cached
+                return sample, (await self._materialize_and_index(key, payload, options, sample, meta, timeline) if download else meta)
+            if similarity_threshold is not None and self.prompt_index is not None:
+                similar = await self.lookup_similar(payload, options, similarity_threshold)
+                if similar is not None:
+                    timeline.mark("similar_hit", score=similar[1]["similar"]["score"])
+                    sample, meta = similar
+                    return sample, (await self.materialize(sample, meta, timeline) if download else meta)
+
+        # Each caller records the polls it sees, including when coalesced onto another's request.
+        listener = timeline.status_recorder(on_status)
+        self._status_listeners.setdefault(key, []).append(listener)
+        try:
+            if self.singleflight is None:
+                sample, meta = await self._generate_and_store(key, payload, options, timeline)
+                shared = False
+            else:
+                (sample, meta), shared = await self.singleflight.do(
+                    key, lambda: self._generate_and_store(key, payload, options, timeline)
+                )
+        finally:
+            listeners = self._status_listeners[key]
+            listeners.remove(listener)
+            if not listeners:
+                del self._status_listeners[key]
+        timeline.mark("ready")
 
-    def _generate_sync(self, prompt_text: str, input_image: Optional[str], guidance_scale: Optional[float]) -> Tuple[str, Dict[str, Any]]:
+        meta = dict(meta)
+        if shared:
+            meta["coalesced"] = True
+        if download:
+            meta = await self._materialize_and_index(key, payload, options, sample, meta, timeline)
+        return sample, meta
+
+    async def _materialize_and_index(
+        self,
+        key: str,
+        payload: Dict[str, Any],
+        options: GenerationOptions,
+        sample: str,
+        meta: Dict[str, Any],
+        timeline: Timeline,
+    ) -> Dict[str, Any]:
+        # A downloaded image outlives its sample URL, so its index entry stops expiring.
+        meta = await self.materialize(sample, meta, timeline)
+        if "artifact" in meta:
+            await self.index_result(payload, options, sample, meta, key)
+        return meta
+
+    async def materialize(self, sample: str, meta: Dict[str, Any], timeline: Optional[Timeline] = None) -> Dict[str, Any]:
+        """
+        Save the image at sample to the artifact store and return meta with
+        meta["artifact"] (path, uri, sha256, bytes, content_type). A failed
+        download does not fail the generation: meta["artifact_error"] is set
+        instead and the sample URL is still returned.
+        """
+        meta = dict(meta)
+        if self.artifacts is None:
+            meta["artifact_error"] = "No artifact directory configured"
+            return meta
+        name = meta.get("request_id") or hashlib.sha256(sample.encode("utf-8")).hexdigest()
+        if timeline is not None:
+            timeline.mark("download_start")
+        try:
+            meta["artifact"] = await self.artifacts.fetch(sample, name)
+        except Exception as e:
+            meta["artifact_error"] = f"{type(e).__name__}: {e}"
+        if timeline is not None:
+            timeline.mark("download_end")
+        return meta
+
+    async def prepare_payload(
+        self,
+        prompt_text: str,
+        *,
+        input_image: Optional[str] = None,
+        guidance_scale: Optional[float] = None,
+        options: Optional[GenerationOptions] = None,
+    ) -> Dict[str, Any]:
+        """Build the JSON body for /v1/{model}."""
+        options = options or self.options
+        if input_image:
+            # Reading and base64-encoding a local file is blocking work.
+            return await asyncio.to_thread(self._build_payload, prompt_text, input_image, guidance_scale, options)
+        return self._build_payload(prompt_text, input_image, guidance_scale, options)
+
+    async def submit(
+        self,
+        payload: Dict[str, Any],
+        options: Optional[GenerationOptions] = None,
+        timeline: Optional[Timeline] = None,
+        key: Optional[str] = None,
+        job_id: Optional[str] = None,
+    ) -> Tuple[str, str]:
+        """
+        POST payload to /v1/{model} and return (request_id, polling_url).
+
+        With admission control this first waits for a turn; the slot it takes
+        is released by wait_for_result(), which must follow a successful submit.
+        Raises CircuitOpenError without calling the API while the model's
+        submit circuit is open. With a journal configured, the accepted
+        submission is recorded under its cache key and job_id before returning.
+        """
+        options = options or self.options
+        breaker = self.breakers.get(f"submit:{options.model}") if self.breakers is not None else None
+        if breaker is not None:
+            # Fail fast before queueing for admission; the half-open probe is
+            # only taken once admitted, so a caller that never gets there
+            # cannot hold it.
+            breaker.fail_fast()
+        if self.admission is not None:
+            queued = time.monotonic()
+            if timeline is not None:
+                timeline.mark("queued", priority=options.priority)
+            await self.admission.acquire(options.priority, options.client)
+            metrics.admission_wait_seconds.observe(time.monotonic() - queued, model=options.model)
+            if timeline is not None:
+                timeline.mark("admitted")
+        try:
+            if breaker is not None:
+                breaker.before_call()
+            started = time.monotonic()
+            if timeline is not None:
+                timeline.mark("post_start")
+            resp = await self._post_with_retries_async(f"{self.base_url}/v1/{options.model}", payload, breaker, options.model)
+            submission = self._parse_submission(resp.json())
+            metrics.submit_seconds.observe(time.monotonic() - started, model=options.model)
+            if timeline is not None:
+                timeline.mark("post_end", request_id=submission[0])
+            if self.journal is not None:
+                # Inside the guard: a caller cancelled during the write must not keep the slot.
+                await self._journal(
+                    "record", *submission, options.model, key or cache_key(options.model, payload), job_id, self.key_id
+                )
+        except BaseException as e:
+            if self.admission is not None:
+                self.admission.release()
+            import httpx
+
+            if isinstance(e, httpx.HTTPStatusError):
+                # Callers coalesced onto this submission through a shared
+                # singleflight get this error too; it names the rejected key.
+                e.key_id = self.key_id
+            raise
+        return submission
+
+    async def resume(
+        self,
+        request_id: str,
+        polling_url: str,
+        model: str,
+        key: Optional[str] = None,
+        on_status: Optional[StatusCallback] = None,
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        Poll a submission made before a restart until Ready, cache the result
+        under key and return (sample_url, meta). The job takes an admission
+        slot like a new submission but no submit-rate token.
+        """
+        if self.admission is not None:
+            await self.admission.reserve()
+        options = GenerationOptions(model=model)
+        sample, meta = await self.wait_for_result(request_id, polling_url, options, on_status)
+        if key is not None and self.cache is not None:
+            await self.cache.aput(key, sample, meta)
+        return sample, meta
+
+    async def wait_for_result(
+        self,
+        request_id: str,
+        polling_url: str,
+        options: Optional[GenerationOptions] = None,
+        on_status: Optional[StatusCallback] = None,
+        timeline: Optional[Timeline] = None,
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Poll a submitted request until Ready and return (sample_url, meta)."""
+        options = options or self.options
+        if timeline is not None:
+            on_status = timeline.status_recorder(on_status)
+        # Records queue/processing time and polls per job, then forwards to on_status.
+        observer = metrics.JobObserver(options.model, on_status)
+        try:
+            await _emit_status(observer, {"id": request_id, "status": "Submitted"})
+            # Cancelling the awaiting task stops polling at the next await point.
+            if self.poller is not None:
+                result = await self.poller.track(self, polling_url, request_id, options.model, self.poll_timeout, observer)
+            else:
+                result = await self._poll_for_result_async(polling_url, request_id, self.poll_timeout, options.model, observer)
+            sample, meta = self._build_result(request_id, options, result)
+        except Exception as e:
+            # Cancellation (e.g. shutdown) is not an outcome: the entry stays pending and is resumed.
+            if self.journal is not None:
+                await self._journal("finish", request_id, {"status": "error", "message": str(e), "error_type": type(e).__name__})
+            raise
+        finally:
+            observer.finish()
+            if self.admission is not None:
+                self.admission.release()
+        if self.journal is not None:
+            await self._journal("finish", request_id, {"status": "success", "image": sample, "meta": meta})
+        return sample, meta
+
+    async def _journal(self, method: str, *args: Any) -> None:
+        with _best_effort():
+            await asyncio.to_thread(getattr(self.journal, method), *args)
+
+    async def lookup_cached(
+        self,
+        payload: Dict[str, Any],
+        options: Optional[GenerationOptions] = None,
+        key: Optional[str] = None,
+    ) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Return a cached (sample_url, meta) for payload, or None."""
+        if self.cache is None:
+            return None
+        options = options or self.options
+        cached = await self.cache.aget(key or cache_key(options.model, payload))
+        if cached is None:
+            return None
+        sample, meta = cached
+        meta["cached"] = True
+        return sample, meta
+
+    async def store_result(
+        self,
+        payload: Dict[str, Any],
+        options: Optional[GenerationOptions],
+        sample: str,
+        meta: Dict[str, Any],
+        key: Optional[str] = None,
+    ) -> None:
+        if self.cache is not None:
+            options = options or self.options
+            await self.cache.aput(key or cache_key(options.model, payload), sample, meta)
+        await self.index_result(payload, options, sample, meta, key)
+
+    async def lookup_similar(
+        self,
+        payload: Dict[str, Any],
+        options: Optional[GenerationOptions],
+        threshold: float,
+    ) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Return (sample_url, meta) of the indexed generation most similar to
+        payload's prompt, if its score is at least threshold, else None.
+        Raises ValueError for a threshold outside (0, 1].
+        """
+        if not 0 < threshold <= 1:
+            raise ValueError(f"similarity_threshold must be in (0, 1], got {threshold}")
+        if self.prompt_index is None:
+            return None
+        options = options or self.options
+        found = await self.prompt_index.alookup(options.model, payload, threshold)
+        if found is None:
+            return None
+        sample, meta, score, prompt = found
+        meta["similar"] = {"score": round(score, 3), "prompt": prompt}
+        return sample, meta
+
+    async def index_result(
+        self,
+        payload: Dict[str, Any],
+        options: Optional[GenerationOptions],
+        sample: str,
+        meta: Dict[str, Any],
+        key: Optional[str] = None,
+    ) -> None:
+        """Add a generation to the prompt index, if one is configured."""
+        if self.prompt_index is None or "input_image" in payload:
+            return
+        options = options or self.options
+        with _best_effort():
+            await self.prompt_index.aadd(key or cache_key(options.model, payload), options.model, payload, sample, meta)
+
+    def generate_sync(
+        self,
+        prompt_text: str,
+        *,
+        input_image: Optional[str] = None,
+        guidance_scale: Optional[float] = None,
+        options: Optional[GenerationOptions] = None,
+        use_cache: bool = True,
+    ) -> Tuple[str, Dict]:
+        """Blocking variant of generate() for scripts without an event loop."""
+        return self._generate_sync(prompt_text, input_image, guidance_scale, options, use_cache)
+
+    async def poll_once(
+        self,
+        polling_url: str,
+        request_id: str,
+        on_status: Optional[StatusCallback] = None,
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[float]]:
+        """
+        Check get_result once.
+
+        Returns (result, hint): result is the response once Ready and None
+        otherwise, hint is a server-suggested wait in seconds (or None).
+        Raises RuntimeError if BFL reports the generation failed. While the
+        poll circuit is open no request is made and the hint is the time until
+        the next probe, so in-flight jobs back off instead of failing.
+        """
+        import httpx
+
+        breaker = self.breakers.get("poll") if self.breakers is not None else None
+        if breaker is not None:
+            try:
+                breaker.before_call()
+            except CircuitOpenError as e:
+                return None, max(e.retry_in, 1.0)
+
+        started = time.monotonic()
+        try:
+            r = await self.client.get(
+                polling_url,
+                params={"id": request_id},
+                timeout=5,
+                extensions={"trace": metrics.connection_trace()},
+            )
+        except httpx.HTTPError as e:
+            self._record_outcome(breaker, False)
+            metrics.errors_total.inc(type=f"poll:{type(e).__name__}")
+            return None, None
+        metrics.poll_request_seconds.observe(time.monotonic() - started)
+        self._record_outcome(breaker, r.status_code < 500)
+        if r.is_error:
+            metrics.errors_total.inc(type=f"poll:{r.status_code}")
+            return None, poll_hint(r.headers)
+        try:
+            result = r.json()
+        except ValueError:
+            return None, None
+
+        if on_status is not None:
+            await _emit_status(on_status, result)
+
+        if self._check_poll_result(result):
+            return result, None
+        return None, poll_hint(r.headers, result)
+
+    def poll_schedule(self, model: str):
+        if not self.adaptive_polling:
+            return FixedPollSchedule(0.5)
+        return AdaptivePollSchedule(model, self.latency_tracker)
+
+    # ---------------- internal (shared) ----------------
+
+    def _build_payload(
+        self,
+        prompt_text: str,
+        input_image: Optional[str],
+        guidance_scale: Optional[float],
+        options: GenerationOptions,
+    ) -> Dict[str, Any]:
         payload: Dict[str, Any] = {
             "prompt": prompt_text,
-            "safety_tolerance": self.safety_tolerance,
-            "prompt_upsampling": self.prompt_upsampling,
-            "raw": self.use_raw_mode,
+            "safety_tolerance": options.safety_tolerance,
+            "prompt_upsampling": options.prompt_upsampling,
+            "raw": options.raw,
         }
 
         if guidance_scale is not None:
             payload["guidance_scale"] = guidance_scale
 
+        if options.seed is not None:
+            payload["seed"] = options.seed
+
         # image+text support: use 'input_image' for Kontext models
         if input_image:
             payload["input_image"] = self._to_data_url_if_needed(input_image)
 
-        if self.aspect_ratio:
-            payload["aspect_ratio"] = self.aspect_ratio
+        if options.aspect_ratio:
+            payload["aspect_ratio"] = options.aspect_ratio
         else:
-            payload["width"] = self.width
-            payload["height"] = self.height
+            payload["width"] = options.width
+            payload["height"] = options.height
+        return payload
 
-        endpoint = f"{self.base_url}/v1/{self.model}"
-        resp = self._post_with_retries(endpoint, payload)
-        data = resp.json()
+    def _parse_submission(self, data: Dict[str, Any]) -> Tuple[str, str]:
         request_id = data["id"]
         polling_url = data.get("polling_url", f"{self.base_url}/v1/get_result")
+        return request_id, polling_url
 
-        result = self._poll_for_result(polling_url, request_id, self.poll_timeout)
+    @staticmethod
+    def _record_outcome(breaker: Optional[CircuitBreaker], ok: bool) -> None:
+        # Any HTTP answer below 500 (including 4xx/429) means the endpoint is up.
+        if breaker is None:
+            return
+        if ok:
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+
+    def _check_poll_result(self, result: Dict[str, Any]) -> bool:
+        """Return True once the job is Ready; raise if BFL reports a failure."""
+        status = result.get("status")
+        if status == "Ready":
+            return True
+        if status in ("Error", "Failed"):
+            raise RuntimeError(f"Generation failed: {result}")
+        return False
+
+    def _build_result(self, request_id: str, options: GenerationOptions, result: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
         sample = result.get("result", {}).get("sample")
         if not sample:
             raise RuntimeError(f"Missing sample in result: {result}")
 
         meta = {
             "request_id": request_id,
-            "model": self.model,
+            "model": options.model,
             "result": result.get("result", {}),
         }
         return sample, meta
 
-    def _post_with_retries(self, url: str, json_payload: Dict[str, Any]) -> requests.Response:
+    # ---------------- internal (async) ----------------
+
+    async def _generate_and_store(
+        self,
+        key: str,
+        payload: Dict[str, Any],
+        options: GenerationOptions,
+        timeline: Optional[Timeline] = None,
+    ) -> Tuple[str, Dict[str, Any]]:
+        # Runs inside the single flight, so the result is cached even if the first caller went away.
+        # Polls reach each caller's timeline through its status listener.
+        async def notify(body: Dict[str, Any]) -> None:
+            for listener in list(self._status_listeners.get(key, ())):
+                await _emit_status(listener, body)
+
+        request_id, polling_url = await self.submit(payload, options, timeline, key)
+        sample, meta = await self.wait_for_result(request_id, polling_url, options, notify)
+        await self.store_result(payload, options, sample, meta, key)
+        return sample, meta
+
+    async def _post_with_retries_async(
+        self,
+        url: str,
+        json_payload: Dict[str, Any],
+        breaker: Optional[CircuitBreaker] = None,
+        model: str = "",
+    ) -> "httpx.Response":
+        import httpx
+
+        timeout = httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+        last_exc = None
+        for attempt in range(self.max_post_retries):
+            delay = None
+            try:
+                resp = await self.client.post(
+                    url, json=json_payload, timeout=timeout, extensions={"trace": metrics.connection_trace()}
+                )
+            except httpx.HTTPError as e:
+                last_exc = e
+                reason = type(e).__name__
+                self._record_outcome(breaker, False)
+            else:
+                self._record_outcome(breaker, resp.status_code < 500)
+                try:
+                    resp.raise_for_status()
+                    return resp
+                except httpx.HTTPStatusError as e:
+                    last_exc = e
+                    if e.response.status_code not in RETRYABLE_STATUS:
+                        raise
+                    reason = str(e.response.status_code)
+                    delay = rate_limit_delay(e.response.headers)
+                    if e.response.status_code == 429 and self.admission is not None:
+                        # Hold back every queued submission for this key, not just this one.
+                        self.admission.throttle(delay if delay is not None else backoff_delay(attempt))
+            if breaker is not None and breaker.state == CircuitBreaker.OPEN:
+                # The endpoint is considered down; further retries would only add latency.
+                break
+            if attempt + 1 < self.max_post_retries:
+                metrics.retries_total.inc(model=model, reason=reason)
+                await asyncio.sleep(delay if delay is not None else backoff_delay(attempt))
+        assert last_exc is not None
+        raise last_exc
+
+    async def _poll_for_result_async(
+        self,
+        polling_url: str,
+        request_id: str,
+        max_wait: int,
+        model: Optional[str] = None,
+        on_status: Optional[StatusCallback] = None,
+    ) -> Dict[str, Any]:
+        model = model or self.model
+        schedule = self.poll_schedule(model)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        hint = None
+        while (elapsed := loop.time() - start) < max_wait:
+            await asyncio.sleep(min(schedule.next_delay(elapsed, hint), max_wait - elapsed))
+            result, hint = await self.poll_once(polling_url, request_id, on_status)
+            if result is not None:
+                self.latency_tracker.record(model, loop.time() - start)
+                return result
+        raise TimeoutError(f"Request {request_id} timed out after {max_wait}s")
+
+    # ---------------- internal (sync) ----------------
+
+    def _generate_sync(
+        self,
+        prompt_text: str,
+        input_image: Optional[str],
+        guidance_scale: Optional[float],
+        options: Optional[GenerationOptions] = None,
+        use_cache: bool = True,
+    ) -> Tuple[str, Dict[str, Any]]:
+        options = options or self.options
+        payload = self._build_payload(prompt_text, input_image, guidance_scale, options)
+
+        key = cache_key(options.model, payload) if self.cache is not None else None
+        if key is not None and use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                sample, meta = cached
+                meta["cached"] = True
+                return sample, meta
+
+        endpoint = f"{self.base_url}/v1/{options.model}"
+        resp = self._post_with_retries(endpoint, payload)
+        request_id, polling_url = self._parse_submission(resp.json())
+
+        result = self._poll_for_result(polling_url, request_id, self.poll_timeout, options.model)
+        sample, meta = self._build_result(request_id, options, result)
+        if key is not None:
+            self.cache.put(key, sample, meta)
+        return sample, meta
+
+    def _post_with_retries(self, url: str, json_payload: Dict[str, Any]) -> "requests.Response":
+        import requests
+
         last_exc = None
         for attempt in range(self.max_post_retries):
+            delay = None
             try:
-                resp = self._session.post(url, json=json_payload, timeout=(self.connect_timeout, self.read_timeout))
+                resp = self.session.post(url, json=json_payload, timeout=(self.connect_timeout, self.read_timeout))
                 resp.raise_for_status()
                 return resp
             except requests.exceptions.ReadTimeout as e:
                 last_exc = e
             except requests.RequestException as e:
                 last_exc = e
-            time.sleep(1.5 * (attempt + 1))
+                if e.response is not None:
+                    if e.response.status_code not in RETRYABLE_STATUS:
+                        raise
+                    delay = rate_limit_delay(e.response.headers)
+            if attempt + 1 < self.max_post_retries:
+                time.sleep(delay if delay is not None else backoff_delay(attempt))
         assert last_exc is not None
         raise last_exc
 
-    def _poll_for_result(self, polling_url: str, request_id: str, max_wait: int) -> Dict[str, Any]:
+    def _poll_for_result(self, polling_url: str, request_id: str, max_wait: int, model: Optional[str] = None) -> Dict[str, Any]:
+        import requests
+
+        model = model or self.model
+        schedule = self.poll_schedule(model)
         start = time.time()
-        while time.time() - start < max_wait:
-            time.sleep(0.5)
+        hint = None
+        while (elapsed := time.time() - start) < max_wait:
+            time.sleep(min(schedule.next_delay(elapsed, hint), max_wait - elapsed))
+            hint = None
             try:
-                r = self._session.get(polling_url, params={"id": request_id}, timeout=5)
+                r = self.session.get(polling_url, params={"id": request_id}, timeout=5)
                 r.raise_for_status()
                 result = r.json()
             except requests.exceptions.Timeout:
                 continue
-            except requests.RequestException:
+            except requests.RequestException as e:
+                if e.response is not None:
+                    hint = poll_hint(e.response.headers)
                 continue
 
-            status = result.get("status")
-            if status == "Ready":
+            hint = poll_hint(r.headers, result)
+            if self._check_poll_result(result):
+                self.latency_tracker.record(model, time.time() - start)
                 return result
-            if status in ("Error", "Failed"):
-                raise RuntimeError(f"Generation failed: {result}")
         raise TimeoutError(f"Request {request_id} timed out after {max_wait}s")
 
     def _to_data_url_if_needed(self, path_or_url: str) -> str:
-        if path_or_url.startswith(("data:", "http://", "https://")):
-            return path_or_url
-        p = Path(path_or_url)
-        if not p.is_file():
-            return path_or_url
-        ext = p.suffix.lower().lstrip(".") or "png"
-        mime = "image/png" if ext == "png" else f"image/{ext}"
-        data = base64.b64encode(p.read_bytes()).decode("utf-8")
-        return f"data:{mime};base64,{data}"
\ No newline at end of file
+        return self.input_encoder.encode(path_or_url)
\ No newline at end of file
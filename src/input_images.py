@@ -0,0 +1,210 @@
+import base64
+import io
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+
+_MIME_TYPES = {
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".webp": "image/webp",
+    ".gif": "image/gif",
+    ".bmp": "image/bmp",
+    ".tif": "image/tiff",
+    ".tiff": "image/tiff",
+}
+
+# Read and encode in multiples of 3 bytes so chunks concatenate into valid base64.
+_CHUNK = 3 * 256 * 1024
+
+
+def _encode_file(path: Path) -> str:
+    parts = []
+    with path.open("rb") as f:
+        while True:
+            chunk = f.read(_CHUNK)
+            if not chunk:
+                break
+            parts.append(base64.b64encode(chunk))
+    return b"".join(parts).decode("ascii")
+
+
+def _is_file(path: Path) -> bool:
+    # Raw base64 passed as input_image can be a "path" too long to stat.
+    try:
+        return path.is_file()
+    except OSError:
+        return False
+
+
+class InputImageEncoder:
+    """
+    Turns local input images (Kontext edits) into data URLs.
+
+    Encoded images are cached by (path, size, mtime), so sending the same
+    reference image again neither re-reads nor re-encodes it, and concurrent
+    requests for one file share a single encoding. The cache is bounded by the
+    total size of the encoded strings. With max_side or max_bytes set, larger
+    images are downscaled and recompressed first; that step needs Pillow and
+    is skipped when it is not installed.
+
+    With root set, local paths are read only from inside that directory:
+    relative paths are taken from it, and a file resolving outside it
+    (through "..", an absolute path or a symlink) is refused with
+    ValueError. With local_files=False no local file is read at all.
+
+    encode() does blocking file I/O; call it off the event loop.
+    """
+
+    def __init__(
+        self,
+        *,
+        cache_bytes: int = 64 * 1024 * 1024,
+        max_side: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        quality: int = 90,
+        root: Optional[str] = None,
+        local_files: bool = True,
+    ):
+        self.root = Path(root).resolve() if root else None
+        self.local_files = local_files
+        self.cache_bytes = cache_bytes
+        self.max_side = max_side
+        self.max_bytes = max_bytes
+        self.quality = quality
+        # resolved path -> ((size, mtime_ns), data URL)
+        self._cache: "OrderedDict[str, Tuple[Tuple[int, int], str]]" = OrderedDict()
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+        self._path_locks: Dict[str, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.resized = 0
+
+    def encode(self, path_or_url: str) -> str:
+        """Return a data URL for a local file; URLs and data URLs pass through."""
+        if path_or_url.startswith(("data:", "http://", "https://")):
+            return path_or_url
+        p = self._local_path(path_or_url)
+        if p is None:
+            return path_or_url
+        mime = _MIME_TYPES.get(p.suffix.lower())
+        if mime is None:
+            raise ValueError(f"Unsupported input image type: {p.suffix or p.name}")
+
+        st = p.stat()
+        path = str(p.resolve())
+        stamp = (st.st_size, st.st_mtime_ns)
+        with self._lock:
+            url = self._lookup(path, stamp)
+            if url is not None:
+                return url
+            path_lock = self._path_locks.setdefault(path, threading.Lock())
+
+        with path_lock:
+            with self._lock:
+                url = self._lookup(path, stamp)
+                if url is not None:
+                    return url
+                self.misses += 1
+            try:
+                url = self._encode(p, mime, st.st_size)
+                with self._lock:
+                    self._remember(path, stamp, url)
+            finally:
+                with self._lock:
+                    self._path_locks.pop(path, None)
+        return url
+
+    def _local_path(self, value: str) -> Optional[Path]:
+        """The file value names, None when it names none (e.g. raw base64); ValueError when not allowed."""
+        p = Path(value)
+        if self.root is not None:
+            p = (self.root / p).resolve()
+        # A path to an image that does not exist is refused like one that does.
+        looks_like_image = p.suffix.lower() in _MIME_TYPES
+        if not self.local_files:
+            if looks_like_image or _is_file(p):
+                raise ValueError("Local input images are disabled on this server; send an http(s) or data URL")
+            return None
+        if self.root is not None and not p.is_relative_to(self.root):
+            if looks_like_image or _is_file(p):
+                raise ValueError(f"Input image paths must be inside {self.root}")
+            return None
+        return p if _is_file(p) else None
+
+    def _lookup(self, path: str, stamp: Tuple[int, int]) -> Optional[str]:
+        entry = self._cache.get(path)
+        if entry is None or entry[0] != stamp:
+            return None
+        self._cache.move_to_end(path)
+        self.hits += 1
+        return entry[1]
+
+    def _remember(self, path: str, stamp: Tuple[int, int], url: str) -> None:
+        # A changed file replaces its old encoding rather than sitting next to it.
+        old = self._cache.pop(path, None)
+        if old is not None:
+            self._cached_bytes -= len(old[1])
+        if len(url) > self.cache_bytes:
+            return
+        self._cache[path] = (stamp, url)
+        self._cached_bytes += len(url)
+        while self._cached_bytes > self.cache_bytes:
+            _, (_, evicted) = self._cache.popitem(last=False)
+            self._cached_bytes -= len(evicted)
+
+    def _encode(self, path: Path, mime: str, size: int) -> str:
+        if self.max_side or (self.max_bytes and size > self.max_bytes):
+            shrunk = self._shrink(path)
+            if shrunk is not None:
+                data, mime = shrunk
+                self.resized += 1
+                return f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}"
+        return f"data:{mime};base64,{_encode_file(path)}"
+
+    def _shrink(self, path: Path) -> Optional[Tuple[bytes, str]]:
+        """Downscale/recompress to the configured limits, or None to send the file as is."""
+        try:
+            from PIL import Image
+        except ImportError:
+            return None
+
+        with Image.open(path) as img:
+            width, height = img.size
+            side = max(width, height)
+            if self.max_side and side > self.max_side:
+                side = self.max_side
+            elif not (self.max_bytes and path.stat().st_size > self.max_bytes):
+                return None
+
+            has_alpha = img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info
+            img = img.convert("RGBA" if has_alpha else "RGB")
+            fmt, mime = ("PNG", "image/png") if has_alpha else ("JPEG", "image/jpeg")
+            # Shrink further until the byte limit is met, a few steps at most.
+            for _ in range(5):
+                scaled = img.copy()
+                scaled.thumbnail((side, side), Image.LANCZOS)
+                out = io.BytesIO()
+                if fmt == "JPEG":
+                    scaled.save(out, fmt, quality=self.quality, optimize=True)
+                else:
+                    scaled.save(out, fmt, optimize=True)
+                data = out.getvalue()
+                if not self.max_bytes or len(data) <= self.max_bytes:
+                    break
+                side = int(side * 0.75)
+            return data, mime
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "resized": self.resized,
+                "entries": len(self._cache),
+                "cached_bytes": self._cached_bytes,
+            }
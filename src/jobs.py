@@ -0,0 +1,233 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Optional
+
+if TYPE_CHECKING:
+    from .shared import SharedState
+
+# How often flux_result re-reads a job that another worker is running.
+STORE_POLL_INTERVAL = 0.25
+
+
+@dataclass(eq=False)
+class Job:
+    job_id: str
+    model: str
+    status: str = "pending"  # pending -> success | error
+    request_id: Optional[str] = None
+    bfl_status: Optional[str] = None
+    progress: Optional[float] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    response: Optional[Dict[str, Any]] = None
+    task: Optional[asyncio.Task] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status != "pending"
+
+    async def observe(self, body: Dict[str, Any]) -> None:
+        """Record the latest poll response; used as the adapter's status callback."""
+        self.bfl_status = body.get("status")
+        self.progress = body.get("progress")
+
+    def finish(self, response: Dict[str, Any]) -> None:
+        self.response = response
+        self.status = response.get("status", "error")
+        self.finished_at = time.time()
+        self.task = None
+
+    def to_record(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "model": self.model,
+            "status": self.status,
+            "request_id": self.request_id,
+            "bfl_status": self.bfl_status,
+            "progress": self.progress,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "response": self.response,
+        }
+
+    def apply(self, record: Dict[str, Any]) -> None:
+        """Take the state of a record read from the shared store."""
+        for name in ("status", "request_id", "bfl_status", "progress", "finished_at", "response"):
+            setattr(self, name, record.get(name))
+
+    def summary(self) -> Dict[str, Any]:
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "model": self.model,
+            "request_id": self.request_id,
+            "bfl_status": self.bfl_status,
+            "progress": self.progress,
+            "elapsed": round(end - self.created_at, 3),
+        }
+
+
+class JobTableFull(RuntimeError):
+    pass
+
+
+class JobTable:
+    """
+    Server-side table of generation jobs for the submit/status/result tools.
+
+    Memory is bounded: finished jobs expire after ttl seconds, and when
+    max_jobs is reached the oldest finished jobs are dropped first. If every
+    slot holds a pending job, new submissions are rejected with JobTableFull.
+
+    With a store (shared.SharedState), jobs are also written there when
+    created, when their BFL status changes and when they finish, and aget()
+    finds jobs run by other worker processes. Those are read-only copies:
+    wait() follows them by re-reading the store.
+    """
+
+    def __init__(self, *, max_jobs: int = 1000, ttl: float = 3600.0, store: Optional["SharedState"] = None):
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self.store = store
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._saves = 0
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._expire()
+        return self._jobs.get(job_id)
+
+    async def aget(self, job_id: str) -> Optional[Job]:
+        """get(), falling back to the shared store for jobs of other workers."""
+        job = self.get(job_id)
+        if job is None and self.store is not None:
+            record = await asyncio.to_thread(self.store.get_job, job_id, self.ttl)
+            if record is not None:
+                job = Job(job_id=job_id, model=record["model"], created_at=record["created_at"])
+                job.apply(record)
+        return job
+
+    async def save(self, job: Job) -> None:
+        """Write job's current state to the shared store, if there is one."""
+        if self.store is None:
+            return
+        try:
+            await asyncio.to_thread(self.store.put_job, job.to_record())
+            self._saves += 1
+            if self._saves % 100 == 0:
+                await asyncio.to_thread(self.store.expire_jobs, self.ttl)
+        except Exception:
+            # Sharing is best effort; the worker running the job still answers for it.
+            pass
+
+    def observer(self, job: Job) -> Callable[[Dict[str, Any]], Awaitable[None]]:
+        """A status callback for job that also saves it when its BFL status or progress changes."""
+
+        async def observe(body: Dict[str, Any]) -> None:
+            seen = (job.bfl_status, job.progress)
+            await job.observe(body)
+            if (job.bfl_status, job.progress) != seen:
+                await self.save(job)
+
+        return observe
+
+    def create(self, model: str) -> Job:
+        self._expire()
+        if len(self._jobs) >= self.max_jobs:
+            for job_id, job in list(self._jobs.items()):
+                if job.done:
+                    del self._jobs[job_id]
+                    if len(self._jobs) < self.max_jobs:
+                        break
+        if len(self._jobs) >= self.max_jobs:
+            raise JobTableFull(f"Too many pending jobs ({self.max_jobs}); retry later")
+        job = Job(job_id=uuid.uuid4().hex, model=model)
+        self._jobs[job.job_id] = job
+        return job
+
+    def restore(
+        self,
+        job_id: str,
+        model: str,
+        *,
+        request_id: Optional[str] = None,
+        created_at: Optional[float] = None,
+        response: Optional[Dict[str, Any]] = None,
+        finished_at: Optional[float] = None,
+    ) -> Optional[Job]:
+        """Re-create a job from the journal after a restart; None when the table is full."""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        if len(self._jobs) >= self.max_jobs:
+            return None
+        job = Job(job_id=job_id, model=model, request_id=request_id, created_at=created_at or time.time())
+        if response is not None:
+            job.finish(response)
+            job.finished_at = finished_at or job.finished_at
+        self._jobs[job_id] = job
+        return job
+
+    def discard(self, job_id: str) -> None:
+        self._jobs.pop(job_id, None)
+
+    def run(self, job: Job, work: Callable[[], Awaitable[Dict[str, Any]]]) -> None:
+        """Run work in the background and store its tool response on the job."""
+
+        async def runner() -> None:
+            try:
+                response = await work()
+            except asyncio.CancelledError:
+                job.finish({"status": "error", "message": "Job cancelled", "error_type": "CancelledError"})
+                raise
+            except Exception as e:
+                response = {"status": "error", "message": str(e), "error_type": type(e).__name__}
+            job.finish(response)
+            # Not on cancellation: another worker may resume the job from the journal.
+            await self.save(job)
+
+        job.task = asyncio.get_running_loop().create_task(runner())
+
+    async def wait(self, job: Job, timeout: float) -> bool:
+        """Wait up to timeout seconds for job to finish; return whether it did."""
+        if job.job_id not in self._jobs and self.store is not None:
+            return await self._follow(job, timeout)
+        task = job.task
+        if job.done or task is None:
+            return job.done
+        if timeout > 0:
+            # shield: a client giving up on flux_result must not cancel the job itself.
+            await asyncio.wait([asyncio.shield(task)], timeout=timeout)
+        return job.done
+
+    async def _follow(self, job: Job, timeout: float) -> bool:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while not job.done and loop.time() < deadline:
+            await asyncio.sleep(min(STORE_POLL_INTERVAL, deadline - loop.time()))
+            record = await asyncio.to_thread(self.store.get_job, job.job_id, self.ttl)
+            if record is not None:
+                job.apply(record)
+        return job.done
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.ttl
+        for job_id, job in list(self._jobs.items()):
+            if job.done and job.finished_at is not None and job.finished_at < cutoff:
+                del self._jobs[job_id]
+
+    def stats(self) -> Dict[str, int]:
+        pending = sum(1 for job in self._jobs.values() if not job.done)
+        return {"pending": pending, "finished": len(self._jobs) - pending, "capacity": self.max_jobs}
+
+    async def close(self) -> None:
+        tasks = [job.task for job in self._jobs.values() if job.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
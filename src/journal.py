@@ -0,0 +1,219 @@
+import json
+import os
+import threading
+import time
+import uuid
+from typing import TYPE_CHECKING, Any, Collection, Dict, List, Optional
+
+if TYPE_CHECKING:
+    import sqlite3
+
+try:
+    from .cache import open_database
+except ImportError:
+    from cache import open_database
+
+
+class JobJournal:
+    """
+    SQLite journal of submissions accepted by the API, so that polling can
+    resume after a restart instead of abandoning jobs BFL is still running.
+
+    record() is called once the API returns a request_id and before polling
+    starts; finish() stores the tool response when polling ends. A job whose
+    poller was cancelled (the process shutting down) stays pending and is
+    claimed by claim_pending() on the next start. Entries name the API key that
+    submitted them by keypool.key_id(), since only that key can poll them.
+
+    Entries also name the process polling them (owner). Several worker
+    processes can share one journal: each only claims pending entries whose
+    owner is not among the live workers it is given, so a job is polled by
+    one worker at a time and a crashed worker's jobs are taken over.
+
+    Retention is bounded: finished entries are dropped after retention
+    seconds and beyond the newest max_entries, and pending entries older than
+    the resume window are marked expired rather than polled. compact() runs
+    every 100 finishes and checkpoints the WAL so the file stops growing;
+    SQLite reuses the freed pages.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        retention: float = 86400.0,
+        max_entries: int = 10000,
+        owner: Optional[str] = None,
+    ):
+        self.path = path
+        self.owner = owner or f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.retention = retention
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._finishes = 0
+        self.recorded = 0
+        self.resumed = 0
+
+        # WAL with synchronous=NORMAL: a committed entry survives the process
+        # being killed, which is the failure this journal exists for.
+        self._db: Optional["sqlite3.Connection"] = open_database(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS submissions ("
+            "request_id TEXT PRIMARY KEY, polling_url TEXT NOT NULL, model TEXT NOT NULL, "
+            "cache_key TEXT, job_id TEXT, submitted_at REAL NOT NULL, "
+            "status TEXT NOT NULL DEFAULT 'pending', finished_at REAL, response TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS submissions_status ON submissions (status, submitted_at)")
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(submissions)")}
+        if "key_id" not in columns:
+            # Journals written before key pools; their entries resume with the first key.
+            self._db.execute("ALTER TABLE submissions ADD COLUMN key_id TEXT")
+        if "owner" not in columns:
+            self._db.execute("ALTER TABLE submissions ADD COLUMN owner TEXT")
+        self._db.commit()
+
+    def record(
+        self,
+        request_id: str,
+        polling_url: str,
+        model: str,
+        cache_key: Optional[str] = None,
+        job_id: Optional[str] = None,
+        key_id: Optional[str] = None,
+    ) -> None:
+        with self._lock:
+            if self._db is None:
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO submissions "
+                "(request_id, polling_url, model, cache_key, job_id, key_id, owner, submitted_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (request_id, polling_url, model, cache_key, job_id, key_id, self.owner, time.time()),
+            )
+            self._db.commit()
+            self.recorded += 1
+
+    def finish(self, request_id: str, response: Dict[str, Any]) -> None:
+        with self._lock:
+            if self._db is None:
+                return
+            self._db.execute(
+                "UPDATE submissions SET status = ?, finished_at = ?, response = ? WHERE request_id = ?",
+                (response.get("status", "error"), time.time(), json.dumps(response), request_id),
+            )
+            self._db.commit()
+            self._finishes += 1
+            if self._finishes % 100 == 0:
+                self._compact()
+
+    def claim_pending(
+        self,
+        resume_window: float,
+        live_owners: Collection[str] = (),
+        key_ids: Optional[Collection[str]] = None,
+        limit: int = -1,
+    ) -> List[Dict[str, Any]]:
+        """
+        Take over entries nobody is polling, oldest first: pending entries
+        whose owner is neither this journal's owner nor in live_owners, and,
+        with key_ids, whose key is one of those (or unrecorded). At most limit
+        entries are claimed. Entries submitted more than resume_window
+        seconds ago are marked expired instead: their results are no longer
+        available from the API.
+        """
+        cutoff = time.time() - resume_window
+        owners = [self.owner, *live_owners]
+        with self._lock:
+            if self._db is None:
+                return []
+            expired = json.dumps({
+                "status": "error",
+                "message": "Server restarted and the job was too old to resume",
+                "error_type": "JournalExpired",
+            })
+            # BEGIN IMMEDIATE: two workers claiming at once must not both get an entry.
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "UPDATE submissions SET status = 'error', finished_at = ?, response = ? "
+                    "WHERE status = 'pending' AND submitted_at < ?",
+                    (time.time(), expired, cutoff),
+                )
+                query = (
+                    "SELECT request_id, polling_url, model, cache_key, job_id, key_id, submitted_at FROM submissions "
+                    f"WHERE status = 'pending' AND (owner IS NULL OR owner NOT IN ({','.join('?' * len(owners))}))"
+                )
+                params: List[Any] = list(owners)
+                if key_ids is not None:
+                    query += f" AND (key_id IS NULL OR key_id IN ({','.join('?' * len(key_ids))}))"
+                    params.extend(key_ids)
+                rows = self._db.execute(query + " ORDER BY submitted_at LIMIT ?", (*params, limit)).fetchall()
+                self._db.executemany(
+                    "UPDATE submissions SET owner = ? WHERE request_id = ?", [(self.owner, row[0]) for row in rows]
+                )
+                self._db.commit()
+            finally:
+                if self._db.in_transaction:
+                    self._db.rollback()
+        keys = ("request_id", "polling_url", "model", "cache_key", "job_id", "key_id", "submitted_at")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def finished_jobs(self, since: float) -> List[Dict[str, Any]]:
+        """flux_submit jobs that finished in the last since seconds, with their responses."""
+        with self._lock:
+            if self._db is None:
+                return []
+            rows = self._db.execute(
+                "SELECT job_id, request_id, model, submitted_at, finished_at, response FROM submissions "
+                "WHERE job_id IS NOT NULL AND status != 'pending' AND finished_at >= ? ORDER BY finished_at",
+                (time.time() - since,),
+            ).fetchall()
+        return [
+            {
+                "job_id": job_id,
+                "request_id": request_id,
+                "model": model,
+                "submitted_at": submitted_at,
+                "finished_at": finished_at,
+                "response": json.loads(response),
+            }
+            for job_id, request_id, model, submitted_at, finished_at, response in rows
+        ]
+
+    def compact(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._compact()
+
+    def _compact(self) -> None:
+        self._db.execute(
+            "DELETE FROM submissions WHERE status != 'pending' AND finished_at < ?",
+            (time.time() - self.retention,),
+        )
+        self._db.execute(
+            "DELETE FROM submissions WHERE request_id IN ("
+            "SELECT request_id FROM submissions WHERE status != 'pending' "
+            "ORDER BY finished_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+        self._db.commit()
+        self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            if self._db is None:
+                return {"path": self.path, "closed": True}
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM submissions GROUP BY status").fetchall())
+        return {
+            "path": self.path,
+            "pending": counts.pop("pending", 0),
+            "finished": sum(counts.values()),
+            "recorded": self.recorded,
+            "resumed": self.resumed,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
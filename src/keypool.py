@@ -0,0 +1,167 @@
+import hashlib
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Collection, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from .flux_adapter import FluxAdapter
+
+# Submit responses that take a key out of rotation: invalid key, no credits, rate limited.
+DISABLING_STATUS = {401: "unauthorized", 402: "payment_required", 429: "rate_limited"}
+
+
+def key_id(api_key: str) -> str:
+    """Stable, non-secret name for an API key, for health output and the journal."""
+    return "key-" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:8]
+
+
+class NoHealthyKey(RuntimeError):
+    """Raised when every configured API key is disabled (401/402)."""
+
+    def __init__(self, retry_in: Optional[float]):
+        message = "No usable BFL API key"
+        if retry_in is not None:
+            message += f" (next one back in {retry_in:.0f}s)"
+        super().__init__(message)
+        self.retry_in = retry_in
+
+
+@dataclass(eq=False)
+class KeyState:
+    api_key: str = field(repr=False)
+    key_id: str
+    disabled_until: float = 0.0
+    disabled_reason: Optional[str] = None
+    # Set by a 429: the key is avoided, not disabled, until then.
+    cooling_until: float = 0.0
+    rejections: Dict[str, int] = field(default_factory=dict)
+
+
+class KeyPool:
+    """
+    The BFL API keys new submissions are spread over.
+
+    Each key has its own adapter, so its own admission controller (active
+    tasks, submit rate, 429 pauses) and its own HTTP client: a job is polled
+    by the adapter, and so with the key, that submitted it. choose() returns
+    the adapter of the least-utilized usable key, counting queued
+    submissions against its active-task limit.
+
+    disable() reacts to a rejected submit, after which callers retry on
+    another key. 401 and 402 take the key out of rotation for
+    disable_seconds. A 429, like an admission pause from rate-limit headers,
+    only makes the key cool down: it is avoided while any other key is
+    usable, but when every key is cooling down work queues on the one that
+    recovers first rather than failing.
+    """
+
+    def __init__(
+        self,
+        api_keys: List[str],
+        adapter_factory: Callable[[str], "FluxAdapter"],
+        *,
+        disable_seconds: float = 3600.0,
+        rate_limit_seconds: float = 30.0,
+    ):
+        self.adapter_factory = adapter_factory
+        self.disable_seconds = disable_seconds
+        self.rate_limit_seconds = rate_limit_seconds
+        self._keys: List[KeyState] = []
+        for api_key in dict.fromkeys(k for k in api_keys if k):
+            self._keys.append(KeyState(api_key, key_id(api_key)))
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def key_ids(self) -> List[str]:
+        return [state.key_id for state in self._keys]
+
+    def adapter_for(self, kid: Optional[str]) -> Optional["FluxAdapter"]:
+        """The adapter of the key named kid; without a name, the first key's."""
+        for state in self._keys:
+            if kid is None or state.key_id == kid:
+                return self.adapter_factory(state.api_key)
+        return None
+
+    def _enabled(self, state: KeyState, now: float) -> bool:
+        if state.disabled_until > now:
+            return False
+        if state.disabled_reason is not None and state.cooling_until <= now:
+            state.disabled_reason = None
+        return True
+
+    def _cooling_for(self, state: KeyState, now: float) -> float:
+        admission = self.adapter_factory(state.api_key).admission
+        paused = admission.paused_for() if admission is not None else 0.0
+        return max(paused, state.cooling_until - now, 0.0)
+
+    @staticmethod
+    def _utilization(adapter: "FluxAdapter") -> float:
+        admission = adapter.admission
+        if admission is None:
+            return 0.0
+        return (admission.active + admission.queued) / admission.max_active
+
+    def choose(self, exclude: Collection["FluxAdapter"] = ()) -> "FluxAdapter":
+        """
+        Return the adapter of the least-utilized enabled key not in exclude,
+        preferring keys that are not cooling down. Raises NoHealthyKey when
+        there is none.
+        """
+        now = time.monotonic()
+        best, best_rank = None, None
+        for state in self._keys:
+            adapter = self.adapter_factory(state.api_key)
+            if adapter in exclude or not self._enabled(state, now):
+                continue
+            rank = (self._cooling_for(state, now), self._utilization(adapter))
+            if best_rank is None or rank < best_rank:
+                best, best_rank = adapter, rank
+        if best is None:
+            waits = [s.disabled_until - now for s in self._keys if s.disabled_until > now]
+            raise NoHealthyKey(min(waits) if waits else None)
+        return best
+
+    def disable(self, adapter: "FluxAdapter", status: int, retry_after: Optional[float] = None) -> bool:
+        """
+        Take adapter's key out of rotation after a submit was rejected with
+        status. Returns True if status is one that should be retried on
+        another key (401, 402, 429).
+        """
+        reason = DISABLING_STATUS.get(status)
+        if reason is None:
+            return False
+        for state in self._keys:
+            if state.api_key == adapter.api_key:
+                now = time.monotonic()
+                if status == 429:
+                    seconds = retry_after if retry_after is not None else self.rate_limit_seconds
+                    state.cooling_until = max(state.cooling_until, now + seconds)
+                else:
+                    state.disabled_until = max(state.disabled_until, now + self.disable_seconds)
+                state.disabled_reason = reason
+                state.rejections[reason] = state.rejections.get(reason, 0) + 1
+        return True
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Per-key state and utilization, identified by key_id only."""
+        now = time.monotonic()
+        report = []
+        for state in self._keys:
+            adapter = self.adapter_factory(state.api_key)
+            admission = adapter.admission
+            enabled = self._enabled(state, now)
+            cooling = self._cooling_for(state, now)
+            entry: Dict[str, Any] = {
+                "key_id": state.key_id,
+                "usable": enabled and cooling == 0,
+                "disabled_reason": state.disabled_reason,
+                "disabled_for": round(max(0.0, state.disabled_until - now), 1),
+                "cooling_for": round(cooling, 1),
+                "rejections": dict(state.rejections),
+                "utilization": round(self._utilization(adapter), 3),
+            }
+            if admission is not None:
+                entry["admission"] = admission.stats()
+            report.append(entry)
+        return report
@@ -1,20 +1,69 @@
-from mcp.server.fastmcp import FastMCP
-from dotenv import load_dotenv
+from mcp.server.auth.middleware.auth_context import get_access_token
+from mcp.server.fastmcp import Context, FastMCP
+from mcp.types import CallToolResult, ImageContent, TextContent
+from pydantic import BaseModel
+import asyncio
+import base64
+import dataclasses
+import json
 import os
-from typing import Optional
+import sys
+import threading
+
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar, Union
 from pathlib import Path
 
+if TYPE_CHECKING:
+    from starlette.applications import Starlette
+
 # Import flux_adapter with absolute import
 try:
-    from .flux_adapter import FluxAdapter
+    from .admission import AdmissionController, rate_limit_delay
+    from .artifacts import ArtifactStore
+    from .breaker import BreakerRegistry, CircuitOpenError
+    from .cache import GenerationCache
+    from .flux_adapter import FluxAdapter, GenerationOptions, StatusCallback
+    from .input_images import InputImageEncoder
+    from .jobs import JobTable, JobTableFull
+    from .journal import JobJournal
+    from .keypool import KeyPool, NoHealthyKey, key_id
+    from . import metrics
+    from .polling import PollMultiplexer, latency_tracker
+    from .previews import Preview, PreviewMaker
+    from .router import ModelRouter
+    from .shared import SharedState
+    from .similar import PromptIndex
+    from .singleflight import SingleFlight
+    from .tracing import Timeline, TraceLog
+    from .transport import aclose_clients, close_sessions
 except ImportError:
     # Fallback for deployment environments
-    from flux_adapter import FluxAdapter
+    from admission import AdmissionController, rate_limit_delay
+    from artifacts import ArtifactStore
+    from breaker import BreakerRegistry, CircuitOpenError
+    from cache import GenerationCache
+    from flux_adapter import FluxAdapter, GenerationOptions, StatusCallback
+    from input_images import InputImageEncoder
+    from jobs import JobTable, JobTableFull
+    from journal import JobJournal
+    from keypool import KeyPool, NoHealthyKey, key_id
+    import metrics
+    from polling import PollMultiplexer, latency_tracker
+    from previews import Preview, PreviewMaker
+    from router import ModelRouter
+    from shared import SharedState
+    from similar import PromptIndex
+    from singleflight import SingleFlight
+    from tracing import Timeline, TraceLog
+    from transport import aclose_clients, close_sessions
 
 
 # Load environment variables from config/.env file (for local development)
 # In deployment, environment variables are provided by the platform
 try:
+    from dotenv import load_dotenv
+
     config_dir = Path(__file__).parent.parent / "config"
     if (config_dir / ".env").exists():
         load_dotenv(config_dir / ".env")
@@ -22,8 +71,356 @@ except Exception:
     # Ignore errors in deployment environments
     pass
 
-# Create an MCP server
-mcp = FastMCP("FluxImageGenerator")
+# How the server is reached: "stdio" (default) or "streamable-http", served by
+# FLUX_HTTP_WORKERS processes; see run().
+TRANSPORT = os.getenv("FLUX_TRANSPORT", "stdio")
+HTTP_HOST = os.getenv("FLUX_HTTP_HOST", "127.0.0.1")
+HTTP_PORT = int(os.getenv("FLUX_HTTP_PORT", "8000"))
+HTTP_WORKERS = int(os.getenv("FLUX_HTTP_WORKERS", "1"))
+
+# Jobs, admission limits and worker liveness shared by the processes of one
+# deployment, plus the default location of the cache and prompt index files;
+# off unless FLUX_SHARED_DIR is set (run() sets it for several workers).
+SHARED_DIR = os.getenv("FLUX_SHARED_DIR") or None
+shared: Optional[SharedState] = None
+if SHARED_DIR:
+    shared = SharedState(
+        str(Path(SHARED_DIR) / "state.sqlite3"),
+        lease=float(os.getenv("FLUX_SHARED_LEASE", "30")),
+    )
+
+# One long-lived adapter per API key; generation options are passed per call.
+_adapters: Dict[str, FluxAdapter] = {}
+# Shared with every adapter, like singleflight: see FluxAdapter.
+_status_listeners: Dict[str, List[StatusCallback]] = {}
+
+# All in-flight generations are polled by this one background poller.
+poller = PollMultiplexer(
+    max_qps=float(os.getenv("FLUX_POLL_MAX_QPS", "20")),
+    max_in_flight=int(os.getenv("FLUX_POLL_MAX_IN_FLIGHT", "16")),
+)
+
+# Identical generation requests are answered from here while the sample URL is still valid.
+cache: Optional[GenerationCache] = None
+if os.getenv("FLUX_CACHE_ENABLED", "1") != "0":
+    _cache_dir = os.getenv("FLUX_CACHE_DIR") or SHARED_DIR
+    cache = GenerationCache(
+        max_entries=int(os.getenv("FLUX_CACHE_SIZE", "256")),
+        ttl=float(os.getenv("FLUX_CACHE_TTL", "600")),
+        path=str(Path(_cache_dir) / "generations.sqlite3") if _cache_dir else None,
+    )
+
+# Past prompts, for flux_generate calls that accept a near-duplicate's image
+# (similarity_threshold). In memory unless FLUX_SIMILAR_FILE is set; about
+# 1.6 KB per entry, so 16 MB at the default FLUX_SIMILAR_MAX_ENTRIES.
+prompt_index: Optional[PromptIndex] = None
+if os.getenv("FLUX_SIMILAR_ENABLED", "1") != "0":
+    prompt_index = PromptIndex(
+        path=os.getenv("FLUX_SIMILAR_FILE") or (str(Path(SHARED_DIR) / "similar.sqlite3") if SHARED_DIR else None),
+        ttl=float(os.getenv("FLUX_CACHE_TTL", "600")),
+        max_entries=int(os.getenv("FLUX_SIMILAR_MAX_ENTRIES", "10000")),
+    )
+
+# Identical requests that arrive while one is still generating share its result.
+singleflight = SingleFlight()
+
+# Circuit breakers per BFL endpoint, shared by every adapter.
+breakers = BreakerRegistry(
+    failure_threshold=int(os.getenv("FLUX_BREAKER_THRESHOLD", "5")),
+    reset_timeout=float(os.getenv("FLUX_BREAKER_RESET", "30")),
+)
+
+# Local copies of generated images for requests made with download=True.
+artifacts = ArtifactStore(
+    os.getenv("FLUX_ARTIFACT_DIR", str(Path(__file__).parent.parent / "artifacts")),
+    max_concurrency=int(os.getenv("FLUX_DOWNLOAD_CONCURRENCY", "4")),
+)
+
+# Encoded input images, shared by every adapter; 0 disables downscaling. Local
+# paths are read only under FLUX_INPUT_DIR when it is set, and not at all over
+# HTTP without it, since remote clients must not read the server's files.
+INPUT_DIR = os.getenv("FLUX_INPUT_DIR") or None
+input_encoder = InputImageEncoder(
+    cache_bytes=int(float(os.getenv("FLUX_INPUT_CACHE_MB", "64")) * 1024 * 1024),
+    max_side=int(os.getenv("FLUX_INPUT_MAX_SIDE", "0")) or None,
+    max_bytes=int(float(os.getenv("FLUX_INPUT_MAX_MB", "0")) * 1024 * 1024) or None,
+    quality=int(os.getenv("FLUX_INPUT_JPEG_QUALITY", "90")),
+    root=INPUT_DIR,
+    local_files=INPUT_DIR is not None or TRANSPORT == "stdio",
+)
+
+# Inline thumbnails for calls made with preview=True, within FLUX_PREVIEW_MAX_KB.
+previews = PreviewMaker(
+    max_side=int(os.getenv("FLUX_PREVIEW_MAX_SIDE", "256")),
+    max_bytes=int(float(os.getenv("FLUX_PREVIEW_MAX_KB", "32")) * 1024),
+    image_format=os.getenv("FLUX_PREVIEW_FORMAT", "jpeg").lower(),
+    quality=int(os.getenv("FLUX_PREVIEW_QUALITY", "70")),
+    max_source_bytes=int(float(os.getenv("FLUX_PREVIEW_MAX_SOURCE_MB", "32")) * 1024 * 1024),
+    max_concurrency=int(os.getenv("FLUX_DOWNLOAD_CONCURRENCY", "4")),
+)
+
+# Default for the verbose argument of the generation tools: full BFL result,
+# routing candidates, artifact manifest and tracebacks in every response.
+RESPONSE_VERBOSE = os.getenv("FLUX_RESPONSE_VERBOSE", "0") == "1"
+
+# Per-request timelines as JSON lines, for scripts/analyze_traces.py; off unless FLUX_TRACE_FILE is set.
+trace_log: Optional[TraceLog] = None
+if os.getenv("FLUX_TRACE_FILE"):
+    trace_log = TraceLog(
+        os.getenv("FLUX_TRACE_FILE"),
+        max_bytes=int(float(os.getenv("FLUX_TRACE_MAX_MB", "50")) * 1024 * 1024),
+        backups=int(os.getenv("FLUX_TRACE_BACKUPS", "3")),
+    )
+
+# Jobs started by flux_submit; finished jobs are kept for FLUX_JOBS_TTL seconds.
+jobs = JobTable(
+    max_jobs=int(os.getenv("FLUX_JOBS_MAX", "1000")),
+    ttl=float(os.getenv("FLUX_JOBS_TTL", "3600")),
+    store=shared,
+)
+
+# Submissions accepted by the API, so polling resumes after a restart; off
+# unless FLUX_JOURNAL_FILE or FLUX_SHARED_DIR is set. With shared state it is
+# also how a worker takes over the jobs of one that stopped.
+JOURNAL_FILE = os.getenv("FLUX_JOURNAL_FILE") or (str(Path(SHARED_DIR) / "journal.sqlite3") if SHARED_DIR else None)
+journal: Optional[JobJournal] = None
+if JOURNAL_FILE:
+    journal = JobJournal(
+        JOURNAL_FILE,
+        retention=float(os.getenv("FLUX_JOURNAL_RETENTION", "86400")),
+        max_entries=int(os.getenv("FLUX_JOURNAL_MAX_ENTRIES", "10000")),
+        owner=shared.worker_id if shared is not None else None,
+    )
+# Older unfinished submissions are not resumed: BFL no longer has their results.
+JOURNAL_RESUME_WINDOW = float(os.getenv("FLUX_JOURNAL_RESUME_WINDOW", "1800"))
+
+
+def _parse_weights(spec: str) -> Dict[str, float]:
+    weights: Dict[str, float] = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        client, _, weight = part.rpartition("=")
+        weights[client] = float(weight)
+    return weights
+
+
+# Fair-share weights per client id ("agent-a=4,agent-b=1"); unlisted clients weigh 1.
+CLIENT_WEIGHTS = _parse_weights(os.getenv("FLUX_SCHED_WEIGHTS", ""))
+# Over HTTP, the request header that names the client for fair sharing when
+# it sends no client_id in _meta; see _client_id().
+CLIENT_ID_HEADER = os.getenv("FLUX_CLIENT_ID_HEADER", "x-client-id")
+
+# Model choice for calls that pass latency_budget_ms or quality, from observed
+# times to Ready; FLUX_ROUTER_PRIORS ("flux-dev=12,...") overrides the
+# estimates used before a model has enough samples.
+router = ModelRouter(
+    latency_tracker,
+    priors=_parse_weights(os.getenv("FLUX_ROUTER_PRIORS", "")),
+    recent=int(os.getenv("FLUX_ROUTER_WINDOW", "20")),
+    slow_factor=float(os.getenv("FLUX_ROUTER_SLOW_FACTOR", "1.5")),
+)
+
+
+def get_adapter(api_key: str) -> FluxAdapter:
+    adapter = _adapters.get(api_key)
+    if adapter is None:
+        adapter = FluxAdapter(
+            model="flux-pro-1.1",
+            use_raw_mode=False,
+            api_key=api_key,
+            base_url=os.getenv("BFL_BASE_URL", "https://api.bfl.ai"),
+            poller=poller,
+            cache=cache,
+            singleflight=singleflight,
+            breakers=breakers,
+            artifacts=artifacts,
+            input_encoder=input_encoder,
+            trace_log=trace_log,
+            journal=journal,
+            prompt_index=prompt_index,
+            status_listeners=_status_listeners,
+            admission=AdmissionController(
+                rate=float(os.getenv("FLUX_SUBMIT_RATE", "2")),
+                burst=int(os.getenv("FLUX_SUBMIT_BURST", "5")),
+                max_active=int(os.getenv("FLUX_MAX_ACTIVE_TASKS", "24")),
+                weights=CLIENT_WEIGHTS,
+                max_queue_wait=float(os.getenv("FLUX_SCHED_MAX_WAIT", "30")),
+                shared=shared.limits(key_id(api_key)) if shared is not None else None,
+            ),
+        )
+        _adapters[api_key] = adapter
+    return adapter
+
+
+def _api_keys() -> List[str]:
+    # BFL_API_KEYS is a comma-separated pool; BFL_API_KEY alone is a pool of one.
+    keys = [k.strip() for k in os.getenv("BFL_API_KEYS", "").split(",") if k.strip()]
+    return keys or [os.getenv("BFL_API_KEY", "")]
+
+
+# Keys new submissions are spread over; each has its own adapter and limits.
+key_pool = KeyPool(
+    _api_keys(),
+    get_adapter,
+    disable_seconds=float(os.getenv("FLUX_KEY_DISABLE_SECONDS", "3600")),
+    rate_limit_seconds=float(os.getenv("FLUX_KEY_RATE_LIMIT_SECONDS", "30")),
+)
+
+
+# Optional Prometheus endpoint (GET /metrics) for clients on stdio; 0 disables it.
+METRICS_PORT = int(os.getenv("FLUX_METRICS_PORT", "0"))
+_metrics_server = None
+
+
+def start_metrics_server() -> None:
+    global _metrics_server
+    if METRICS_PORT and _metrics_server is None:
+        _metrics_server = metrics.serve(METRICS_PORT, os.getenv("FLUX_METRICS_HOST", "127.0.0.1"))
+
+
+_journal_compacted = False
+
+
+async def resume_journal() -> None:
+    """
+    Restore flux_submit jobs from the journal and resume polling every
+    submission no live process is polling: those a restart interrupted and,
+    with shared state, those of workers that stopped. Resumed flux_generate
+    calls have no job_id; they are tracked under their BFL request_id and
+    their results go to the cache, so repeating the call does not submit again.
+    """
+    global _journal_compacted
+    if journal is None or not key_pool:
+        return
+    if not _journal_compacted:
+        _journal_compacted = True
+        await asyncio.to_thread(journal.compact)
+        for entry in await asyncio.to_thread(journal.finished_jobs, jobs.ttl):
+            jobs.restore(
+                entry["job_id"],
+                entry["model"],
+                request_id=entry["request_id"],
+                created_at=entry["submitted_at"],
+                response=entry["response"],
+                finished_at=entry["finished_at"],
+            )
+
+    live = await asyncio.to_thread(shared.live_workers) if shared is not None else ()
+    # Only the submitting key can poll a job: entries from a key that is no
+    # longer configured are not claimed and expire.
+    claimed = await asyncio.to_thread(
+        journal.claim_pending, JOURNAL_RESUME_WINDOW, live, key_pool.key_ids(), max(0, jobs.max_jobs - len(jobs))
+    )
+    for entry in claimed:
+        adapter = key_pool.adapter_for(entry["key_id"])
+        job = jobs.restore(
+            entry["job_id"] or entry["request_id"],
+            entry["model"],
+            request_id=entry["request_id"],
+            created_at=entry["submitted_at"],
+        )
+        if job is None:
+            # Table full: the entry is polled once this process restarts or stops.
+            break
+
+        async def finish(entry: Dict[str, Any] = entry, job=job, adapter=adapter) -> Dict[str, Any]:
+            image_url, meta = await adapter.resume(
+                entry["request_id"], entry["polling_url"], entry["model"], entry["cache_key"], jobs.observer(job)
+            )
+            return {"status": "success", "image": image_url, "meta": {**meta, "resumed": True}}
+
+        jobs.run(job, finish)
+        journal.resumed += 1
+
+
+async def keep_shared_state() -> None:
+    """Heartbeat this worker and take over the journal entries of workers that stopped."""
+    while True:
+        try:
+            await asyncio.to_thread(shared.heartbeat)
+            await resume_journal()
+        except Exception:
+            # A busy or briefly unavailable store is retried at the next beat.
+            pass
+        await asyncio.sleep(shared.lease / 3)
+
+
+async def shutdown() -> None:
+    """Stop background jobs and the poller, and release pooled HTTP connections."""
+    global _metrics_server
+    if _metrics_server is not None:
+        _metrics_server.shutdown()
+        _metrics_server.server_close()
+        _metrics_server = None
+    # Cancelled pollers leave their journal entries pending for the next start.
+    await jobs.close()
+    await poller.stop()
+    _adapters.clear()
+    if cache is not None:
+        cache.close()
+    if trace_log is not None:
+        trace_log.close()
+    if journal is not None:
+        journal.close()
+    if prompt_index is not None:
+        prompt_index.close()
+    if shared is not None:
+        shared.leave()
+        shared.close()
+    await aclose_clients()
+    close_sessions()
+
+
+def _process_stats() -> Dict[str, Any]:
+    stats: Dict[str, Any] = {
+        "pid": os.getpid(),
+        "threads": threading.active_count(),
+        "asyncio_tasks": len(asyncio.all_tasks()),
+    }
+    try:
+        import resource
+        # ru_maxrss is in KiB on Linux.
+        stats["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    except ImportError:
+        pass
+    return stats
+
+
+@asynccontextmanager
+async def process_lifespan() -> AsyncIterator[None]:
+    """Start and stop what the process shares between all its sessions."""
+    start_metrics_server()
+    keeper = None
+    if shared is not None:
+        await asyncio.to_thread(shared.heartbeat)
+        keeper = asyncio.get_running_loop().create_task(keep_shared_state())
+    else:
+        await resume_journal()
+    try:
+        yield
+    finally:
+        if keeper is not None:
+            keeper.cancel()
+            await asyncio.gather(keeper, return_exceptions=True)
+        await shutdown()
+
+
+_serving_http = False
+
+
+@asynccontextmanager
+async def lifespan(server: FastMCP) -> AsyncIterator[None]:
+    # Over HTTP this runs for every session (every request, being stateless);
+    # the process-wide part is then run by http_app()'s lifespan instead.
+    if _serving_http:
+        yield
+    else:
+        async with process_lifespan():
+            yield
+
+
+# Create an MCP server. Over HTTP it is stateless: every request stands
+# alone, so any worker process can answer it.
+mcp = FastMCP("FluxImageGenerator", lifespan=lifespan, host=HTTP_HOST, port=HTTP_PORT, stateless_http=True)
 
 @mcp.tool()
 async def health_check() -> dict:
@@ -33,19 +430,277 @@ async def health_check() -> dict:
     Returns:
         dict: Server health status and configuration info
     """
-    api_key = os.getenv("BFL_API_KEY")
-    
+    api_keys = key_pool.stats()
+
+    if not api_keys:
+        status = "unhealthy"
+    elif breakers.any_open or any(k["disabled_for"] for k in api_keys):
+        status = "degraded"
+    else:
+        status = "healthy"
+
     return {
-        "status": "healthy" if api_key else "unhealthy",
-        "api_key_set": bool(api_key),
-        "api_key_preview": f"{api_key[:8]}..." if api_key else "Not set",
+        "status": status,
+        "api_key_set": bool(api_keys),
+        # Keys are identified by a hash prefix only; see keypool.key_id().
+        "api_keys": api_keys,
         "server_name": "FluxImageGenerator",
-        "available_tools": ["health_check", "flux_generate"]
+        "pending_polls": poller.pending,
+        "cache": cache.stats() if cache is not None else None,
+        "similar_index": prompt_index.stats() if prompt_index is not None else None,
+        "coalescing": singleflight.stats(),
+        "jobs": jobs.stats(),
+        "journal": journal.stats() if journal is not None else None,
+        "shared_state": await asyncio.to_thread(shared.stats) if shared is not None else None,
+        "circuit_breakers": breakers.snapshot(),
+        "artifacts": artifacts.stats(),
+        "input_images": input_encoder.stats(),
+        "previews": previews.stats(),
+        "metrics": metrics.summary(),
+        "process": _process_stats(),
+        "available_tools": [
+            "health_check",
+            "flux_generate",
+            "flux_generate_batch",
+            "flux_submit",
+            "flux_status",
+            "flux_result",
+            "flux_metrics",
+        ]
+    }
+
+
+def _client_id(ctx: Context) -> str:
+    """
+    Fair-share key for admission: the client_id the client sends in _meta,
+    else over HTTP the CLIENT_ID_HEADER header, else the OAuth client of the
+    request's access token. Without any of them, an HTTP request is known by
+    its peer address, since stateless HTTP gives every request a session of
+    its own, and a stdio request by its session; flux_client_id_fallbacks_total
+    counts those.
+    """
+    try:
+        request_context = ctx.request_context
+    except ValueError:
+        # Called outside a request (e.g. directly from tests).
+        return ""
+    if ctx.client_id:
+        return ctx.client_id
+    request = request_context.request
+    headers = getattr(request, "headers", None)
+    if CLIENT_ID_HEADER and headers is not None and headers.get(CLIENT_ID_HEADER):
+        return headers[CLIENT_ID_HEADER]
+    token = get_access_token()
+    if token is not None and token.client_id:
+        return token.client_id
+    peer = getattr(request, "client", None)
+    if peer is not None:
+        metrics.client_id_fallbacks_total.inc(source="address")
+        return f"address-{peer.host}"
+    metrics.client_id_fallbacks_total.inc(source="session")
+    return f"session-{id(request_context.session):x}"
+
+
+def _progress_reporter(ctx: Context) -> StatusCallback:
+    """Turn BFL status changes into MCP progress notifications (progress = elapsed seconds)."""
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    last = None
+
+    async def report(body: Dict[str, Any]) -> None:
+        nonlocal last
+        status, progress = body.get("status"), body.get("progress")
+        if (status, progress) == last:
+            return
+        last = (status, progress)
+        elapsed = loop.time() - start
+        message = f"{status} after {elapsed:.1f}s"
+        if progress is not None:
+            message += f" (progress: {progress})"
+        await ctx.report_progress(elapsed, None, message)
+
+    return report
+
+
+def _circuit_open_response(e: CircuitOpenError) -> Dict[str, Any]:
+    return {
+        "status": "error",
+        "message": str(e),
+        "error_type": type(e).__name__,
+        "retry_in": round(e.retry_in, 1),
     }
 
 
+# Meta kept as is in compact responses; routing and artifact are shortened
+# and BFL's result is reduced to its seed.
+_COMPACT_META = (
+    "request_id", "model", "cached", "coalesced", "resumed", "similar",
+    "artifact_error", "preview", "preview_error", "timings",
+)
+
+
+def _compact(response: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The essentials of a tool response: the status, image and error message,
+    and of meta the request id, model, seed and what the call asked for
+    (artifact location, preview, timings) or should know about (cache,
+    similar or resumed answers, the routed model and why). Tracebacks, BFL's
+    raw result, routing candidates and the artifact manifest are left out.
+    """
+    response = {k: v for k, v in response.items() if k != "traceback"}
+    meta = response.get("meta")
+    if not isinstance(meta, dict):
+        return response
+    compact = {k: meta[k] for k in _COMPACT_META if k in meta}
+    seed = (meta.get("result") or {}).get("seed")
+    if seed is not None:
+        compact["seed"] = seed
+    if meta.get("routing"):
+        compact["routing"] = {k: meta["routing"].get(k) for k in ("model", "reason", "estimated_ms")}
+    if meta.get("artifact"):
+        compact["artifact"] = {k: meta["artifact"].get(k) for k in ("path", "uri", "bytes")}
+    return {**response, "meta": compact}
+
+
+async def _add_preview(response: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[Preview]]:
+    """
+    Make the preview of a successful response's image and record it in
+    meta["preview"]. Like a failed download, a failed preview does not fail
+    the call: meta["preview_error"] is set instead.
+    """
+    if response.get("status") != "success":
+        return response, None
+    meta = dict(response.get("meta") or {})
+    preview = None
+    try:
+        preview = await previews.make(response["image"], (meta.get("artifact") or {}).get("path"))
+        meta["preview"] = preview.info()
+    except Exception as e:
+        meta["preview_error"] = f"{type(e).__name__}: {e}"
+    return {**response, "meta": meta}, preview
+
+
+async def _respond(
+    response: Dict[str, Any], verbose: Optional[bool], preview: bool
+) -> Union[Dict[str, Any], CallToolResult]:
+    """Shape a generation response for the client; with a preview, the thumbnail follows the JSON as image content."""
+    image = None
+    if preview:
+        response, image = await _add_preview(response)
+    if not (RESPONSE_VERBOSE if verbose is None else verbose):
+        response = _compact(response)
+    return _tool_result(response, [image] if image is not None else [])
+
+
+def _tool_result(response: Dict[str, Any], images: List[Preview]) -> Union[Dict[str, Any], CallToolResult]:
+    if not images:
+        return response
+    # Built by hand only to add image content; text and structured content
+    # are what FastMCP would have produced from the dict.
+    content: List[Union[TextContent, ImageContent]] = [TextContent(type="text", text=json.dumps(response, indent=2))]
+    for image in images:
+        content.append(ImageContent(type="image", data=base64.b64encode(image.data).decode("ascii"), mimeType=image.mime_type))
+    return CallToolResult(content=content, structuredContent=response)
+
+
+def _route(
+    options: GenerationOptions,
+    latency_budget_ms: Optional[float],
+    quality: Optional[str],
+) -> Tuple[GenerationOptions, Optional[Dict[str, Any]]]:
+    """
+    Let the router choose options.model when the call gave a latency budget
+    or quality level; returns the options to use and the decision for
+    meta["routing"]. Raises ValueError for an unknown quality level.
+    """
+    if latency_budget_ms is None and quality is None:
+        return options, None
+    try:
+        admission = key_pool.choose().admission
+    except NoHealthyKey:
+        admission = None
+    queue_wait = admission.estimated_wait(options.priority, router.typical_job_seconds()) if admission else 0.0
+    decision = router.choose(latency_budget_ms=latency_budget_ms, quality=quality, queue_wait=queue_wait)
+    return dataclasses.replace(options, model=decision["model"]), decision
+
+
+T = TypeVar("T")
+
+
+async def _with_key_failover(call: Callable[[FluxAdapter], Awaitable[T]]) -> Tuple[FluxAdapter, T]:
+    """
+    Run call with the least-loaded key's adapter and return (adapter, result).
+    When the API rejects the submission with 401, 402 or 429, the key that
+    submitted it is taken out of rotation and call runs again with the next
+    key. That is not always adapter's key: a call coalesced onto an identical
+    request gets the error of the key that request was submitted with.
+    """
+    import httpx
+
+    tried: List[FluxAdapter] = []
+    adapter = key_pool.choose()
+    while True:
+        try:
+            return adapter, await call(adapter)
+        except httpx.HTTPStatusError as e:
+            rejected = key_pool.adapter_for(getattr(e, "key_id", adapter.key_id))
+            # Only a rejected submit is safe to repeat elsewhere: nothing was generated.
+            if e.request.method != "POST" or rejected is None or not key_pool.disable(
+                rejected, e.response.status_code, rate_limit_delay(e.response.headers)
+            ):
+                raise
+            tried.append(rejected)
+            try:
+                adapter = key_pool.choose(exclude=tried)
+            except NoHealthyKey:
+                raise e from None
+
+
+async def _run_generation(
+    prompt: str,
+    options: GenerationOptions,
+    use_cache: bool,
+    on_status: Optional[StatusCallback] = None,
+    download: bool = False,
+    input_image: Optional[str] = None,
+    timings: bool = False,
+    latency_budget_ms: Optional[float] = None,
+    quality: Optional[str] = None,
+    similarity_threshold: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Generate one image and shape the tool response, turning failures into an error dict."""
+    try:
+        options, routing = _route(options, latency_budget_ms, quality)
+        _, (image_url, meta) = await _with_key_failover(lambda adapter: adapter.generate(
+            prompt,
+            input_image=input_image,
+            options=options,
+            use_cache=use_cache,
+            on_status=on_status,
+            download=download,
+            timings=timings,
+            similarity_threshold=similarity_threshold,
+        ))
+        if routing is not None:
+            meta = {**meta, "routing": routing}
+        return {"status": "success", "image": image_url, "meta": meta}
+    except CircuitOpenError as e:
+        return _circuit_open_response(e)
+    except Exception as e:
+        # Log the full error for debugging
+        import traceback
+        error_details = traceback.format_exc()
+        return {
+            "status": "error", 
+            "message": str(e),
+            "error_type": type(e).__name__,
+            "traceback": error_details
+        }
+
+
 @mcp.tool()
 async def flux_generate(
+    ctx: Context,
     prompt: str,
     model: str = "flux-pro-1.1",
     aspect_ratio: Optional[str] = "16:9",
@@ -53,7 +708,18 @@ async def flux_generate(
     height: int = 1024,
     raw: bool = False,
     safety_tolerance: int = 6,
-    prompt_upsampling: bool = False
+    prompt_upsampling: bool = False,
+    seed: Optional[int] = None,
+    use_cache: bool = True,
+    download: bool = False,
+    input_image: Optional[str] = None,
+    timings: bool = False,
+    priority: str = "interactive",
+    latency_budget_ms: Optional[int] = None,
+    quality: Optional[str] = None,
+    similarity_threshold: Optional[float] = None,
+    verbose: Optional[bool] = None,
+    preview: bool = False
 ) -> dict:
     """
     Generate images using Black Forest Labs' Flux models.
@@ -67,38 +733,421 @@ async def flux_generate(
         raw: Use raw mode for more creative outputs (default: False)
         safety_tolerance: Safety filter level 0-10 (default: 6)
         prompt_upsampling: Enhance prompt quality (default: False)
+        seed: Fixed seed for reproducible outputs (default: random)
+        use_cache: Reuse the result of an identical recent request (default: True)
+        download: Also save the image under the server's artifact directory and
+            return its local path, URI and SHA-256 in meta["artifact"] (default: False)
+        input_image: Reference image for Kontext edits: a local file path on the
+            server (under FLUX_INPUT_DIR when set), an http(s) URL or a data
+            URL (default: none)
+        timings: Add this request's timeline (queue wait, POST, each poll,
+            Ready, download) to meta["timings"] (default: False)
+        priority: "interactive" or "bulk"; queued bulk work is admitted after
+            interactive work (default: interactive)
+        latency_budget_ms: Let the server choose among flux-pro-1.1, flux-dev
+            and flux-schnell: the best model expected to be Ready within this
+            many milliseconds, judged from recently observed times and the
+            current queue; model is then ignored (default: none)
+        quality: "high", "standard" or "draft"; with or without a budget, lets
+            the server choose the model starting from flux-pro-1.1, flux-dev or
+            flux-schnell and falling back to a faster one when it runs slow.
+            The choice and its reason are returned in meta["routing"]
+            (default: none)
+        similarity_threshold: Accept an earlier image with the same settings
+            whose prompt is at least this similar (0-1, over the prompts'
+            words ignoring case, punctuation and order) instead of generating
+            again; the score and earlier prompt are in meta["similar"].
+            Ignored when use_cache is false (default: none)
+        verbose: Return everything known about the generation: BFL's full
+            result, routing candidates, the artifact manifest and, on error,
+            the traceback. Otherwise meta holds the essentials only (request
+            id, model, seed, cache/similar/routing/artifact notes)
+            (default: the server's FLUX_RESPONSE_VERBOSE, off)
+        preview: Also return a small thumbnail of the image as MCP image
+            content after the JSON, sized by the server's FLUX_PREVIEW_*
+            settings; its size is in meta["preview"] (default: False)
+    
+    Progress notifications report each BFL status change (Submitted, Pending,
+    Processing, Ready) with the elapsed time when the client requests progress.
     
     Returns:
         dict: Response with status, image URL, and metadata
     """
-    api_key = os.getenv("BFL_API_KEY")
-    if not api_key:
+    if not key_pool:
         return {"status": "error", "message": "BFL_API_KEY not set"}
     
+    options = GenerationOptions(
+        model=model,
+        raw=raw,
+        aspect_ratio=aspect_ratio,
+        width=width,
+        height=height,
+        safety_tolerance=safety_tolerance,
+        prompt_upsampling=prompt_upsampling,
+        seed=seed,
+        priority=priority,
+        client=_client_id(ctx),
+    )
+    response = await _run_generation(
+        prompt, options, use_cache, _progress_reporter(ctx), download, input_image, timings,
+        latency_budget_ms, quality, similarity_threshold,
+    )
+    return await _respond(response, verbose, preview)
+
+
+class BatchItem(BaseModel):
+    """One image in a flux_generate_batch call; fields match flux_generate."""
+    prompt: str
+    model: str = "flux-pro-1.1"
+    aspect_ratio: Optional[str] = "16:9"
+    width: int = 1024
+    height: int = 1024
+    raw: bool = False
+    safety_tolerance: int = 6
+    prompt_upsampling: bool = False
+    seed: Optional[int] = None
+    use_cache: bool = True
+    download: bool = False
+    input_image: Optional[str] = None
+    timings: bool = False
+    # Batches default to the bulk class so they do not hold up interactive calls.
+    priority: str = "bulk"
+    latency_budget_ms: Optional[int] = None
+    quality: Optional[str] = None
+    similarity_threshold: Optional[float] = None
+    verbose: Optional[bool] = None
+    preview: bool = False
+
+    def options(self, client: str = "") -> GenerationOptions:
+        return GenerationOptions(
+            model=self.model,
+            raw=self.raw,
+            aspect_ratio=self.aspect_ratio,
+            width=self.width,
+            height=self.height,
+            safety_tolerance=self.safety_tolerance,
+            prompt_upsampling=self.prompt_upsampling,
+            seed=self.seed,
+            priority=self.priority,
+            client=client,
+        )
+
+
+MAX_BATCH_CONCURRENCY = int(os.getenv("FLUX_BATCH_MAX_CONCURRENCY", "8"))
+
+
+@mcp.tool()
+async def flux_generate_batch(items: List[BatchItem], ctx: Context, max_concurrency: int = 4) -> dict:
+    """
+    Generate several images concurrently.
+    
+    Each item is reported through a progress/log notification as soon as it
+    finishes. A failed item does not stop the others. Items default to
+    priority "bulk", so interactive flux_generate calls are admitted first.
+    Thumbnails of items made with preview=True follow the JSON as image
+    content, in item order.
+    
+    Args:
+        items: Images to generate; each takes the same fields as flux_generate
+        max_concurrency: Generations in flight at once (default: 4, capped by the server)
+    
+    Returns:
+        dict: Overall status and per-item results in request order
+    """
+    if not key_pool:
+        return {"status": "error", "message": "BFL_API_KEY not set"}
+
+    limit = asyncio.Semaphore(max(1, min(max_concurrency, MAX_BATCH_CONCURRENCY)))
+    client = _client_id(ctx)
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    images: List[Optional[Preview]] = [None] * len(items)
+    completed = 0
+
+    async def run(index: int, item: BatchItem) -> None:
+        nonlocal completed
+        async with limit:
+            result = await _run_generation(
+                item.prompt,
+                item.options(client),
+                item.use_cache,
+                download=item.download,
+                input_image=item.input_image,
+                timings=item.timings,
+                latency_budget_ms=item.latency_budget_ms,
+                quality=item.quality,
+                similarity_threshold=item.similarity_threshold,
+            )
+            if item.preview:
+                result, images[index] = await _add_preview(result)
+        if not (RESPONSE_VERBOSE if item.verbose is None else item.verbose):
+            result = _compact(result)
+        results[index] = {"index": index, **result}
+        completed += 1
+        await ctx.report_progress(completed, len(items), message=f"item {index}: {result['status']}")
+        await ctx.info(json.dumps(results[index]))
+
+    await asyncio.gather(*(run(i, item) for i, item in enumerate(items)))
+
+    failed = sum(1 for r in results if r["status"] != "success")
+    if failed == 0:
+        status = "success"
+    elif failed == len(items):
+        status = "error"
+    else:
+        status = "partial"
+    response = {"status": status, "succeeded": len(items) - failed, "failed": failed, "results": results}
+    return _tool_result(response, [image for image in images if image is not None])
+
+
+@mcp.tool()
+async def flux_submit(
+    ctx: Context,
+    prompt: str,
+    model: str = "flux-pro-1.1",
+    aspect_ratio: Optional[str] = "16:9",
+    width: int = 1024,
+    height: int = 1024,
+    raw: bool = False,
+    safety_tolerance: int = 6,
+    prompt_upsampling: bool = False,
+    seed: Optional[int] = None,
+    use_cache: bool = True,
+    download: bool = False,
+    input_image: Optional[str] = None,
+    timings: bool = False,
+    priority: str = "interactive",
+    latency_budget_ms: Optional[int] = None,
+    quality: Optional[str] = None,
+    similarity_threshold: Optional[float] = None
+) -> dict:
+    """
+    Start a generation and return a job id without waiting for the image.
+    
+    Takes the same arguments as flux_generate, including latency_budget_ms and
+    quality for letting the server choose the model and similarity_threshold
+    for accepting a near-duplicate's image. Returns as soon as the
+    request has been accepted by the API; use flux_status and flux_result to
+    follow it (verbose and preview are arguments of flux_result).
+    
+    Returns:
+        dict: Job summary with job_id; status is "pending", or "success" when
+        answered from the cache
+    """
+    if not key_pool:
+        return {"status": "error", "message": "BFL_API_KEY not set"}
+
+    options = GenerationOptions(
+        model=model,
+        raw=raw,
+        aspect_ratio=aspect_ratio,
+        width=width,
+        height=height,
+        safety_tolerance=safety_tolerance,
+        prompt_upsampling=prompt_upsampling,
+        seed=seed,
+        priority=priority,
+        client=_client_id(ctx),
+    )
     try:
-        adapter = FluxAdapter(
-            model=model,
-            use_raw_mode=raw,
-            api_key=api_key,
-            aspect_ratio=aspect_ratio,
-            width=width,
-            height=height,
-            safety_tolerance=safety_tolerance,
-            prompt_upsampling=prompt_upsampling,
+        options, routing = _route(options, latency_budget_ms, quality)
+        adapter = key_pool.choose()
+    except (ValueError, NoHealthyKey) as e:
+        return {"status": "error", "message": str(e), "error_type": type(e).__name__}
+    model = options.model
+    try:
+        job = jobs.create(model)
+    except JobTableFull as e:
+        return {"status": "error", "message": str(e), "error_type": type(e).__name__}
+
+    timeline = Timeline(model)
+    try:
+        payload = await adapter.prepare_payload(prompt, input_image=input_image, options=options)
+        cached = await adapter.lookup_cached(payload, options) if use_cache else None
+        if cached is None and use_cache and similarity_threshold is not None:
+            cached = await adapter.lookup_similar(payload, options, similarity_threshold)
+        if cached is not None:
+            source = "similar" if "similar" in cached[1] else "cache"
+            timeline.mark(f"{source}_hit")
+            image_url, meta = cached
+            if download:
+                meta = await adapter.materialize(image_url, meta, timeline)
+            adapter.record_trace(timeline, source, meta)
+            if timings:
+                meta["timings"] = timeline.to_dict()
+            if routing is not None:
+                meta["routing"] = routing
+            job.request_id = meta.get("request_id")
+            job.finish({"status": "success", "image": image_url, "meta": meta})
+            await jobs.save(job)
+            return {**job.summary(), "cached": True}
+
+        # The job is polled by the adapter, and so with the key, that submitted it.
+        adapter, (request_id, polling_url) = await _with_key_failover(
+            lambda adapter: adapter.submit(payload, options, timeline, job_id=job.job_id)
         )
-        image_url, meta = await adapter.generate(prompt)
-        return {"status": "success", "image": image_url, "meta": meta}
     except Exception as e:
-        # Log the full error for debugging
-        import traceback
-        error_details = traceback.format_exc()
-        return {
-            "status": "error", 
-            "message": str(e),
-            "error_type": type(e).__name__,
-            "traceback": error_details
-        }
+        jobs.discard(job.job_id)
+        metrics.errors_total.inc(model=model, type=type(e).__name__)
+        timeline.mark("error", type=type(e).__name__)
+        adapter.record_trace(timeline, "api", error=e)
+        if isinstance(e, CircuitOpenError):
+            return _circuit_open_response(e)
+        return {"status": "error", "message": str(e), "error_type": type(e).__name__}
+
+    job.request_id = request_id
+
+    async def finish() -> Dict[str, Any]:
+        try:
+            image_url, meta = await adapter.wait_for_result(
+                request_id, polling_url, options, jobs.observer(job), timeline
+            )
+        except Exception as e:
+            metrics.errors_total.inc(model=model, type=type(e).__name__)
+            timeline.mark("error", type=type(e).__name__)
+            adapter.record_trace(timeline, "api", error=e)
+            raise
+        timeline.mark("ready")
+        await adapter.store_result(payload, options, image_url, meta)
+        if download:
+            meta = await adapter.materialize(image_url, meta, timeline)
+        adapter.record_trace(timeline, "api", meta)
+        if timings:
+            meta = {**meta, "timings": timeline.to_dict()}
+        if routing is not None:
+            meta = {**meta, "routing": routing}
+        return {"status": "success", "image": image_url, "meta": meta}
+
+    # Started before anything else is awaited: finish() is what releases the
+    # admission slot submit() took, so a cancellation must not come between.
+    jobs.run(job, finish)
+    # Saved before returning, so flux_status on another worker finds the job.
+    await jobs.save(job)
+    return job.summary()
+
+
+@mcp.tool()
+async def flux_status(job_id: str) -> dict:
+    """
+    Report the state of a job started with flux_submit.
+    
+    This only reads the server's job table and never calls the image API.
+    
+    Args:
+        job_id: Id returned by flux_submit
+    
+    Returns:
+        dict: Job id, status (pending, success or error), last BFL status and
+        progress seen by the poller, model, request_id and elapsed seconds
+    """
+    job = await jobs.aget(job_id)
+    if job is None:
+        return {"status": "error", "message": f"Unknown or expired job_id: {job_id}"}
+    return job.summary()
+
+
+MAX_RESULT_WAIT = float(os.getenv("FLUX_RESULT_MAX_WAIT", "120"))
+
+
+@mcp.tool()
+async def flux_result(job_id: str, wait_timeout: float = 0, verbose: Optional[bool] = None, preview: bool = False) -> dict:
+    """
+    Fetch the result of a job started with flux_submit.
+    
+    Args:
+        job_id: Id returned by flux_submit
+        wait_timeout: Seconds to wait for the job to finish (default: 0, return immediately)
+        verbose: Full response rather than the essentials, as for flux_generate
+            (default: the server's FLUX_RESPONSE_VERBOSE, off)
+        preview: Also return a thumbnail of the finished image, as for
+            flux_generate (default: False)
+    
+    Returns:
+        dict: The flux_generate response once finished, otherwise the job status with status "pending"
+    """
+    job = await jobs.aget(job_id)
+    if job is None:
+        return {"status": "error", "message": f"Unknown or expired job_id: {job_id}"}
+
+    await jobs.wait(job, min(max(wait_timeout, 0), MAX_RESULT_WAIT))
+    if not job.done:
+        return job.summary()
+    return await _respond({"job_id": job.job_id, **job.response}, verbose, preview)
+
+
+@mcp.tool()
+async def flux_metrics() -> str:
+    """
+    Export the server's latency and throughput metrics.
     
+    Covers submit latency, admission wait, time to Ready, time per BFL status,
+    polls per job, retries and errors by type, and generations in flight,
+    labelled by model.
+    
+    Returns:
+        str: All metrics in the Prometheus text exposition format
+    """
+    return metrics.registry.render()
+
+
+def http_app() -> "Starlette":
+    """
+    The ASGI app serving the tools over streamable HTTP at /mcp; what each
+    worker process runs. Its lifespan starts and stops the process-wide
+    parts (poller, journal resume, shared state heartbeat) once.
+    """
+    global _serving_http
+    _serving_http = True
+    app = mcp.streamable_http_app()
+    session_manager = app.router.lifespan_context
+
+    @asynccontextmanager
+    async def app_lifespan(app: "Starlette") -> AsyncIterator[None]:
+        async with process_lifespan(), session_manager(app):
+            yield
+
+    app.router.lifespan_context = app_lifespan
+    return app
+
+
+def run() -> None:
+    """
+    Serve over stdio, or with FLUX_TRANSPORT=streamable-http over HTTP on
+    FLUX_HTTP_HOST:FLUX_HTTP_PORT. With FLUX_HTTP_WORKERS > 1, uvicorn starts
+    that many worker processes, each importing this module again; they share
+    jobs, limits, the cache and the prompt index through FLUX_SHARED_DIR
+    (default: a directory under the system temp dir, per port).
+    """
+    if TRANSPORT == "stdio":
+        mcp.run()
+        return
+    if TRANSPORT != "streamable-http":
+        raise SystemExit(f"Unknown FLUX_TRANSPORT {TRANSPORT!r}; use stdio or streamable-http")
+
+    import uvicorn
+
+    log_level = os.getenv("FLUX_HTTP_LOG_LEVEL", "info")
+    if HTTP_WORKERS <= 1:
+        uvicorn.run(http_app(), host=HTTP_HOST, port=HTTP_PORT, log_level=log_level)
+        return
+    if not SHARED_DIR:
+        import tempfile
+
+        # Read by the workers when they import this module; this process only supervises.
+        os.environ["FLUX_SHARED_DIR"] = str(Path(tempfile.gettempdir()) / f"flux-mcp-{HTTP_PORT}")
+    if METRICS_PORT:
+        # Workers cannot all listen on one port; flux_metrics reports the worker that answers.
+        print("FLUX_METRICS_PORT is ignored with more than one worker", file=sys.stderr)
+        os.environ["FLUX_METRICS_PORT"] = "0"
+    module = __name__ if __name__ != "__main__" else Path(__file__).stem
+    uvicorn.run(
+        f"{module}:http_app",
+        factory=True,
+        workers=HTTP_WORKERS,
+        host=HTTP_HOST,
+        port=HTTP_PORT,
+        log_level=log_level,
+    )
+
 
 if __name__ == "__main__":
-    mcp.run()
\ No newline at end of file
+    run()
\ No newline at end of file
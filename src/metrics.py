@@ -0,0 +1,305 @@
+import bisect
+import math
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+FAST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...], extra: Iterable[Tuple[str, str]] = ()) -> str:
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def values(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{self._labels(key)} {_format_value(v)}" for key, v in sorted(self.values().items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class _Series:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, buckets: int):
+        self.counts = [0] * (buckets + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], _Series] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series(len(self.buckets))
+            series.counts[index] += 1
+            series.sum += value
+            series.count += 1
+
+    def series(self) -> Dict[Tuple[str, ...], Tuple[List[int], float, int]]:
+        with self._lock:
+            return {key: (list(s.counts), s.sum, s.count) for key, s in self._series.items()}
+
+    def quantile(self, q: float, counts: List[int]) -> Optional[float]:
+        """Estimate quantile q from bucket counts, interpolating like histogram_quantile()."""
+        total = sum(counts)
+        if total == 0:
+            return None
+        rank = q * total
+        cumulative = 0
+        for i, count in enumerate(counts):
+            if cumulative + count >= rank and count > 0:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total, count) in sorted(self.series().items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{self._labels(key, [('le', _format_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{self._labels(key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def _register(self, metric: _Metric) -> Any:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+submit_seconds = registry.histogram(
+    "flux_submit_seconds", "Time to get a submission accepted, including retries", ("model",))
+admission_wait_seconds = registry.histogram(
+    "flux_admission_wait_seconds", "Time a submission waited for client-side admission", ("model",))
+time_to_ready_seconds = registry.histogram(
+    "flux_time_to_ready_seconds", "Time from accepted submission to Ready", ("model",))
+status_seconds = registry.histogram(
+    "flux_status_seconds", "Time a job spent in each BFL status (queue vs. processing)", ("model", "status"))
+polls_per_job = registry.histogram(
+    "flux_polls_per_job", "get_result responses seen per job", ("model",), buckets=COUNT_BUCKETS)
+poll_request_seconds = registry.histogram(
+    "flux_poll_request_seconds", "Latency of a single get_result request", buckets=FAST_BUCKETS)
+connection_setup_seconds = registry.histogram(
+    "flux_connection_setup_seconds", "New connection setup time by phase", ("phase",), buckets=FAST_BUCKETS)
+generation_seconds = registry.histogram(
+    "flux_generation_seconds", "End-to-end generation time by how it was answered", ("model", "source"))
+retries_total = registry.counter(
+    "flux_retries_total", "Submission retries by reason", ("model", "reason"))
+errors_total = registry.counter(
+    "flux_errors_total", "Failed generations and poll requests by error type", ("model", "type"))
+in_flight = registry.gauge(
+    "flux_in_flight", "Submitted generations not yet finished", ("model",))
+queue_depth = registry.gauge(
+    "flux_queue_depth", "Submissions waiting for admission by priority class", ("priority",))
+queue_wait_seconds = registry.histogram(
+    "flux_queue_wait_seconds", "Time from queueing to admission by priority class", ("priority",))
+queue_overtaken_total = registry.counter(
+    "flux_queue_overtaken_total", "Queued submissions overtaken by a higher priority class", ("priority",))
+client_id_fallbacks_total = registry.counter(
+    "flux_client_id_fallbacks_total", "Requests fair-shared by peer address or session for want of a client id", ("source",))
+
+
+class JobObserver:
+    """
+    Status callback for one submitted job: records how long it spent in each
+    BFL status and how many poll responses it took, then forwards the body.
+    """
+
+    def __init__(self, model: str, forward=None):
+        self.model = model
+        self.forward = forward
+        self.started = time.monotonic()
+        self.status: Optional[str] = None
+        self.since = self.started
+        self.polls = 0
+        in_flight.inc(model=model)
+
+    async def __call__(self, body: Dict[str, Any]) -> None:
+        status = body.get("status")
+        if status != "Submitted":
+            self.polls += 1
+        if status != self.status:
+            now = time.monotonic()
+            if self.status is not None:
+                status_seconds.observe(now - self.since, model=self.model, status=self.status)
+            self.status, self.since = status, now
+        if self.forward is not None:
+            await self.forward(body)
+
+    def finish(self) -> None:
+        in_flight.dec(model=self.model)
+        if self.status == "Ready":
+            time_to_ready_seconds.observe(self.since - self.started, model=self.model)
+            polls_per_job.observe(self.polls, model=self.model)
+
+
+def connection_trace():
+    """
+    Return an httpx "trace" extension that records TCP connect and TLS
+    handshake times. Reused keep-alive connections report nothing.
+    """
+    started: Dict[str, float] = {}
+
+    async def trace(event: str, info: Dict[str, Any]) -> None:
+        for phase in ("connect_tcp", "start_tls"):
+            if event == f"connection.{phase}.started":
+                started[phase] = time.perf_counter()
+            elif event == f"connection.{phase}.complete" and phase in started:
+                connection_setup_seconds.observe(time.perf_counter() - started.pop(phase), phase=phase)
+
+    return trace
+
+
+def summary() -> Dict[str, Dict[str, Any]]:
+    """Per-model digest for health_check: counts, p50/p95 latencies and in-flight jobs."""
+    models: Dict[str, Dict[str, Any]] = {}
+
+    def entry(model: str) -> Dict[str, Any]:
+        return models.setdefault(model, {"generations": 0, "errors": 0, "retries": 0, "in_flight": 0})
+
+    for histogram, label in ((submit_seconds, "submit"), (time_to_ready_seconds, "time_to_ready")):
+        for (model,), (counts, _, _) in histogram.series().items():
+            entry(model)[f"{label}_p50"] = _round(histogram.quantile(0.5, counts))
+            entry(model)[f"{label}_p95"] = _round(histogram.quantile(0.95, counts))
+    for (model,), (_, total, count) in polls_per_job.series().items():
+        entry(model)["polls_per_job"] = round(total / count, 2) if count else None
+    for (model, _source), (_, _, count) in generation_seconds.series().items():
+        entry(model)["generations"] += count
+    for (model, _type), value in errors_total.values().items():
+        if model:
+            entry(model)["errors"] += int(value)
+    for (model, _reason), value in retries_total.values().items():
+        entry(model)["retries"] += int(value)
+    for (model,), value in in_flight.values().items():
+        entry(model)["in_flight"] = int(value)
+    return models
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 3)
+
+
+def serve(port: int, host: str = "127.0.0.1"):
+    """Serve GET /metrics on a background thread and return the ThreadingHTTPServer."""
+    # http.server is imported here rather than at module level: most servers
+    # never enable the endpoint and it is a noticeable part of cold start.
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            data = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
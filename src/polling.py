@@ -0,0 +1,283 @@
+import asyncio
+import heapq
+import itertools
+import random
+import threading
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Mapping, Optional, Set, Tuple
+
+
+class LatencyTracker:
+    """Rolling window of observed time-to-Ready per model."""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, seconds: float) -> None:
+        with self._lock:
+            samples = self._samples.get(model)
+            if samples is None:
+                samples = self._samples[model] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def count(self, model: str) -> int:
+        with self._lock:
+            return len(self._samples.get(model, ()))
+
+    def percentile(self, model: str, q: float, last: Optional[int] = None) -> Optional[float]:
+        """
+        Return the q-th percentile (0-100) for model, or None without samples.
+        With last set, only the most recent last samples are considered.
+        """
+        with self._lock:
+            samples = list(self._samples.get(model, ()))
+        if last is not None:
+            samples = samples[-last:]
+        samples.sort()
+        if not samples:
+            return None
+        index = min(len(samples) - 1, max(0, round(q / 100 * (len(samples) - 1))))
+        return samples[index]
+
+
+# Process-wide estimates shared by every adapter.
+latency_tracker = LatencyTracker()
+
+
+class FixedPollSchedule:
+    """Poll at a constant interval (the original 0.5s behaviour)."""
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+
+    def next_delay(self, elapsed: float, hint: Optional[float] = None) -> float:
+        return self.interval if hint is None else max(self.interval, hint)
+
+
+class AdaptivePollSchedule:
+    """
+    Poll delays shaped by the model's observed time-to-Ready.
+
+    Without history: a short first delay, then exponential backoff.
+    With history: sleep until the fast tail (p10) is reachable, poll densely
+    until the slow tail (p90), then back off. Delays carry random jitter so
+    concurrent jobs do not poll in lockstep, and server hints (Retry-After,
+    ETA) take precedence when present.
+    """
+
+    MIN_SAMPLES = 5
+
+    def __init__(
+        self,
+        model: str,
+        tracker: LatencyTracker = latency_tracker,
+        *,
+        first_delay: float = 0.25,
+        min_delay: float = 0.15,
+        max_delay: float = 4.0,
+        backoff: float = 1.5,
+        jitter: float = 0.15,
+        rng: Optional[random.Random] = None,
+    ):
+        self.first_delay = first_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.jitter = jitter
+        self._rng = rng or random.Random()
+        self._last: Optional[float] = None
+
+        self._lo = self._hi = None
+        if tracker.count(model) >= self.MIN_SAMPLES:
+            self._lo = tracker.percentile(model, 10)
+            self._hi = tracker.percentile(model, 90)
+
+    def _jittered(self, delay: float) -> float:
+        return delay * self._rng.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def next_delay(self, elapsed: float, hint: Optional[float] = None) -> float:
+        if hint is not None:
+            # The server knows better than our estimate; follow it exactly.
+            self._last = max(hint, self.min_delay)
+            return self._last
+
+        if self._lo is None:
+            delay = self.first_delay if self._last is None else min(self._last * self.backoff, self.max_delay)
+        elif elapsed < self._lo:
+            # Nothing is expected to finish yet; skip straight to the fast tail.
+            delay = self._lo - elapsed
+        elif elapsed < self._hi:
+            delay = min((self._hi - self._lo) / 16, self.max_delay)
+        else:
+            delay = min((self._last or self.min_delay) * self.backoff, self.max_delay)
+
+        self._last = max(delay, self.min_delay)
+        return self._jittered(self._last)
+
+
+def poll_hint(headers: Mapping[str, str], body: Optional[Dict[str, Any]] = None) -> Optional[float]:
+    """Extract a server-suggested wait in seconds from Retry-After or an ETA field."""
+    retry_after = headers.get("Retry-After") or headers.get("retry-after")
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                when = parsedate_to_datetime(retry_after)
+                return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+            except (TypeError, ValueError):
+                pass
+
+    if body:
+        for key in ("eta", "eta_seconds", "estimated_time"):
+            value = body.get(key)
+            if isinstance(value, (int, float)) and value >= 0:
+                return float(value)
+    return None
+
+
+@dataclass(eq=False)
+class _PollJob:
+    adapter: Any
+    polling_url: str
+    request_id: str
+    model: str
+    schedule: Any
+    start: float
+    max_wait: float
+    future: asyncio.Future
+    on_status: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+
+
+class PollMultiplexer:
+    """
+    One background poller for every in-flight generation.
+
+    Jobs are kept in a priority queue ordered by their next check time (taken
+    from each job's poll schedule). A single dispatcher task pops due jobs,
+    spaces checks so the total rate stays under max_qps, caps concurrent GETs
+    at max_in_flight, and resolves the future returned by track().
+    """
+
+    def __init__(self, *, max_qps: float = 20.0, max_in_flight: int = 16):
+        self.max_qps = max_qps
+        self.max_in_flight = max_in_flight
+        self._heap: List[Tuple[float, int, _PollJob]] = []
+        self._seq = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._checks: Set[asyncio.Task] = set()
+        self._next_slot = 0.0
+        self.polls_sent = 0
+
+    @property
+    def pending(self) -> int:
+        return sum(1 for _, _, job in self._heap if not job.future.done()) + len(self._checks)
+
+    def _ensure_started(self) -> None:
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def track(
+        self,
+        adapter: Any,
+        polling_url: str,
+        request_id: str,
+        model: str,
+        max_wait: float,
+        on_status: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+    ) -> Dict[str, Any]:
+        """Poll request_id until Ready and return the result; raises like the adapter's own loop."""
+        self._ensure_started()
+        loop = asyncio.get_running_loop()
+        job = _PollJob(
+            adapter, polling_url, request_id, model, adapter.poll_schedule(model),
+            loop.time(), max_wait, loop.create_future(), on_status,
+        )
+        self._schedule(job, None)
+        # Cancelling the caller cancels the future; the dispatcher then drops the job.
+        return await job.future
+
+    def _schedule(self, job: _PollJob, hint: Optional[float]) -> None:
+        now = asyncio.get_running_loop().time()
+        elapsed = now - job.start
+        if elapsed >= job.max_wait:
+            if not job.future.done():
+                job.future.set_exception(TimeoutError(f"Request {job.request_id} timed out after {job.max_wait}s"))
+            return
+        delay = min(job.schedule.next_delay(elapsed, hint), job.max_wait - elapsed)
+        heapq.heappush(self._heap, (now + delay, next(self._seq), job))
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        interval = 1.0 / self.max_qps if self.max_qps > 0 else 0.0
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            due, _, job = self._heap[0]
+            if job.future.done():
+                heapq.heappop(self._heap)
+                continue
+            now = loop.time()
+            wait = max(due, self._next_slot) - now
+            if wait > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            await self._slots.acquire()
+            self._next_slot = max(now, self._next_slot) + interval
+            check = loop.create_task(self._check(job))
+            self._checks.add(check)
+            check.add_done_callback(self._checks.discard)
+
+    async def _check(self, job: _PollJob) -> None:
+        try:
+            self.polls_sent += 1
+            try:
+                result, hint = await job.adapter.poll_once(job.polling_url, job.request_id, job.on_status)
+            except asyncio.CancelledError:
+                job.future.cancel()
+                raise
+            except Exception as e:
+                if not job.future.done():
+                    job.future.set_exception(e)
+                return
+            if job.future.done():
+                return
+            if result is not None:
+                job.adapter.latency_tracker.record(job.model, asyncio.get_running_loop().time() - job.start)
+                job.future.set_result(result)
+                return
+            self._schedule(job, hint)
+        finally:
+            self._slots.release()
+
+    async def stop(self) -> None:
+        """Stop the dispatcher and cancel every job still waiting."""
+        tasks = list(self._checks)
+        if self._task is not None:
+            tasks.append(self._task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for _, _, job in self._heap:
+            job.future.cancel()
+        self._heap.clear()
+        self._task = None
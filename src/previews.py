@@ -0,0 +1,182 @@
+import asyncio
+import io
+import tempfile
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import IO, Any, Dict, Optional, Union
+
+try:
+    from .singleflight import SingleFlight
+    from .transport import get_download_client
+except ImportError:
+    from singleflight import SingleFlight
+    from transport import get_download_client
+
+
+_FORMATS = {"jpeg": ("JPEG", "image/jpeg"), "webp": ("WEBP", "image/webp")}
+
+# Quality is lowered in these steps, down to MIN_QUALITY, before the size is.
+QUALITY_STEP = 15
+MIN_QUALITY = 30
+MAX_STEPS = 8
+
+# Downloaded images up to this size are decoded from memory, larger ones are
+# spooled to a temporary file first.
+SPOOL_BYTES = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class Preview:
+    data: bytes = field(repr=False)
+    mime_type: str
+    width: int
+    height: int
+    quality: int
+
+    def info(self) -> Dict[str, Any]:
+        """What goes into meta["preview"]; the image itself is returned as MCP image content."""
+        return {
+            "mime_type": self.mime_type,
+            "width": self.width,
+            "height": self.height,
+            "bytes": len(self.data),
+            "quality": self.quality,
+        }
+
+
+class PreviewMaker:
+    """
+    Small inline previews of generated images, so clients can look at a
+    result without fetching it at full size.
+
+    The image is read from its local artifact when the request downloaded
+    one, and otherwise streamed from the sample URL into a temporary file,
+    refusing anything over max_source_bytes. Pillow decodes JPEGs at a reduced scale when the
+    preview is much smaller, fits the image into max_side pixels and encodes
+    it as JPEG or WebP at quality; when the result is over max_bytes the
+    quality is lowered, then the size, until it fits; when it still does not,
+    make() raises ValueError rather than return it. Recent previews are
+    kept by sample URL, and concurrent requests for one image share a single
+    preview. Needs Pillow; without it make() raises RuntimeError.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_side: int = 256,
+        max_bytes: int = 32 * 1024,
+        image_format: str = "jpeg",
+        quality: int = 70,
+        max_source_bytes: int = 32 * 1024 * 1024,
+        max_concurrency: int = 4,
+        cache_entries: int = 128,
+        chunk_size: int = 64 * 1024,
+        timeout: float = 60.0,
+    ):
+        if image_format not in _FORMATS:
+            raise ValueError(f"Unknown preview format {image_format!r}; use jpeg or webp")
+        self.max_side = max_side
+        self.max_bytes = max_bytes
+        self.image_format = image_format
+        self.quality = quality
+        self.max_source_bytes = max_source_bytes
+        self.cache_entries = cache_entries
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._flights = SingleFlight()
+        self._cache: "OrderedDict[str, Preview]" = OrderedDict()
+        self.made = 0
+        self.reused = 0
+        self.failures = 0
+        self.bytes_downloaded = 0
+
+    async def make(self, sample: str, artifact_path: Optional[str] = None) -> Preview:
+        """Return the preview of the image at sample, read from artifact_path instead when given."""
+        preview = self._cache.get(sample)
+        if preview is not None:
+            self._cache.move_to_end(sample)
+            self.reused += 1
+            return preview
+        preview, _ = await self._flights.do(sample, lambda: self._make(sample, artifact_path))
+        return preview
+
+    async def _make(self, sample: str, artifact_path: Optional[str]) -> Preview:
+        async with self._slots:
+            try:
+                if artifact_path:
+                    preview = await asyncio.to_thread(self._render, artifact_path)
+                else:
+                    with await self._download(sample) as source:
+                        preview = await asyncio.to_thread(self._render, source)
+            except BaseException:
+                self.failures += 1
+                raise
+        self.made += 1
+        self._cache[sample] = preview
+        while len(self._cache) > self.cache_entries:
+            self._cache.popitem(last=False)
+        return preview
+
+    async def _download(self, url: str) -> IO[bytes]:
+        """The image at url in a temporary file, positioned at its start; the caller closes it."""
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+        size = 0
+        try:
+            async with get_download_client().stream("GET", url, timeout=self.timeout) as resp:
+                resp.raise_for_status()
+                async for chunk in resp.aiter_bytes(self.chunk_size):
+                    size += len(chunk)
+                    if size > self.max_source_bytes:
+                        raise ValueError(f"Image is larger than {self.max_source_bytes} bytes")
+                    await asyncio.to_thread(spool.write, chunk)
+            spool.seek(0)
+        except BaseException:
+            spool.close()
+            raise
+        self.bytes_downloaded += size
+        return spool
+
+    def _render(self, source: Union[str, IO[bytes]]) -> Preview:
+        try:
+            from PIL import Image
+        except ImportError:
+            raise RuntimeError('Previews need Pillow (pip install "flux-mcp[images]")') from None
+
+        fmt, mime = _FORMATS[self.image_format]
+        with Image.open(source) as img:
+            # thumbnail() lets the JPEG decoder scale down by up to 8x while
+            # decoding, which is most of the saving on a full-size image.
+            img.thumbnail((self.max_side, self.max_side), Image.LANCZOS)
+            img = img.convert("RGB")
+        quality = self.quality
+        # A few steps at most: quality first, then three quarters of the size.
+        for _ in range(MAX_STEPS):
+            out = io.BytesIO()
+            if fmt == "JPEG":
+                img.save(out, fmt, quality=quality, optimize=True)
+            else:
+                img.save(out, fmt, quality=quality, method=4)
+            data = out.getvalue()
+            if len(data) <= self.max_bytes:
+                break
+            if quality > MIN_QUALITY:
+                quality = max(MIN_QUALITY, quality - QUALITY_STEP)
+            else:
+                img = img.resize((max(1, img.width * 3 // 4), max(1, img.height * 3 // 4)), Image.LANCZOS)
+        else:
+            raise ValueError(f"No preview fits in {self.max_bytes} bytes")
+        return Preview(data, mime, img.width, img.height, quality)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "format": self.image_format,
+            "max_side": self.max_side,
+            "max_bytes": self.max_bytes,
+            "made": self.made,
+            "reused": self.reused,
+            "failures": self.failures,
+            "bytes_downloaded": self.bytes_downloaded,
+            "cached": len(self._cache),
+            "in_flight": self._flights.in_flight,
+        }
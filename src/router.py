@@ -0,0 +1,138 @@
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+try:
+    from . import metrics
+    from .polling import LatencyTracker
+except ImportError:
+    import metrics
+    from polling import LatencyTracker
+
+# Routable models from best to fastest, with the time-to-Ready (seconds)
+# assumed until enough observations exist.
+MODEL_PRIORS: Tuple[Tuple[str, float], ...] = (
+    ("flux-pro-1.1", 8.0),
+    ("flux-dev", 10.0),
+    ("flux-schnell", 2.5),
+)
+
+# Quality level -> the model routing starts from before falling back to faster ones.
+QUALITY_MODELS = {
+    "high": "flux-pro-1.1",
+    "standard": "flux-dev",
+    "draft": "flux-schnell",
+}
+
+SUBMIT_PRIOR = 0.5
+
+
+class ModelRouter:
+    """
+    Choose a model for a latency budget and/or quality level.
+
+    Candidates are the models from the quality level's preferred model down
+    to the fastest. Each is estimated as admission wait + submit time + the
+    p90 of its last `recent` times to Ready (MODEL_PRIORS until min_samples
+    exist). The first candidate whose estimate fits the budget wins; without
+    a budget, the first one not running slow (recent p50 more than
+    slow_factor times its usual p50). If nothing qualifies, the fastest
+    estimate wins. choose() returns the decision with its reason, for meta.
+    """
+
+    def __init__(
+        self,
+        tracker: LatencyTracker,
+        *,
+        priors: Optional[Mapping[str, float]] = None,
+        recent: int = 20,
+        min_samples: int = 3,
+        slow_factor: float = 1.5,
+    ):
+        self.tracker = tracker
+        self.priors = dict(MODEL_PRIORS)
+        self.priors.update(priors or {})
+        self.order = [model for model, _ in MODEL_PRIORS]
+        self.recent = recent
+        self.min_samples = min_samples
+        self.slow_factor = slow_factor
+
+    def _usual(self, model: str) -> float:
+        # The long window once it is meaningful, else the prior.
+        if self.tracker.count(model) >= max(self.min_samples, self.recent):
+            return self.tracker.percentile(model, 50)
+        return self.priors[model]
+
+    def estimate(self, model: str) -> Dict[str, Any]:
+        """Expected seconds to Ready after submission, and whether the model is running slow."""
+        if self.tracker.count(model) < self.min_samples:
+            return {"ready_s": self.priors[model], "source": "prior", "slow": False}
+        p90 = self.tracker.percentile(model, 90, last=self.recent)
+        p50 = self.tracker.percentile(model, 50, last=self.recent)
+        return {"ready_s": p90, "source": "observed", "slow": p50 > self.slow_factor * self._usual(model)}
+
+    def submit_estimate(self, model: str) -> float:
+        series = metrics.submit_seconds.series().get((model,))
+        if series is None:
+            return SUBMIT_PRIOR
+        return metrics.submit_seconds.quantile(0.5, series[0]) or SUBMIT_PRIOR
+
+    def typical_job_seconds(self) -> float:
+        return min(self.estimate(model)["ready_s"] for model in self.order)
+
+    def choose(
+        self,
+        *,
+        latency_budget_ms: Optional[float] = None,
+        quality: Optional[str] = None,
+        queue_wait: float = 0.0,
+    ) -> Dict[str, Any]:
+        """
+        Return {"model", "reason", "estimated_ms", "candidates", ...} for the
+        request. Raises ValueError for an unknown quality level.
+        """
+        if quality is not None and quality not in QUALITY_MODELS:
+            raise ValueError(f"Unknown quality {quality!r}; use one of {', '.join(QUALITY_MODELS)}")
+        preferred = QUALITY_MODELS[quality or "high"]
+        candidates = self.order[self.order.index(preferred):]
+
+        estimates: Dict[str, Dict[str, Any]] = {}
+        for model in candidates:
+            estimate = self.estimate(model)
+            total = queue_wait + self.submit_estimate(model) + estimate["ready_s"]
+            estimates[model] = {**estimate, "total_ms": round(total * 1000)}
+
+        chosen, reason = None, None
+        for model in candidates:
+            estimate = estimates[model]
+            if latency_budget_ms is not None:
+                if estimate["total_ms"] <= latency_budget_ms:
+                    chosen = model
+                    reason = "preferred model fits the budget" if model == preferred else (
+                        f"{preferred} estimated at {estimates[preferred]['total_ms']}ms exceeds the "
+                        f"{latency_budget_ms:.0f}ms budget; {model} fits"
+                    )
+                    break
+            elif not estimate["slow"]:
+                chosen = model
+                reason = "preferred model" if model == preferred else f"{preferred} is running slow; fell back to {model}"
+                break
+        if chosen is None:
+            chosen = min(candidates, key=lambda m: estimates[m]["total_ms"])
+            reason = (
+                f"no model fits the {latency_budget_ms:.0f}ms budget; chose the fastest estimate"
+                if latency_budget_ms is not None else "every candidate is running slow; chose the fastest estimate"
+            )
+
+        decision = {
+            "model": chosen,
+            "reason": reason,
+            "quality": quality or "high",
+            "estimated_ms": estimates[chosen]["total_ms"],
+            "queue_wait_ms": round(queue_wait * 1000),
+            "candidates": {
+                model: {"estimated_ms": e["total_ms"], "source": e["source"], "slow": e["slow"]}
+                for model, e in estimates.items()
+            },
+        }
+        if latency_budget_ms is not None:
+            decision["latency_budget_ms"] = latency_budget_ms
+        return decision
@@ -0,0 +1,141 @@
+import heapq
+import itertools
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Mapping, Optional, Tuple
+
+try:
+    from . import metrics
+except ImportError:
+    import metrics
+
+# Highest priority first. Interactive work is served before bulk work, and
+# within a class clients share admissions by weight.
+PRIORITIES = ("interactive", "bulk")
+
+
+@dataclass(eq=False)
+class Ticket:
+    priority: str
+    client: str
+    start: float
+    finish: float
+    seq: int
+    enqueued_at: float = field(default_factory=time.monotonic)
+    future: Any = None
+    dead: bool = False
+
+
+class FairQueue:
+    """
+    Order in which queued submissions are admitted.
+
+    Classes in PRIORITIES are strict priorities: a queued bulk ticket is
+    overtaken by every interactive ticket that arrives after it, unless it
+    has waited longer than max_wait seconds, after which it goes first (so
+    bulk work is delayed, never starved). Within a class, clients are served
+    by start-time fair queueing: each client's tickets are spaced 1/weight
+    apart in virtual time, so a client with 200 queued images and one with a
+    single image alternate instead of running first-come first-served.
+    """
+
+    def __init__(self, *, weights: Optional[Mapping[str, float]] = None, max_wait: float = 30.0):
+        self.weights = dict(weights or {})
+        self.max_wait = max_wait
+        self._seq = itertools.count()
+        self._heaps: Dict[str, List[Tuple[float, int, Ticket]]] = {p: [] for p in PRIORITIES}
+        self._arrivals: Dict[str, Deque[Ticket]] = {p: deque() for p in PRIORITIES}
+        self._virtual_time: Dict[str, float] = {p: 0.0 for p in PRIORITIES}
+        self._last_finish: Dict[Tuple[str, str], float] = {}
+        self._depth: Dict[str, int] = {p: 0 for p in PRIORITIES}
+        self.overtaken: Dict[str, int] = {p: 0 for p in PRIORITIES}
+
+    def __len__(self) -> int:
+        return sum(self._depth.values())
+
+    def depth(self, priority: str) -> int:
+        return self._depth[priority]
+
+    def push(self, priority: str, client: str) -> Ticket:
+        if priority not in self._heaps:
+            raise ValueError(f"Unknown priority {priority!r}; use one of {', '.join(PRIORITIES)}")
+        weight = self.weights.get(client, 1.0)
+        start = max(self._virtual_time[priority], self._last_finish.get((priority, client), 0.0))
+        ticket = Ticket(priority, client, start, start + 1.0 / weight, next(self._seq))
+        self._last_finish[(priority, client)] = ticket.finish
+        heapq.heappush(self._heaps[priority], (ticket.finish, ticket.seq, ticket))
+        self._arrivals[priority].append(ticket)
+        self._depth[priority] += 1
+        metrics.queue_depth.inc(priority=priority)
+        return ticket
+
+    def discard(self, ticket: Ticket) -> None:
+        """Drop a ticket whose caller gave up; it is skipped when reached."""
+        if not ticket.dead:
+            ticket.dead = True
+            self._depth[ticket.priority] -= 1
+            metrics.queue_depth.dec(priority=ticket.priority)
+
+    def pop(self) -> Optional[Ticket]:
+        now = time.monotonic()
+        aged = self._oldest_aged(now)
+        if aged is not None:
+            ticket = aged
+        else:
+            ticket = None
+            for priority in PRIORITIES:
+                ticket = self._head(priority)
+                if ticket is not None:
+                    break
+            if ticket is None:
+                return None
+        self._take(ticket)
+        return ticket
+
+    def _oldest_aged(self, now: float) -> Optional[Ticket]:
+        oldest = None
+        for priority in PRIORITIES[1:]:
+            arrivals = self._arrivals[priority]
+            while arrivals and arrivals[0].dead:
+                arrivals.popleft()
+            if arrivals and now - arrivals[0].enqueued_at > self.max_wait:
+                if oldest is None or arrivals[0].enqueued_at < oldest.enqueued_at:
+                    oldest = arrivals[0]
+        return oldest
+
+    def _head(self, priority: str) -> Optional[Ticket]:
+        heap = self._heaps[priority]
+        while heap and heap[0][2].dead:
+            heapq.heappop(heap)
+        return heap[0][2] if heap else None
+
+    def _take(self, ticket: Ticket) -> None:
+        priority = ticket.priority
+        ticket.dead = True
+        # Drop taken and discarded tickets from the front of this class and
+        # the lower ones, so neither the heap nor the arrivals hold on to them.
+        self._head(priority)
+        for cls in PRIORITIES[PRIORITIES.index(priority):]:
+            arrivals = self._arrivals[cls]
+            while arrivals and arrivals[0].dead:
+                arrivals.popleft()
+            # Lower classes with older tickets were overtaken by this admission.
+            if cls != priority and arrivals and arrivals[0].enqueued_at < ticket.enqueued_at:
+                self.overtaken[cls] += 1
+                metrics.queue_overtaken_total.inc(priority=cls)
+        self._depth[priority] -= 1
+        metrics.queue_depth.dec(priority=priority)
+        self._virtual_time[priority] = max(self._virtual_time[priority], ticket.start)
+        if len(self._last_finish) > 1024:
+            # Clients at or behind virtual time start from it anyway; forget them.
+            self._last_finish = {
+                key: finish for key, finish in self._last_finish.items()
+                if finish > self._virtual_time[key[0]]
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": dict(self._depth),
+            "overtaken": dict(self.overtaken),
+        }
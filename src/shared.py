@@ -0,0 +1,305 @@
+import json
+import os
+import threading
+import time
+import uuid
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import sqlite3
+
+try:
+    from .cache import open_database
+except ImportError:
+    from cache import open_database
+
+# While every active-task slot of a key is taken, admission checks again this
+# often: a slot freed by another worker does not wake this one.
+SLOT_RETRY = 0.2
+
+
+class SharedState:
+    """
+    State shared by the worker processes of one HTTP deployment, in one
+    SQLite file (WAL) on the local machine.
+
+    It holds three things:
+
+    - workers: one row per process, refreshed by heartbeat(). A worker whose
+      last heartbeat is older than lease seconds is considered gone, and its
+      active-task slots and journal entries are freed for the others.
+    - jobs: flux_submit jobs as written by the worker running them, so that
+      any worker can answer flux_status and flux_result.
+    - limits: per API key, the submit token bucket and 429 pause, and each
+      worker's active-task count (see SharedLimits).
+
+    Another backend (Redis, a database server) can stand in for it by
+    providing the same methods; JobTable, AdmissionController and the
+    journal resume only use those. The connection is opened on first use.
+    """
+
+    def __init__(self, path: str, *, lease: float = 30.0):
+        self.path = path
+        self.lease = lease
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._db: Optional["sqlite3.Connection"] = None
+        self._closed = False
+        self._heartbeats = 0
+
+    def _connection(self) -> Optional["sqlite3.Connection"]:
+        if self._db is None and not self._closed:
+            self._db = open_database(self.path)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS workers (worker_id TEXT PRIMARY KEY, pid INTEGER, heartbeat_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "job_id TEXT PRIMARY KEY, model TEXT NOT NULL, status TEXT NOT NULL, request_id TEXT, "
+                "bfl_status TEXT, progress REAL, created_at REAL NOT NULL, finished_at REAL, response TEXT, "
+                "worker_id TEXT)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, blocked_until REAL NOT NULL DEFAULT 0)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS slots ("
+                "key TEXT NOT NULL, worker_id TEXT NOT NULL, active INTEGER NOT NULL, PRIMARY KEY (key, worker_id))"
+            )
+            self._db.commit()
+        return self._db
+
+    # ---------------- workers ----------------
+
+    def heartbeat(self) -> None:
+        """Mark this worker alive; every tenth call also drops the rows of workers that are gone."""
+        now = time.time()
+        with self._lock:
+            db = self._connection()
+            if db is None:
+                return
+            db.execute(
+                "INSERT OR REPLACE INTO workers (worker_id, pid, heartbeat_at) VALUES (?, ?, ?)",
+                (self.worker_id, os.getpid(), now),
+            )
+            self._heartbeats += 1
+            if self._heartbeats % 10 == 1:
+                stale = now - 10 * self.lease
+                db.execute(
+                    "DELETE FROM slots WHERE worker_id IN (SELECT worker_id FROM workers WHERE heartbeat_at < ?)",
+                    (stale,),
+                )
+                db.execute("DELETE FROM workers WHERE heartbeat_at < ?", (stale,))
+            db.commit()
+
+    def live_workers(self) -> List[str]:
+        with self._lock:
+            db = self._connection()
+            if db is None:
+                return []
+            rows = db.execute(
+                "SELECT worker_id FROM workers WHERE heartbeat_at >= ?", (time.time() - self.lease,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def leave(self) -> None:
+        """Deregister this worker on shutdown so the others take over its work at once."""
+        with self._lock:
+            if self._db is None:
+                return
+            self._db.execute("DELETE FROM slots WHERE worker_id = ?", (self.worker_id,))
+            self._db.execute("DELETE FROM workers WHERE worker_id = ?", (self.worker_id,))
+            self._db.commit()
+
+    # ---------------- jobs ----------------
+
+    def put_job(self, record: Dict[str, Any]) -> None:
+        """Insert or update a job; record is Job.to_record()."""
+        response = record.get("response")
+        with self._lock:
+            db = self._connection()
+            if db is None:
+                return
+            db.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, model, status, request_id, bfl_status, progress, "
+                "created_at, finished_at, response, worker_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    record["job_id"], record["model"], record["status"], record.get("request_id"),
+                    record.get("bfl_status"), record.get("progress"), record["created_at"],
+                    record.get("finished_at"), json.dumps(response) if response is not None else None,
+                    self.worker_id,
+                ),
+            )
+            db.commit()
+
+    def get_job(self, job_id: str, ttl: float) -> Optional[Dict[str, Any]]:
+        """The job's latest record, or None when unknown or finished more than ttl seconds ago."""
+        with self._lock:
+            db = self._connection()
+            if db is None:
+                return None
+            row = db.execute(
+                "SELECT job_id, model, status, request_id, bfl_status, progress, created_at, finished_at, response "
+                "FROM jobs WHERE job_id = ? AND (finished_at IS NULL OR finished_at >= ?)",
+                (job_id, time.time() - ttl),
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("job_id", "model", "status", "request_id", "bfl_status", "progress", "created_at", "finished_at")
+        record = dict(zip(keys, row))
+        record["response"] = json.loads(row[8]) if row[8] is not None else None
+        return record
+
+    def expire_jobs(self, ttl: float) -> None:
+        with self._lock:
+            if self._db is None:
+                return
+            self._db.execute("DELETE FROM jobs WHERE finished_at < ?", (time.time() - ttl,))
+            self._db.commit()
+
+    # ---------------- limits ----------------
+
+    def limits(self, key: str) -> "SharedLimits":
+        return SharedLimits(self, key)
+
+    def _live_active(self, db: "sqlite3.Connection", key: str, now: float) -> int:
+        return db.execute(
+            "SELECT COALESCE(SUM(s.active), 0) FROM slots s JOIN workers w ON w.worker_id = s.worker_id "
+            "WHERE s.key = ? AND w.heartbeat_at >= ?",
+            (key, now - self.lease),
+        ).fetchone()[0]
+
+    def _bucket(self, db: "sqlite3.Connection", key: str, rate: float, burst: int, now: float) -> Tuple[float, float]:
+        row = db.execute("SELECT tokens, updated_at, blocked_until FROM buckets WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return float(burst), 0.0
+        tokens, updated_at, blocked_until = row
+        return min(float(burst), tokens + max(0.0, now - updated_at) * rate), blocked_until
+
+    def _add_active(self, db: "sqlite3.Connection", key: str, delta: int) -> None:
+        db.execute(
+            "INSERT INTO slots (key, worker_id, active) VALUES (?, ?, MAX(0, ?)) "
+            "ON CONFLICT (key, worker_id) DO UPDATE SET active = MAX(0, slots.active + ?)",
+            (key, self.worker_id, delta, delta),
+        )
+
+    def take(self, key: str, rate: float, burst: int, max_active: int) -> float:
+        """
+        Take a submit token and an active-task slot of key if both are free
+        and return 0; otherwise take nothing and return the seconds to wait
+        before trying again.
+        """
+        now = time.time()
+        with self._lock:
+            db = self._connection()
+            if db is None:
+                return 0.0
+            # BEGIN IMMEDIATE takes the write lock up front, so two workers
+            # cannot both take the last token.
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                tokens, blocked_until = self._bucket(db, key, rate, burst, now)
+                if blocked_until > now:
+                    return blocked_until - now
+                if self._live_active(db, key, now) >= max_active:
+                    return SLOT_RETRY
+                if tokens < 1 and rate > 0:
+                    return (1 - tokens) / rate
+                db.execute(
+                    "INSERT OR REPLACE INTO buckets (key, tokens, updated_at, blocked_until) VALUES (?, ?, ?, ?)",
+                    (key, tokens - 1, now, blocked_until),
+                )
+                self._add_active(db, key, 1)
+                db.commit()
+                return 0.0
+            finally:
+                if db.in_transaction:
+                    db.rollback()
+
+    def add_active(self, key: str, delta: int) -> None:
+        with self._lock:
+            db = self._connection()
+            if db is None:
+                return
+            self._add_active(db, key, delta)
+            db.commit()
+
+    def pause(self, key: str, rate: float, burst: int, delay: float) -> None:
+        now = time.time()
+        with self._lock:
+            db = self._connection()
+            if db is None:
+                return
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                tokens, blocked_until = self._bucket(db, key, rate, burst, now)
+                db.execute(
+                    "INSERT OR REPLACE INTO buckets (key, tokens, updated_at, blocked_until) VALUES (?, ?, ?, ?)",
+                    (key, tokens, now, max(blocked_until, now + delay)),
+                )
+                db.commit()
+            finally:
+                if db.in_transaction:
+                    db.rollback()
+
+    def snapshot(self, key: str, rate: float, burst: int) -> Dict[str, float]:
+        """Tokens available, live active tasks and seconds of pause left for key, across all workers."""
+        now = time.time()
+        with self._lock:
+            db = self._connection()
+            if db is None:
+                return {"tokens": float(burst), "active": 0, "paused_for": 0.0}
+            tokens, blocked_until = self._bucket(db, key, rate, burst, now)
+            active = self._live_active(db, key, now)
+        return {"tokens": tokens, "active": active, "paused_for": max(0.0, blocked_until - now)}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            db = self._connection()
+            if db is None:
+                return {"path": self.path, "closed": True}
+            workers = db.execute(
+                "SELECT COUNT(*) FROM workers WHERE heartbeat_at >= ?", (time.time() - self.lease,)
+            ).fetchone()[0]
+            counts = dict(db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {
+            "path": self.path,
+            "worker_id": self.worker_id,
+            "live_workers": workers,
+            "jobs": counts,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+class SharedLimits:
+    """
+    One API key's admission limits kept in a SharedState, for
+    AdmissionController(shared=...): the submit rate, active-task limit and
+    429 pauses then hold for all workers together rather than each.
+    """
+
+    def __init__(self, state: SharedState, key: str):
+        self.state = state
+        self.key = key
+
+    def take(self, rate: float, burst: int, max_active: int) -> float:
+        return self.state.take(self.key, rate, burst, max_active)
+
+    def reserve(self) -> None:
+        self.state.add_active(self.key, 1)
+
+    def release(self, count: int = 1) -> None:
+        self.state.add_active(self.key, -count)
+
+    def pause(self, rate: float, burst: int, delay: float) -> None:
+        self.state.pause(self.key, rate, burst, delay)
+
+    def snapshot(self, rate: float, burst: int) -> Dict[str, float]:
+        return self.state.snapshot(self.key, rate, burst)
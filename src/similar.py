@@ -0,0 +1,235 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import struct
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import sqlite3
+
+try:
+    from .cache import cache_key, open_database
+except ImportError:
+    from cache import cache_key, open_database
+
+_WORD = re.compile(r"[^\W_]+")
+
+# 16 bands of 4 MinHash rows: prompts with word-set Jaccard 0.5 share a band
+# with probability ~0.65, at 0.7 ~0.99; candidates are then scored exactly.
+NUM_BANDS = 16
+BAND_ROWS = 4
+MAX_CANDIDATES = 64
+
+# One 32-bit hash function per signature row, all read from a single
+# SHAKE-128 digest of the token: much cheaper in Python than permutations.
+_ROW_FORMAT = struct.Struct(f"<{NUM_BANDS * BAND_ROWS}I")
+_MASK = (1 << 64) - 1
+
+# Meta added per response rather than belonging to the generation itself.
+_TRANSIENT_META = ("cached", "coalesced", "similar", "timings", "routing")
+
+
+def prompt_tokens(prompt: str) -> FrozenSet[str]:
+    """The words of prompt, lowercased, ignoring whitespace, punctuation and order."""
+    return frozenset(_WORD.findall(prompt.lower()))
+
+
+def minhash(tokens: Iterable[str]) -> List[int]:
+    rows = [_ROW_FORMAT.unpack(hashlib.shake_128(t.encode("utf-8")).digest(_ROW_FORMAT.size)) for t in tokens]
+    return list(map(min, zip(*rows)))
+
+
+def params_key(model: str, payload: Dict[str, Any]) -> str:
+    """Fingerprint of everything in the request except the prompt."""
+    return cache_key(model, {k: v for k, v in payload.items() if k != "prompt"})[:16]
+
+
+def band_keys(params: str, signature: List[int]) -> List[int]:
+    """One signed 64-bit key per band, mixing the parameters, band number and its rows."""
+    seed = int(params, 16)
+    keys = []
+    for band in range(NUM_BANDS):
+        key = seed ^ band
+        for row in signature[band * BAND_ROWS:(band + 1) * BAND_ROWS]:
+            key = ((key ^ row) * 0x100000001B3) & _MASK
+        keys.append(key - (1 << 64) if key >> 63 else key)
+    return keys
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class PromptIndex:
+    """
+    Index of past generations for answering near-duplicate prompts.
+
+    Prompts are reduced to their set of words, so case, whitespace,
+    punctuation and word order do not matter, and indexed by MinHash with
+    locality-sensitive banding: a lookup reads the entries sharing one of
+    NUM_BANDS band keys with the prompt and scores them by exact Jaccard
+    similarity. Band keys include every other request parameter, so only
+    generations with the same model, size, seed and so on are candidates.
+    Requests with an input image are not indexed.
+
+    Entries expire after ttl seconds, like sample URLs, unless the image was
+    downloaded: those are kept while the local file exists. Beyond
+    max_entries the oldest entries are dropped; an entry takes about 1.6 KB,
+    most of it the meta and sample URL. Storage is SQLite, in memory or at
+    path, and is only opened on first use; aadd() and alookup() call it from
+    a thread.
+    """
+
+    def __init__(self, *, path: Optional[str] = None, ttl: float = 600.0, max_entries: int = 10_000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db: Optional["sqlite3.Connection"] = None
+        self._closed = False
+        self._adds = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _connection(self) -> Optional["sqlite3.Connection"]:
+        if self._db is None and not self._closed:
+            self._db = open_database(self.path or ":memory:")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "id INTEGER PRIMARY KEY, key TEXT UNIQUE NOT NULL, params TEXT NOT NULL, tokens TEXT NOT NULL, "
+                "prompt TEXT NOT NULL, sample TEXT NOT NULL, meta TEXT NOT NULL, expires_at REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS entries_expiry ON entries (expires_at)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS bands (key INTEGER NOT NULL, entry_id INTEGER NOT NULL, "
+                "PRIMARY KEY (key, entry_id)) WITHOUT ROWID"
+            )
+            self._db.commit()
+        return self._db
+
+    def add(self, key: str, model: str, payload: Dict[str, Any], sample: str, meta: Dict[str, Any]) -> None:
+        """Index a generation under its cache key; adding the same key again updates it."""
+        if "input_image" in payload:
+            return
+        tokens = prompt_tokens(payload.get("prompt", ""))
+        if not tokens:
+            return
+        meta = {k: v for k, v in meta.items() if k not in _TRANSIENT_META}
+        expires_at = None if meta.get("artifact") else time.time() + self.ttl
+        with self._lock:
+            db = self._connection()
+            if db is None:
+                return
+            row = db.execute("SELECT id FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                db.execute(
+                    "UPDATE entries SET sample = ?, meta = ?, expires_at = ? WHERE id = ?",
+                    (sample, json.dumps(meta), expires_at, row[0]),
+                )
+            else:
+                params = params_key(model, payload)
+                entry_id = db.execute(
+                    "INSERT INTO entries (key, params, tokens, prompt, sample, meta, expires_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, params, " ".join(sorted(tokens)), payload["prompt"], sample, json.dumps(meta), expires_at),
+                ).lastrowid
+                db.executemany(
+                    "INSERT OR IGNORE INTO bands (key, entry_id) VALUES (?, ?)",
+                    [(band, entry_id) for band in band_keys(params, minhash(tokens))],
+                )
+                self._adds += 1
+                if self._adds % 1000 == 0:
+                    self._compact(db)
+            db.commit()
+
+    def lookup(
+        self, model: str, payload: Dict[str, Any], threshold: float
+    ) -> Optional[Tuple[str, Dict[str, Any], float, str]]:
+        """Return (sample, meta, score, indexed_prompt) for the most similar entry scoring >= threshold, or None."""
+        tokens = prompt_tokens(payload.get("prompt", ""))
+        if "input_image" in payload or not tokens:
+            return None
+        params = params_key(model, payload)
+        keys = band_keys(params, minhash(tokens))
+        now = time.time()
+        with self._lock:
+            db = self._connection()
+            if db is None:
+                return None
+            rows = db.execute(
+                "SELECT DISTINCT e.id, e.params, e.tokens, e.prompt, e.sample, e.meta, e.expires_at "
+                "FROM bands b JOIN entries e ON e.id = b.entry_id "
+                f"WHERE b.key IN ({','.join('?' * len(keys))}) AND (e.expires_at IS NULL OR e.expires_at > ?) "
+                "LIMIT ?",
+                (*keys, now, MAX_CANDIDATES),
+            ).fetchall()
+
+        best = None
+        for _, entry_params, entry_tokens, prompt, sample, meta_json, expires_at in rows:
+            if entry_params != params:
+                continue
+            score = jaccard(tokens, frozenset(entry_tokens.split(" ")))
+            if score >= threshold and (best is None or score > best[0]):
+                meta = json.loads(meta_json)
+                if expires_at is None and not os.path.exists(meta.get("artifact", {}).get("path", "")):
+                    continue
+                best = (score, sample, meta, prompt)
+        with self._lock:
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        score, sample, meta, prompt = best
+        return sample, meta, score, prompt
+
+    async def aadd(self, key: str, model: str, payload: Dict[str, Any], sample: str, meta: Dict[str, Any]) -> None:
+        # In memory too: an add can compact the index, which takes a while at max_entries.
+        await asyncio.to_thread(self.add, key, model, payload, sample, meta)
+
+    async def alookup(
+        self, model: str, payload: Dict[str, Any], threshold: float
+    ) -> Optional[Tuple[str, Dict[str, Any], float, str]]:
+        return await asyncio.to_thread(self.lookup, model, payload, threshold)
+
+    def _compact(self, db: "sqlite3.Connection") -> None:
+        # Ids only grow, so everything max_entries or more below the newest id
+        # is over the limit. Band rows are keyed for lookups; their keys are
+        # recomputed from the stored tokens.
+        stale = db.execute(
+            "SELECT id, params, tokens FROM entries WHERE expires_at <= ? "
+            "UNION SELECT id, params, tokens FROM entries WHERE id <= (SELECT MAX(id) FROM entries) - ?",
+            (time.time(), self.max_entries),
+        ).fetchall()
+        for entry_id, params, tokens in stale:
+            db.executemany(
+                "DELETE FROM bands WHERE key = ? AND entry_id = ?",
+                [(band, entry_id) for band in band_keys(params, minhash(tokens.split(" ")))],
+            )
+        db.executemany("DELETE FROM entries WHERE id = ?", [(entry_id,) for entry_id, _, _ in stale])
+
+    def compact(self) -> None:
+        with self._lock:
+            db = self._connection()
+            if db is not None:
+                self._compact(db)
+                db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0] if self._db is not None else 0
+            return {
+                "entries": entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "persistent": self.path is not None,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            if self._db is not None:
+                self._db.close()
+                self._db = None
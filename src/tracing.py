@@ -0,0 +1,125 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# Same shape as flux_adapter.StatusCallback.
+StatusCallback = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class Timeline:
+    """
+    Timestamped events for one generation, kept as offsets from its start.
+
+    Events: cache_hit, coalesced, queued, admitted, post_start, post_end,
+    poll (with status/progress), ready, download_start, download_end and
+    error. to_dict() adds the per-phase durations derived from them.
+    """
+
+    def __init__(self, model: str):
+        self.model = model
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.events: List[Dict[str, Any]] = []
+
+    def mark(self, event: str, **fields: Any) -> None:
+        self.events.append({"t_ms": round((time.perf_counter() - self._t0) * 1000, 1), "event": event, **fields})
+
+    def status_recorder(self, forward: Optional[StatusCallback] = None) -> StatusCallback:
+        """Status callback that marks every poll response, then forwards it."""
+
+        async def record(body: Dict[str, Any]) -> None:
+            if body.get("status") != "Submitted":
+                self.mark("poll", status=body.get("status"), progress=body.get("progress"))
+            if forward is not None:
+                await forward(body)
+
+        return record
+
+    def _at(self, event: str) -> Optional[float]:
+        for e in self.events:
+            if e["event"] == event:
+                return e["t_ms"]
+        return None
+
+    def phases(self) -> Dict[str, float]:
+        phases: Dict[str, float] = {}
+        for name, start, end in (
+            ("queue_ms", "queued", "admitted"),
+            ("submit_ms", "post_start", "post_end"),
+            ("wait_ms", "post_end", "ready"),
+            ("download_ms", "download_start", "download_end"),
+        ):
+            t0, t1 = self._at(start), self._at(end)
+            if t0 is not None and t1 is not None:
+                phases[name] = round(t1 - t0, 1)
+
+        # Time in each BFL status, from the first poll that reported it to the next change.
+        previous: Optional[Dict[str, Any]] = None
+        for e in self.events:
+            if e["event"] != "poll":
+                continue
+            if previous is not None and e["status"] != previous["status"]:
+                key = f"{str(previous['status']).lower()}_ms"
+                phases[key] = round(phases.get(key, 0.0) + e["t_ms"] - previous["t_ms"], 1)
+            if previous is None or e["status"] != previous["status"]:
+                previous = e
+        if self.events:
+            phases["total_ms"] = self.events[-1]["t_ms"]
+        return phases
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "started_at": datetime.fromtimestamp(self.started_at, timezone.utc).isoformat(),
+            "phases": self.phases(),
+            "events": list(self.events),
+        }
+
+
+class TraceLog:
+    """
+    Appends one JSON line per generation to path, rotating it to path.1 ...
+    path.<backups> once it exceeds max_bytes. Writes are small buffered
+    appends under a lock, cheap enough to leave enabled.
+    """
+
+    def __init__(self, path: str, *, max_bytes: int = 50 * 1024 * 1024, backups: int = 3):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._lock = threading.Lock()
+        self._file = None
+        self.written = 0
+
+    def write(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = self.path.open("a", encoding="utf-8")
+            self._file.write(line)
+            self._file.flush()
+            self.written += 1
+            if self._file.tell() >= self.max_bytes:
+                self._rotate()
+
+    def _rotate(self) -> None:
+        self._file.close()
+        self._file = None
+        for i in range(self.backups - 1, 0, -1):
+            older = self.path.with_name(f"{self.path.name}.{i}")
+            if older.exists():
+                os.replace(older, self.path.with_name(f"{self.path.name}.{i + 1}"))
+        if self.backups > 0:
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,128 @@
+import os
+import asyncio
+import threading
+from typing import TYPE_CHECKING, Dict, Tuple
+
+if TYPE_CHECKING:
+    import httpx
+    import requests
+
+
+# Sessions are shared per (api_key, base_url) for the life of the process so that
+# submits and polls reuse warm keep-alive connections instead of paying
+# DNS + TCP + TLS setup against api.bfl.ai on every tool call.
+DEFAULT_POOL_CONNECTIONS = 4
+DEFAULT_POOL_MAXSIZE = int(os.getenv("FLUX_HTTP_POOL_SIZE", "32"))
+
+# requests is only used by the sync code path and is imported on first use,
+# which keeps it (and urllib3) off the server's cold start.
+_sessions: Dict[Tuple[str, str], "requests.Session"] = {}
+_lock = threading.Lock()
+
+# Async clients are bound to the event loop that created them, so they are
+# additionally keyed by loop; the server itself only ever runs one. httpx is
+# imported when the first one is built, like requests.
+_async_clients: Dict[Tuple[str, str, int], Tuple["httpx.AsyncClient", asyncio.AbstractEventLoop]] = {}
+
+
+def _default_headers(api_key: str) -> Dict[str, str]:
+    return {
+        "accept": "application/json",
+        "x-key": api_key,
+        "Content-Type": "application/json",
+    }
+
+
+def build_session(api_key: str, *, pool_maxsize: int = DEFAULT_POOL_MAXSIZE) -> "requests.Session":
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    # Retries are handled by FluxAdapter, so urllib3 must not retry on its own.
+    adapter = HTTPAdapter(
+        pool_connections=DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize=pool_maxsize,
+        max_retries=0,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(_default_headers(api_key))
+    session.headers["Connection"] = "keep-alive"
+    return session
+
+
+def get_session(api_key: str, base_url: str) -> "requests.Session":
+    key = (api_key, base_url.rstrip("/"))
+    session = _sessions.get(key)
+    if session is not None:
+        return session
+    with _lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = build_session(api_key)
+            _sessions[key] = session
+        return session
+
+
+def build_async_client(api_key: str, *, pool_maxsize: int = DEFAULT_POOL_MAXSIZE) -> "httpx.AsyncClient":
+    import httpx
+
+    limits = httpx.Limits(
+        max_connections=pool_maxsize,
+        max_keepalive_connections=pool_maxsize,
+        keepalive_expiry=60.0,
+    )
+    return httpx.AsyncClient(headers=_default_headers(api_key), limits=limits)
+
+
+def build_download_client(*, pool_maxsize: int = DEFAULT_POOL_MAXSIZE) -> "httpx.AsyncClient":
+    import httpx
+
+    # Delivery URLs live on other hosts, so this client must not carry the API key.
+    limits = httpx.Limits(
+        max_connections=pool_maxsize,
+        max_keepalive_connections=pool_maxsize,
+        keepalive_expiry=60.0,
+    )
+    return httpx.AsyncClient(limits=limits, follow_redirects=True)
+
+
+def get_async_client(api_key: str, base_url: str) -> "httpx.AsyncClient":
+    """Return the pooled async client for this key/base_url on the running loop."""
+    loop = asyncio.get_running_loop()
+    key = (api_key, base_url.rstrip("/"), id(loop))
+    entry = _async_clients.get(key)
+    if entry is None or entry[1] is not loop or entry[0].is_closed:
+        entry = (build_async_client(api_key), loop)
+        _async_clients[key] = entry
+    return entry[0]
+
+
+def get_download_client() -> "httpx.AsyncClient":
+    """Return the pooled client for fetching sample URLs on the running loop."""
+    loop = asyncio.get_running_loop()
+    key = ("", "download", id(loop))
+    entry = _async_clients.get(key)
+    if entry is None or entry[1] is not loop or entry[0].is_closed:
+        entry = (build_download_client(), loop)
+        _async_clients[key] = entry
+    return entry[0]
+
+
+async def aclose_clients() -> None:
+    """Close the async clients owned by the running loop and drop the rest."""
+    loop = asyncio.get_running_loop()
+    entries = list(_async_clients.values())
+    _async_clients.clear()
+    for client, owner in entries:
+        if owner is loop and not client.is_closed:
+            await client.aclose()
+
+
+def close_sessions() -> None:
+    """Close every pooled session. Safe to call more than once."""
+    with _lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
@@ -0,0 +1,85 @@
+import sys
+from pathlib import Path
+
+import pytest
+from mcp.server.fastmcp import Context
+
+# Tests import the modules the way the benchmarks do, from src/ directly, and
+# run against the mock API in benchmarks/mock_bfl.py.
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "src"))
+sys.path.insert(0, str(project_root / "benchmarks"))
+
+from mock_bfl import base_url_for, start_mock_server
+
+
+@pytest.fixture
+def start_mock():
+    """Start mock BFL APIs with start_mock_server's options; all are shut down after the test."""
+    servers = []
+
+    def start(**kwargs):
+        server = start_mock_server(**kwargs)
+        server.base_url = base_url_for(server)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+class RecordingContext(Context):
+    """A Context outside any request that keeps the progress and log notifications sent through it."""
+
+    progress: list = []
+    logs: list = []
+
+    async def report_progress(self, progress, total=None, message=None):
+        self.progress.append((progress, total, message))
+
+    async def log(self, level, message, *, logger_name=None):
+        self.logs.append((level, message))
+
+
+@pytest.fixture
+def ctx():
+    return RecordingContext(progress=[], logs=[])
+
+
+@pytest.fixture
+def mock_api(start_mock):
+    """The mock BFL API on a free port; jobs are Ready on the first poll."""
+    return start_mock()
+
+
+@pytest.fixture
+def server(mock_api, monkeypatch):
+    """src/main.py with one API key on the mock API and an empty job table."""
+    import main
+    from admission import AdmissionController
+    from cache import GenerationCache
+    from flux_adapter import FluxAdapter
+    from jobs import JobTable
+    from keypool import KeyPool
+
+    adapters = {}
+
+    def factory(api_key):
+        if api_key not in adapters:
+            adapters[api_key] = FluxAdapter(
+                model="flux-schnell",
+                use_raw_mode=False,
+                api_key=api_key,
+                base_url=mock_api.base_url,
+                adaptive_polling=False,
+                max_post_retries=1,
+                cache=GenerationCache(),
+                admission=AdmissionController(rate=100, burst=100, max_active=4),
+            )
+        return adapters[api_key]
+
+    monkeypatch.setattr(main, "key_pool", KeyPool(["server-test"], factory))
+    monkeypatch.setattr(main, "jobs", JobTable())
+    return main
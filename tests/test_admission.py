@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+import pytest
+
+from admission import AdmissionController, rate_limit_delay
+
+
+async def test_burst_then_rate():
+    admission = AdmissionController(rate=20, burst=2, max_active=10)
+    start = time.monotonic()
+    await admission.acquire()
+    await admission.acquire()
+    assert time.monotonic() - start < 0.02
+    await admission.acquire()
+    assert time.monotonic() - start >= 0.04
+    assert admission.stats()["admitted"] == 3
+
+
+async def test_max_active_waits_for_a_release():
+    admission = AdmissionController(rate=100, burst=10, max_active=1)
+    await admission.acquire()
+    waiting = asyncio.ensure_future(admission.acquire())
+    await asyncio.sleep(0.02)
+    assert not waiting.done() and admission.queued == 1
+    admission.release()
+    await asyncio.wait_for(waiting, 1)
+    assert admission.active == 1
+
+
+async def test_priority_and_order_at_the_slot():
+    admission = AdmissionController(rate=100, burst=10, max_active=1)
+    await admission.acquire()
+    order = []
+
+    async def caller(name, priority):
+        await admission.acquire(priority)
+        order.append(name)
+        admission.release()
+
+    tasks = [asyncio.ensure_future(caller(name, priority)) for name, priority in
+             [("bulk-1", "bulk"), ("interactive-1", "interactive"), ("bulk-2", "bulk"), ("interactive-2", "interactive")]]
+    await asyncio.sleep(0.01)
+    admission.release()
+    await asyncio.wait_for(asyncio.gather(*tasks), 1)
+    assert order == ["interactive-1", "interactive-2", "bulk-1", "bulk-2"]
+    assert admission.stats()["overtaken"] == {"interactive": 0, "bulk": 2}
+
+
+async def test_throttle_pauses_admissions():
+    admission = AdmissionController(rate=100, burst=10, max_active=10)
+    admission.throttle(0.1)
+    assert 0 < admission.paused_for() <= 0.1
+    assert admission.estimated_wait() >= 0.05
+    start = time.monotonic()
+    await admission.acquire()
+    assert time.monotonic() - start >= 0.09
+    assert admission.paused_for() == 0
+
+
+async def test_cancel_while_queued_keeps_no_slot():
+    admission = AdmissionController(rate=100, burst=10, max_active=1)
+    await admission.acquire()
+    waiting = asyncio.ensure_future(admission.acquire())
+    await asyncio.sleep(0)
+    waiting.cancel()
+    await asyncio.gather(waiting, return_exceptions=True)
+    assert admission.queued == 0
+    admission.release()
+    assert admission.active == 0
+    await asyncio.wait_for(admission.acquire(), 1)
+
+
+async def test_cancel_just_after_admission_returns_the_slot():
+    admission = AdmissionController(rate=100, burst=10, max_active=1)
+    await admission.acquire()
+    waiting = asyncio.ensure_future(admission.acquire())
+    await asyncio.sleep(0)
+    admission.release()  # admits the waiter before it gets to run
+    waiting.cancel()
+    await asyncio.gather(waiting, return_exceptions=True)
+    assert admission.active == 0
+
+
+async def test_unknown_priority():
+    with pytest.raises(ValueError):
+        await AdmissionController().acquire("urgent")
+
+
+@pytest.mark.parametrize("headers, expected", [
+    ({"Retry-After": "3"}, 3.0),
+    ({"retry-after": "-1"}, 0.0),
+    ({"x-ratelimit-remaining": "0", "x-ratelimit-reset": "7"}, 7.0),
+    ({"x-ratelimit-remaining": "2", "x-ratelimit-reset": "7"}, None),
+    ({"x-ratelimit-remaining": "0", "x-ratelimit-reset": "soon"}, None),
+    ({}, None),
+])
+def test_rate_limit_delay(headers, expected):
+    assert rate_limit_delay(headers) == expected
+
+
+def test_rate_limit_delay_with_epoch_reset():
+    delay = rate_limit_delay({"x-ratelimit-remaining": "0", "x-ratelimit-reset": str(time.time() + 5)})
+    assert 4 < delay <= 5
+
+
+async def test_zero_rate_means_no_rate_limit():
+    admission = AdmissionController(rate=0, burst=1, max_active=10)
+    for _ in range(5):
+        await asyncio.wait_for(admission.acquire(), 1)
+    assert admission.estimated_wait() == 0
+    admission.throttle(0.05)
+    start = time.monotonic()
+    await admission.acquire()
+    assert time.monotonic() - start >= 0.04
+
+
+def test_negative_rate_is_rejected():
+    with pytest.raises(ValueError):
+        AdmissionController(rate=-1)
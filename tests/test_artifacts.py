@@ -0,0 +1,68 @@
+import asyncio
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import httpx
+import pytest
+
+from artifacts import ArtifactStore
+
+
+async def test_image_is_streamed_to_disk_with_a_manifest(start_mock, tmp_path):
+    api = start_mock(sample_bytes=300 * 1024)
+    store = ArtifactStore(str(tmp_path), chunk_size=16 * 1024)
+    manifest = await store.fetch(f"{api.base_url}/samples/one.jpg", "req/1")
+
+    path = Path(manifest["path"])
+    assert path == tmp_path / "req_1.jpg"
+    data = path.read_bytes()
+    assert manifest["bytes"] == len(data) == 300 * 1024
+    assert manifest["sha256"] == hashlib.sha256(data).hexdigest()
+    assert manifest["content_type"] == "image/jpeg"
+    assert json.loads((tmp_path / "req_1.json").read_text()) == manifest
+    assert not list(tmp_path.glob("*.part"))
+
+    # On disk already: the manifest is reused without downloading again.
+    assert await store.fetch(f"{api.base_url}/samples/one.jpg", "req/1") == manifest
+    assert api.counters["sample"] == 1
+    assert store.stats()["downloads"] == 1 and store.stats()["reused"] == 1
+    assert store.stats()["bytes_written"] == 300 * 1024
+
+
+async def test_concurrent_fetches_of_one_image_share_the_download(mock_api, tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    url = f"{mock_api.base_url}/samples/shared.jpg"
+    manifests = await asyncio.gather(*(store.fetch(url, "shared") for _ in range(5)))
+    assert all(m == manifests[0] for m in manifests)
+    assert mock_api.counters["sample"] == 1
+
+
+async def test_downloads_in_flight_are_capped(start_mock, tmp_path):
+    api = start_mock(sample_bytes=256 * 1024)
+    store = ArtifactStore(str(tmp_path), max_concurrency=2, chunk_size=4 * 1024)
+    most = 0
+    done = False
+
+    async def watch():
+        nonlocal most
+        while not done:
+            most = max(most, sum(name.endswith(".part") for name in os.listdir(tmp_path)))
+            await asyncio.sleep(0)
+
+    watcher = asyncio.create_task(watch())
+    await asyncio.gather(*(store.fetch(f"{api.base_url}/samples/{i}.jpg", f"image-{i}") for i in range(6)))
+    done = True
+    await watcher
+    assert most == 2
+    assert api.counters["sample"] == 6
+    assert store.stats()["downloads"] == 6 and store.stats()["in_flight"] == 0
+
+
+async def test_failed_download_leaves_nothing_behind(mock_api, tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    with pytest.raises(httpx.HTTPStatusError):
+        await store.fetch(f"{mock_api.base_url}/missing.jpg", "missing")
+    assert os.listdir(tmp_path) == []
+    assert store.stats()["failures"] == 1
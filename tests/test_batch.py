@@ -0,0 +1,38 @@
+import json
+
+from flux_adapter import GenerationOptions
+
+
+async def test_batch_reports_each_item_and_keeps_request_order(server, ctx):
+    items = [server.BatchItem(prompt=f"batch item {i}", model="flux-schnell") for i in range(3)]
+    response = await server.flux_generate_batch(items, ctx, max_concurrency=2)
+    assert response["status"] == "success"
+    assert (response["succeeded"], response["failed"]) == (3, 0)
+    assert [r["index"] for r in response["results"]] == [0, 1, 2]
+    assert all(r["image"].endswith(".jpg") for r in response["results"])
+    assert sorted(p for p, _, _ in ctx.progress) == [1, 2, 3]
+    assert all(total == 3 for _, total, _ in ctx.progress)
+    assert sorted(json.loads(message)["index"] for _, message in ctx.logs) == [0, 1, 2]
+
+
+async def test_failed_item_gives_a_partial_batch(server, ctx, tmp_path):
+    notes = tmp_path / "notes.txt"
+    notes.write_text("not an image")
+    items = [
+        server.BatchItem(prompt="works", model="flux-schnell"),
+        server.BatchItem(prompt="unsupported input", model="flux-schnell", input_image=str(notes)),
+        server.BatchItem(prompt="also works", model="flux-schnell"),
+    ]
+    response = await server.flux_generate_batch(items, ctx)
+    assert response["status"] == "partial"
+    assert (response["succeeded"], response["failed"]) == (2, 1)
+    assert [r["status"] for r in response["results"]] == ["success", "error", "success"]
+    assert response["results"][1]["message"] == "Unsupported input image type: .txt"
+    assert "traceback" not in response["results"][1]
+
+
+async def test_batch_items_default_to_bulk(server):
+    item = server.BatchItem(prompt="bulk")
+    assert item.options("client-a") == GenerationOptions(
+        model="flux-pro-1.1", aspect_ratio="16:9", priority="bulk", client="client-a"
+    )
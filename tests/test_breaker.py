@@ -0,0 +1,112 @@
+import asyncio
+import time
+
+import pytest
+
+from admission import AdmissionController
+from breaker import BreakerRegistry, CircuitBreaker, CircuitOpenError
+from flux_adapter import FluxAdapter, GenerationOptions
+
+
+def fail(breaker, times):
+    for _ in range(times):
+        breaker.before_call()
+        breaker.record_failure()
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("submit", failure_threshold=3, reset_timeout=30)
+    fail(breaker, 2)
+    breaker.record_success()
+    fail(breaker, 2)
+    assert breaker.state == CircuitBreaker.CLOSED
+    fail(breaker, 1)
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError) as exc:
+        breaker.before_call()
+    assert exc.value.name == "submit" and 0 < exc.value.retry_in <= 30
+    assert breaker.snapshot()["trips"] == 1 and breaker.snapshot()["rejected"] == 1
+
+
+def test_half_open_lets_one_probe_through(monkeypatch):
+    breaker = CircuitBreaker("poll", failure_threshold=1, reset_timeout=10)
+    fail(breaker, 1)
+    later = time.monotonic() + 10
+    monkeypatch.setattr(time, "monotonic", lambda: later)
+
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+
+
+def test_failed_probe_opens_again(monkeypatch):
+    breaker = CircuitBreaker("poll", failure_threshold=5, reset_timeout=10)
+    fail(breaker, 5)
+    now = time.monotonic() + 10
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    fail(breaker, 1)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.retry_in() == 10
+    assert breaker.trips == 2
+
+
+def test_unreported_probe_does_not_wedge(monkeypatch):
+    breaker = CircuitBreaker("poll", failure_threshold=1, reset_timeout=10)
+    fail(breaker, 1)
+    now = [time.monotonic() + 10]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    breaker.before_call()  # this probe is never reported back
+    now[0] += 10
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_registry():
+    registry = BreakerRegistry(failure_threshold=1, reset_timeout=5)
+    assert registry.get("poll") is registry.get("poll")
+    assert not registry.any_open
+    registry.get("submit:flux-dev").record_failure()
+    assert registry.any_open
+    assert list(registry.snapshot()) == ["poll", "submit:flux-dev"]
+    assert registry.snapshot()["submit:flux-dev"]["state"] == "open"
+
+
+def test_fail_fast_never_takes_the_probe(monkeypatch):
+    breaker = CircuitBreaker("submit", failure_threshold=1, reset_timeout=10)
+    breaker.fail_fast()
+    fail(breaker, 1)
+    with pytest.raises(CircuitOpenError):
+        breaker.fail_fast()
+    later = time.monotonic() + 10
+    monkeypatch.setattr(time, "monotonic", lambda: later)
+    breaker.fail_fast()
+    breaker.fail_fast()
+    breaker.before_call()  # the probe is still there to take
+
+
+async def test_submit_that_is_never_admitted_leaves_the_probe(mock_api):
+    registry = BreakerRegistry(failure_threshold=1, reset_timeout=0.05)
+    adapter = FluxAdapter(
+        model="flux-schnell", use_raw_mode=False, api_key="breaker-test", base_url=mock_api.base_url,
+        adaptive_polling=False, breakers=registry, admission=AdmissionController(rate=100, burst=100, max_active=1),
+    )
+    breaker = registry.get("submit:flux-schnell")
+    breaker.record_failure()
+    await asyncio.sleep(0.06)
+
+    with pytest.raises(ValueError):
+        await adapter.submit({"prompt": "p"}, GenerationOptions(model="flux-schnell", priority="urgent"))
+    await adapter.admission.acquire()  # the only slot: the next submit has to queue
+    queued = asyncio.ensure_future(adapter.submit({"prompt": "p"}))
+    await asyncio.sleep(0.01)
+    queued.cancel()
+    await asyncio.gather(queued, return_exceptions=True)
+    adapter.admission.release()
+
+    # Neither call held the probe, so this submission is let through and closes the circuit.
+    await adapter.submit({"prompt": "p"})
+    assert breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,62 @@
+import time
+
+from cache import GenerationCache, cache_key
+from flux_adapter import FluxAdapter
+
+
+def test_cache_key_is_canonical():
+    assert cache_key("flux-dev", {"prompt": "p", "width": 1024}) == cache_key("flux-dev", {"width": 1024, "prompt": "p"})
+    assert cache_key("flux-dev", {"prompt": "p"}) != cache_key("flux-pro-1.1", {"prompt": "p"})
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = GenerationCache(max_entries=2)
+    cache.put("a", "sample-a", {"n": 1})
+    cache.put("b", "sample-b", {})
+    assert cache.get("a") == ("sample-a", {"n": 1})
+    cache.put("c", "sample-c", {})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats() == {"hits": 3, "misses": 1, "disk_hits": 0, "memory_entries": 2, "persistent": False}
+
+
+def test_entries_expire_with_the_sample_url(monkeypatch):
+    cache = GenerationCache(ttl=60)
+    cache.put("a", "sample-a", {})
+    later = time.time() + 61
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert cache.get("a") is None
+    assert cache.stats()["memory_entries"] == 0
+
+
+def test_returned_meta_is_a_copy():
+    cache = GenerationCache()
+    cache.put("a", "sample-a", {"n": 1})
+    cache.get("a")[1]["n"] = 2
+    assert cache.get("a")[1] == {"n": 1}
+
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    path = str(tmp_path / "cache" / "generations.sqlite3")
+    first = GenerationCache(path=path)
+    first.put("a", "sample-a", {"n": 1})
+    first.close()
+
+    second = GenerationCache(path=path, max_entries=1)
+    assert second.get("a") == ("sample-a", {"n": 1})
+    assert second.stats()["disk_hits"] == 1
+    # Now in the memory tier as well.
+    assert second.get("a") is not None and second.stats()["disk_hits"] == 1
+
+
+async def test_identical_requests_are_answered_from_the_cache(mock_api):
+    adapter = FluxAdapter(
+        model="flux-schnell", use_raw_mode=False, api_key="cache-test", base_url=mock_api.base_url,
+        adaptive_polling=False, cache=GenerationCache(),
+    )
+    sample, meta = await adapter.generate("a red circle")
+    again, cached_meta = await adapter.generate("a red circle")
+    assert again == sample and cached_meta.get("cached") is True
+    assert mock_api.counters["submit"] == 1
+    await adapter.generate("a red circle", use_cache=False)
+    assert mock_api.counters["submit"] == 2
@@ -0,0 +1,71 @@
+import asyncio
+
+from mcp.server.fastmcp import Context
+from mcp.shared.context import RequestContext
+from starlette.requests import Request
+
+import main
+import metrics
+from admission import AdmissionController
+
+
+def http_context(headers=None, host="10.0.0.7"):
+    """The context of one stateless HTTP request: a new session every time."""
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/mcp",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+        "client": (host, 50000),
+    }
+    request_context = RequestContext(request_id=1, meta=None, session=object(), lifespan_context=None, request=Request(scope))
+    return Context(request_context=request_context)
+
+
+def fallbacks(source):
+    return metrics.client_id_fallbacks_total.values().get((source,), 0)
+
+
+def test_header_names_the_client_across_stateless_requests():
+    first, second = http_context({"X-Client-Id": "agent-a"}), http_context({"X-Client-Id": "agent-a"})
+    assert first.session is not second.session
+    assert main._client_id(first) == main._client_id(second) == "agent-a"
+    assert main._client_id(http_context({"X-Client-Id": "agent-b"})) == "agent-b"
+
+
+def test_address_fallback_is_counted():
+    before = fallbacks("address")
+    assert main._client_id(http_context()) == main._client_id(http_context()) == "address-10.0.0.7"
+    assert main._client_id(http_context(host="10.0.0.8")) == "address-10.0.0.8"
+    assert fallbacks("address") == before + 3
+
+
+def test_stdio_falls_back_to_the_session():
+    session = object()
+    ctx = Context(request_context=RequestContext(request_id=1, meta=None, session=session, lifespan_context=None))
+    before = fallbacks("session")
+    assert main._client_id(ctx) == f"session-{id(session):x}"
+    assert fallbacks("session") == before + 1
+
+
+async def test_two_calls_from_one_client_share_a_queue():
+    admission = AdmissionController(rate=100, burst=100, max_active=1)
+    await admission.acquire()
+    order = []
+
+    async def call(name, ctx):
+        await admission.acquire(client=main._client_id(ctx))
+        order.append(name)
+        admission.release()
+
+    # Two stateless requests from agent-a queue behind each other, so agent-b's
+    # request, queued after both, goes second rather than last.
+    tasks = [
+        asyncio.ensure_future(call(name, http_context(headers)))
+        for name, headers in [("a-1", {"X-Client-Id": "agent-a"}), ("a-2", {"X-Client-Id": "agent-a"}),
+                              ("b-1", {"X-Client-Id": "agent-b"})]
+    ]
+    await asyncio.sleep(0.01)
+    admission.release()
+    await asyncio.wait_for(asyncio.gather(*tasks), 1)
+    assert order == ["a-1", "b-1", "a-2"]
@@ -0,0 +1,54 @@
+import base64
+import os
+
+import pytest
+
+from input_images import InputImageEncoder
+
+PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=="
+)
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    root, outside = tmp_path / "inputs", tmp_path / "private"
+    root.mkdir()
+    outside.mkdir()
+    (root / "ref.png").write_bytes(PNG)
+    (outside / "secret.png").write_bytes(PNG)
+    (outside / "secret.txt").write_text("secret")
+    return root, outside
+
+
+def test_encodes_and_caches_local_files(dirs):
+    root, _ = dirs
+    encoder = InputImageEncoder()
+    url = encoder.encode(str(root / "ref.png"))
+    assert url == "data:image/png;base64," + base64.b64encode(PNG).decode()
+    assert encoder.encode(str(root / "ref.png")) == url
+    assert encoder.stats()["hits"] == 1 and encoder.stats()["misses"] == 1
+    for value in ("https://example.com/a.png", "data:image/png;base64,AAAA", "/9j/" + "A" * 5000):
+        assert encoder.encode(value) == value
+
+
+def test_paths_are_confined_to_the_root(dirs):
+    root, outside = dirs
+    encoder = InputImageEncoder(root=str(root))
+    assert encoder.encode("ref.png").startswith("data:image/png;base64,")
+    assert encoder.encode(str(root / "ref.png")).startswith("data:image/png;base64,")
+    os.symlink(outside / "secret.png", root / "link.png")
+    for value in (str(outside / "secret.png"), "../private/secret.png", "link.png",
+                  str(outside / "secret.txt"), str(outside / "missing.png")):
+        with pytest.raises(ValueError, match="inside"):
+            encoder.encode(value)
+    # Raw base64, which may look like an absolute path, still passes through.
+    assert encoder.encode("/9j/4AAQSkZJRg") == "/9j/4AAQSkZJRg"
+
+
+def test_local_files_disabled(dirs):
+    root, _ = dirs
+    encoder = InputImageEncoder(local_files=False)
+    with pytest.raises(ValueError, match="disabled"):
+        encoder.encode(str(root / "ref.png"))
+    assert encoder.encode("https://example.com/a.png") == "https://example.com/a.png"
@@ -0,0 +1,70 @@
+import asyncio
+import threading
+
+from mcp.server.fastmcp import Context
+
+from jobs import JobTable
+
+
+class BlockingStore:
+    """A shared store whose writes wait until released."""
+
+    def __init__(self):
+        self.writing, self.proceed = threading.Event(), threading.Event()
+        self.records = {}
+
+    def put_job(self, record):
+        self.writing.set()
+        self.proceed.wait(5)
+        self.records[record["job_id"]] = record
+
+    def get_job(self, job_id, ttl):
+        return self.records.get(job_id)
+
+    def expire_jobs(self, ttl):
+        pass
+
+
+async def test_submit_cancelled_while_saving_still_finishes_the_job(server, monkeypatch):
+    store = BlockingStore()
+    monkeypatch.setattr(server, "jobs", JobTable(store=store))
+    adapter = server.key_pool.choose()
+
+    submit = asyncio.ensure_future(server.flux_submit(Context(), "cancel during save", model="flux-schnell"))
+    while not store.writing.is_set():
+        await asyncio.sleep(0.01)
+    submit.cancel()
+    await asyncio.gather(submit, return_exceptions=True)
+    store.proceed.set()
+
+    (job,) = server.jobs._jobs.values()
+    assert await server.jobs.wait(job, 5)
+    assert job.status == "success"
+    assert adapter.admission.active == 0
+
+
+async def test_submit_status_result_round_trip(server, mock_api, monkeypatch):
+    monkeypatch.setattr(mock_api, "processing_time", lambda model: 1.0)
+
+    submitted = await server.flux_submit(Context(), "round trip", model="flux-schnell")
+    assert submitted["status"] == "pending"
+    job_id = submitted["job_id"]
+
+    status = await server.flux_status(job_id)
+    assert status["status"] == "pending" and status["model"] == "flux-schnell"
+    assert (await server.flux_result(job_id))["status"] == "pending"
+
+    result = await server.flux_result(job_id, wait_timeout=10)
+    assert result["status"] == "success"
+    assert result["job_id"] == job_id
+    assert result["image"].endswith(".jpg")
+    assert "traceback" not in result
+    status = await server.flux_status(job_id)
+    assert status["status"] == "success" and status["bfl_status"] == "Ready"
+    assert mock_api.counters["submit"] == 1
+
+
+async def test_unknown_job_id(server):
+    assert (await server.flux_status("missing"))["status"] == "error"
+    response = await server.flux_result("missing", wait_timeout=1)
+    assert response == {"status": "error", "message": "Unknown or expired job_id: missing"}
@@ -0,0 +1,109 @@
+import asyncio
+import threading
+import time
+
+from admission import AdmissionController
+from cache import GenerationCache
+from flux_adapter import FluxAdapter
+from journal import JobJournal
+
+
+def make_adapter(base_url, journal, **kwargs):
+    return FluxAdapter(
+        model="flux-schnell",
+        use_raw_mode=False,
+        api_key="journal-test",
+        base_url=base_url,
+        adaptive_polling=False,
+        journal=journal,
+        **kwargs,
+    )
+
+
+def test_claims_entries_of_owners_that_are_gone(tmp_path):
+    path = str(tmp_path / "journal.sqlite3")
+    stopped, alive, me = (JobJournal(path, owner=name) for name in ("stopped", "alive", "me"))
+    stopped.record("r1", "http://poll", "flux-dev", job_id="job-1", key_id="key-a")
+    stopped.record("r2", "http://poll", "flux-dev", key_id="key-other")
+    alive.record("r3", "http://poll", "flux-dev", key_id="key-a")
+    me.record("r4", "http://poll", "flux-dev", key_id="key-a")
+
+    claimed = me.claim_pending(1800, live_owners=["alive"], key_ids=["key-a"])
+    assert [e["request_id"] for e in claimed] == ["r1"]
+    assert claimed[0]["job_id"] == "job-1"
+    # Claimed entries now belong to me: nobody else takes them over while I live.
+    assert alive.claim_pending(1800, live_owners=["me"], key_ids=["key-a"]) == []
+    assert [e["request_id"] for e in alive.claim_pending(1800, live_owners=["me"])] == ["r2"]
+
+
+def test_claim_limit_and_expiry(tmp_path):
+    path = str(tmp_path / "journal.sqlite3")
+    old, new = JobJournal(path, owner="old"), JobJournal(path, owner="new")
+    for i in range(3):
+        old.record(f"r{i}", "http://poll", "flux-dev", job_id=f"job-{i}")
+    old._db.execute("UPDATE submissions SET submitted_at = ? WHERE request_id = 'r0'", (time.time() - 3600,))
+    old._db.commit()
+
+    assert [e["request_id"] for e in new.claim_pending(1800, limit=1)] == ["r1"]
+    finished = new.finished_jobs(60)
+    assert [(e["job_id"], e["response"]["error_type"]) for e in finished] == [("job-0", "JournalExpired")]
+    assert new.stats()["pending"] == 2
+
+
+def test_compact_bounds_finished_entries(tmp_path):
+    journal = JobJournal(str(tmp_path / "journal.sqlite3"), retention=60, max_entries=3)
+    for i in range(6):
+        journal.record(f"r{i}", "http://poll", "flux-dev")
+        journal.finish(f"r{i}", {"status": "success"})
+    journal.record("pending", "http://poll", "flux-dev")
+    journal._db.execute("UPDATE submissions SET finished_at = ? WHERE request_id = 'r5'", (time.time() - 120,))
+    journal._db.commit()
+
+    journal.compact()
+    remaining = {row[0] for row in journal._db.execute("SELECT request_id FROM submissions")}
+    # r5 is past retention; of the rest only the newest three are kept; pending entries always stay.
+    assert remaining == {"r2", "r3", "r4", "pending"}
+
+
+async def test_resume_after_restart(tmp_path, mock_api):
+    path = str(tmp_path / "journal.sqlite3")
+    before = JobJournal(path, owner="before")
+    request_id, polling_url = await make_adapter(mock_api.base_url, before).submit({"prompt": "resume me"}, key="ck")
+    # The process stops before polling: the entry stays pending.
+    before.close()
+
+    after = JobJournal(path, owner="after")
+    cache = GenerationCache()
+    adapter = make_adapter(mock_api.base_url, after, cache=cache, admission=AdmissionController())
+    (entry,) = after.claim_pending(1800)
+    assert (entry["request_id"], entry["cache_key"]) == (request_id, "ck")
+
+    sample, meta = await adapter.resume(entry["request_id"], entry["polling_url"], entry["model"], entry["cache_key"])
+    assert meta["request_id"] == request_id
+    assert cache.get("ck")[0] == sample
+    assert adapter.admission.active == 0
+    assert after.stats() == {"path": path, "pending": 0, "finished": 1, "recorded": 0, "resumed": 0}
+    assert after.claim_pending(1800) == []
+
+
+async def test_cancelled_during_journal_write_releases_the_slot(tmp_path, mock_api, monkeypatch):
+    journal = JobJournal(str(tmp_path / "journal.sqlite3"))
+    writing, proceed = threading.Event(), threading.Event()
+    record = journal.record
+
+    def slow_record(*args):
+        writing.set()
+        proceed.wait(5)
+        record(*args)
+
+    monkeypatch.setattr(journal, "record", slow_record)
+    adapter = make_adapter(mock_api.base_url, journal, admission=AdmissionController())
+    submit = asyncio.ensure_future(adapter.submit({"prompt": "cancel me"}))
+    while not writing.is_set():
+        await asyncio.sleep(0.01)
+    submit.cancel()
+    await asyncio.gather(submit, return_exceptions=True)
+    proceed.set()
+
+    assert submit.cancelled()
+    assert adapter.admission.active == 0
@@ -0,0 +1,104 @@
+import asyncio
+
+import httpx
+import pytest
+
+import main
+from admission import AdmissionController
+from flux_adapter import FluxAdapter
+from keypool import KeyPool, NoHealthyKey, key_id
+from singleflight import SingleFlight
+
+
+def make_pool(base_url, api_keys, *, singleflight=None):
+    adapters = {}
+    listeners = {}
+
+    def factory(api_key):
+        if api_key not in adapters:
+            adapters[api_key] = FluxAdapter(
+                model="flux-schnell",
+                use_raw_mode=False,
+                api_key=api_key,
+                base_url=base_url,
+                adaptive_polling=False,
+                max_post_retries=1,
+                singleflight=singleflight,
+                status_listeners=listeners,
+                admission=AdmissionController(rate=100, burst=100, max_active=4),
+            )
+        return adapters[api_key]
+
+    return KeyPool(api_keys, factory), factory
+
+
+def state(pool, api_key):
+    return next(s for s in pool.stats() if s["key_id"] == key_id(api_key))
+
+
+async def test_choose_prefers_least_utilized_key(mock_api):
+    pool, adapter = make_pool(mock_api.base_url, ["key-a", "key-b"])
+    await adapter("key-a").admission.acquire()
+    assert pool.choose() is adapter("key-b")
+    await adapter("key-b").admission.acquire()
+    await adapter("key-b").admission.acquire()
+    assert pool.choose() is adapter("key-a")
+
+
+async def test_disabled_keys_are_skipped_until_none_is_left(mock_api):
+    pool, adapter = make_pool(mock_api.base_url, ["key-a", "key-b"])
+    assert pool.disable(adapter("key-a"), 402)
+    assert pool.choose() is adapter("key-b")
+    assert not pool.disable(adapter("key-b"), 400)
+    pool.disable(adapter("key-b"), 401)
+    with pytest.raises(NoHealthyKey):
+        pool.choose()
+
+
+async def test_rate_limited_key_cools_down_but_stays_usable(mock_api):
+    pool, adapter = make_pool(mock_api.base_url, ["key-a", "key-b"])
+    pool.disable(adapter("key-a"), 429, retry_after=30)
+    assert pool.choose() is adapter("key-b")
+    # With every key cooling down, work queues on one rather than failing.
+    pool.disable(adapter("key-b"), 429, retry_after=60)
+    assert pool.choose() is adapter("key-a")
+    assert state(pool, "key-a")["cooling_for"] > 0
+
+
+async def test_failover_to_next_key_on_rejected_submit(start_mock, monkeypatch):
+    mock = start_mock(key_status={"revoked": 401})
+    pool, adapter = make_pool(mock.base_url, ["revoked", "good"])
+    monkeypatch.setattr(main, "key_pool", pool)
+    # Make the revoked key the first choice.
+    await adapter("good").admission.acquire()
+
+    used, (sample, meta) = await main._with_key_failover(lambda a: a.generate("failover"))
+
+    assert used is adapter("good")
+    assert meta["request_id"]
+    assert state(pool, "revoked")["disabled_reason"] == "unauthorized"
+    assert state(pool, "good")["usable"]
+
+
+async def test_coalesced_rejection_disables_the_submitting_key(start_mock, monkeypatch):
+    # A call routed to a healthy key that joins an identical request submitted
+    # with a revoked key must disable the revoked key, not its own, and then
+    # succeed on its own key.
+    mock = start_mock(key_status={"revoked": 401})
+    pool, adapter = make_pool(mock.base_url, ["revoked", "good"], singleflight=SingleFlight())
+    monkeypatch.setattr(main, "key_pool", pool)
+
+    first = asyncio.ensure_future(adapter("revoked").generate("same prompt"))
+    while not adapter("revoked").admission.active:
+        await asyncio.sleep(0)
+    # The revoked key now holds an admission slot, so the pool picks "good",
+    # whose call coalesces onto the request in flight on "revoked".
+    assert pool.choose() is adapter("good")
+    used, (sample, meta) = await main._with_key_failover(lambda a: a.generate("same prompt"))
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await first
+    assert used is adapter("good")
+    assert not meta.get("coalesced")
+    assert state(pool, "good")["usable"]
+    assert state(pool, "revoked")["disabled_reason"] == "unauthorized"
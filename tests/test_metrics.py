@@ -0,0 +1,85 @@
+from mcp.server.fastmcp import Context
+
+from metrics import JobObserver, MetricsRegistry, generation_seconds, polls_per_job, time_to_ready_seconds
+
+
+def test_counter_and_gauge_render():
+    registry = MetricsRegistry()
+    errors = registry.counter("errors_total", "Errors", ("type",))
+    active = registry.gauge("active", "Active jobs")
+    errors.inc(type="Timeout")
+    errors.inc(2, type='say "hi"\n')
+    active.inc()
+    active.inc()
+    active.dec()
+    assert registry.render().splitlines() == [
+        "# HELP errors_total Errors",
+        "# TYPE errors_total counter",
+        'errors_total{type="Timeout"} 1',
+        'errors_total{type="say \\"hi\\"\\n"} 2',
+        "# HELP active Active jobs",
+        "# TYPE active gauge",
+        "active 1",
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    latency = registry.histogram("latency_seconds", "Latency", ("model",), buckets=(1, 2, 4))
+    for value in (0.5, 1.0, 1.5, 3.0, 10.0):
+        latency.observe(value, model="flux-dev")
+    assert registry.render().splitlines()[2:] == [
+        'latency_seconds_bucket{model="flux-dev",le="1"} 2',
+        'latency_seconds_bucket{model="flux-dev",le="2"} 3',
+        'latency_seconds_bucket{model="flux-dev",le="4"} 4',
+        'latency_seconds_bucket{model="flux-dev",le="+Inf"} 5',
+        'latency_seconds_sum{model="flux-dev"} 16',
+        'latency_seconds_count{model="flux-dev"} 5',
+    ]
+
+
+def test_histogram_quantile_interpolates_within_a_bucket():
+    registry = MetricsRegistry()
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(1, 2, 4))
+    assert latency.quantile(0.5, [0, 0, 0, 0]) is None
+    for value in (1.5, 1.5, 3.0, 3.0):
+        latency.observe(value)
+    ((counts, _, _),) = latency.series().values()
+    assert latency.quantile(0.5, counts) == 2.0
+    assert latency.quantile(0.75, counts) == 3.0
+    # Beyond the last bucket the estimate is capped at its bound.
+    latency.observe(100.0)
+    ((counts, _, _),) = latency.series().values()
+    assert latency.quantile(0.99, counts) == 4
+
+
+async def test_job_observer_counts_polls_and_statuses():
+    def count(histogram):
+        return sum(c for (model, *_), (_, _, c) in histogram.series().items() if model == "observer-test")
+
+    forwarded = []
+
+    async def forward(body):
+        forwarded.append(body["status"])
+
+    observer = JobObserver("observer-test", forward)
+    for status in ("Submitted", "Pending", "Pending", "Ready"):
+        await observer({"status": status})
+    observer.finish()
+    assert forwarded == ["Submitted", "Pending", "Pending", "Ready"]
+    assert observer.polls == 3
+    assert count(time_to_ready_seconds) == 1
+    assert polls_per_job.series()[("observer-test",)][1:] == (3.0, 1)
+
+
+async def test_generation_shows_up_in_flux_metrics(server, mock_api):
+    def generations():
+        return sum(c for (model, _), (_, _, c) in generation_seconds.series().items() if model == "flux-schnell")
+
+    before = generations()
+    response = await server.flux_generate(Context(), "metrics", model="flux-schnell")
+    assert response["status"] == "success"
+    assert generations() == before + 1
+    text = await server.flux_metrics()
+    assert 'flux_generation_seconds_count{model="flux-schnell",source="api"}' in text
+    assert 'flux_submit_seconds_count{model="flux-schnell"}' in text
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from flux_adapter import FluxAdapter
+from polling import FixedPollSchedule, LatencyTracker, PollMultiplexer
+
+
+class FakeAdapter:
+    """Becomes ready after `checks` polls per request, recording when each poll ran."""
+
+    def __init__(self, checks=3, poll_seconds=0.0):
+        self.checks = checks
+        self.poll_seconds = poll_seconds
+        self.latency_tracker = LatencyTracker()
+        self.times = []
+        self.in_flight = self.max_in_flight = 0
+        self._counts = {}
+
+    def poll_schedule(self, model):
+        return FixedPollSchedule(0.0)
+
+    async def poll_once(self, polling_url, request_id, on_status=None):
+        self.times.append(asyncio.get_running_loop().time())
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.poll_seconds)
+        finally:
+            self.in_flight -= 1
+        self._counts[request_id] = self._counts.get(request_id, 0) + 1
+        if self._counts[request_id] >= self.checks:
+            return {"id": request_id, "status": "Ready"}, None
+        return None, None
+
+
+async def test_total_rate_stays_under_max_qps():
+    poller, adapter = PollMultiplexer(max_qps=50, max_in_flight=16), FakeAdapter(checks=3)
+    try:
+        results = await asyncio.gather(*(poller.track(adapter, "url", f"r{i}", "flux-dev", 10) for i in range(10)))
+    finally:
+        await poller.stop()
+    assert [r["id"] for r in results] == [f"r{i}" for i in range(10)]
+    assert poller.polls_sent == len(adapter.times) == 30
+    gaps = [b - a for a, b in zip(adapter.times, adapter.times[1:])]
+    assert min(gaps) >= 1 / 50 * 0.9
+    assert adapter.times[-1] - adapter.times[0] >= 29 / 50 * 0.9
+
+
+async def test_concurrent_checks_capped():
+    poller, adapter = PollMultiplexer(max_qps=0, max_in_flight=2), FakeAdapter(checks=1, poll_seconds=0.02)
+    try:
+        await asyncio.gather(*(poller.track(adapter, "url", f"r{i}", "flux-dev", 10) for i in range(6)))
+    finally:
+        await poller.stop()
+    assert adapter.max_in_flight == 2
+
+
+async def test_timeout_and_cancellation():
+    poller, adapter = PollMultiplexer(max_qps=100), FakeAdapter(checks=10 ** 6)
+    try:
+        with pytest.raises(TimeoutError):
+            await poller.track(adapter, "url", "slow", "flux-dev", 0.05)
+        tracked = asyncio.ensure_future(poller.track(adapter, "url", "cancelled", "flux-dev", 10))
+        await asyncio.sleep(0.05)
+        tracked.cancel()
+        await asyncio.gather(tracked, return_exceptions=True)
+        await asyncio.sleep(0.05)
+        assert poller.pending == 0
+    finally:
+        await poller.stop()
+
+
+async def test_adapters_share_the_multiplexer(mock_api):
+    poller = PollMultiplexer(max_qps=10)
+    adapters = [
+        FluxAdapter(model="flux-schnell", use_raw_mode=False, api_key=f"poll-{i}", base_url=mock_api.base_url,
+                    adaptive_polling=False, poller=poller)
+        for i in range(2)
+    ]
+    try:
+        results = await asyncio.gather(*(a.generate({"prompt": f"p{i}"}) for i, a in enumerate(adapters)))
+    finally:
+        await poller.stop()
+    assert all(sample for sample, _ in results)
+    assert poller.polls_sent >= 2
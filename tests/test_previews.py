@@ -0,0 +1,108 @@
+import io
+import random
+
+import pytest
+from mcp.types import CallToolResult
+
+import main
+from previews import PreviewMaker
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def jpeg(width=1024, height=768, noise=False):
+    if noise:
+        rng = random.Random(0)
+        img = Image.frombytes("RGB", (width, height), bytes(rng.getrandbits(8) for _ in range(width * height * 3)))
+    else:
+        img = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    out = io.BytesIO()
+    img.save(out, "JPEG", quality=95)
+    return out.getvalue()
+
+
+@pytest.fixture
+def image_file(tmp_path):
+    path = tmp_path / "image.jpg"
+    path.write_bytes(jpeg())
+    return str(path)
+
+
+async def test_preview_fits_the_budget(image_file):
+    previews = PreviewMaker(max_side=128, max_bytes=4 * 1024)
+    preview = await previews.make("http://unused/sample.jpg", image_file)
+    assert len(preview.data) <= 4 * 1024
+    assert max(preview.width, preview.height) <= 128
+    assert preview.mime_type == "image/jpeg"
+    # Served from the cache by sample URL the second time.
+    assert await previews.make("http://unused/sample.jpg") is preview
+    assert previews.stats()["made"] == 1 and previews.stats()["reused"] == 1
+
+
+async def test_preview_over_budget_is_refused(tmp_path):
+    path = tmp_path / "noise.jpg"
+    path.write_bytes(jpeg(256, 256, noise=True))
+    previews = PreviewMaker(max_side=256, max_bytes=200)
+    with pytest.raises(ValueError, match="200 bytes"):
+        await previews.make("http://unused/noise.jpg", str(path))
+    assert previews.stats()["failures"] == 1 and previews.stats()["cached"] == 0
+
+
+async def test_preview_of_a_downloaded_image(start_mock):
+    image = jpeg()
+    server = start_mock(sample_image=image)
+    url = f"{server.base_url}/samples/one.jpg"
+    preview = await PreviewMaker(max_side=64).make(url)
+    assert max(preview.width, preview.height) == 64
+
+    small = PreviewMaker(max_source_bytes=len(image) - 1)
+    with pytest.raises(ValueError, match="larger than"):
+        await small.make(url)
+    assert small.stats()["bytes_downloaded"] == 0
+
+
+def generation(image_file):
+    return {
+        "status": "success",
+        "image": "http://unused/sample.jpg",
+        "traceback": "not for clients",
+        "meta": {
+            "request_id": "req-1",
+            "model": "flux-dev",
+            "result": {"seed": 42, "sample": "http://unused/sample.jpg", "prompt": "a cat"},
+            "routing": {"model": "flux-dev", "reason": "budget", "estimated_ms": 900, "candidates": []},
+            "artifact": {"path": image_file, "uri": "file:///image.jpg", "bytes": 1, "sha256": "x", "manifest": "m"},
+        },
+    }
+
+
+async def test_compact_response_with_preview(image_file, monkeypatch):
+    monkeypatch.setattr(main, "previews", PreviewMaker(max_side=64))
+    result = await main._respond(generation(image_file), verbose=False, preview=True)
+    assert isinstance(result, CallToolResult)
+    response = result.structuredContent
+    assert "traceback" not in response
+    assert response["meta"] == {
+        "request_id": "req-1",
+        "model": "flux-dev",
+        "preview": response["meta"]["preview"],
+        "seed": 42,
+        "routing": {"model": "flux-dev", "reason": "budget", "estimated_ms": 900},
+        "artifact": {"path": image_file, "uri": "file:///image.jpg", "bytes": 1},
+    }
+    text, image = result.content
+    assert text.type == "text" and image.type == "image" and image.mimeType == "image/jpeg"
+    assert response["meta"]["preview"]["width"] == 64
+
+
+async def test_verbose_response_without_preview(image_file):
+    response = await main._respond(generation(image_file), verbose=True, preview=False)
+    assert response == generation(image_file)
+
+
+async def test_failed_preview_does_not_fail_the_call(image_file, monkeypatch):
+    monkeypatch.setattr(main, "previews", PreviewMaker(max_bytes=10))
+    response = await main._respond(generation(image_file), verbose=False, preview=True)
+    assert isinstance(response, dict)
+    assert response["status"] == "success"
+    assert response["meta"]["preview_error"].startswith("ValueError")
@@ -0,0 +1,21 @@
+async def test_repeated_status_is_reported_once(server, ctx):
+    report = server._progress_reporter(ctx)
+    await report({"status": "Pending"})
+    await report({"status": "Pending"})
+    await report({"status": "Processing", "progress": 0.5})
+    await report({"status": "Processing", "progress": 0.5})
+    await report({"status": "Processing", "progress": 0.75})
+    messages = [message for _, _, message in ctx.progress]
+    assert [m.split(" after ")[0] for m in messages] == ["Pending", "Processing", "Processing"]
+    assert messages[1].endswith("(progress: 0.5)") and messages[2].endswith("(progress: 0.75)")
+    elapsed = [progress for progress, _, _ in ctx.progress]
+    assert elapsed == sorted(elapsed)
+    assert all(total is None for _, total, _ in ctx.progress)
+
+
+async def test_generation_reports_bfl_statuses_as_progress(server, mock_api, ctx, monkeypatch):
+    monkeypatch.setattr(mock_api, "processing_time", lambda model: 1.0)
+    response = await server.flux_generate(ctx, "progress", model="flux-schnell")
+    assert response["status"] == "success"
+    statuses = [message.split(" after ")[0] for _, _, message in ctx.progress]
+    assert statuses == ["Submitted", "Pending", "Ready"]
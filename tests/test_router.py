@@ -0,0 +1,54 @@
+import pytest
+
+from polling import LatencyTracker
+from router import ModelRouter
+
+
+def test_without_observations_the_priors_decide():
+    router = ModelRouter(LatencyTracker())
+    decision = router.choose()
+    assert decision["model"] == "flux-pro-1.1" and decision["reason"] == "preferred model"
+    assert {c["source"] for c in decision["candidates"].values()} == {"prior"}
+    assert router.choose(quality="draft")["candidates"].keys() == {"flux-schnell"}
+    with pytest.raises(ValueError, match="Unknown quality"):
+        router.choose(quality="best")
+
+
+def test_budget_falls_back_to_a_faster_model():
+    router = ModelRouter(LatencyTracker())
+    decision = router.choose(latency_budget_ms=5000)
+    assert decision["model"] == "flux-schnell"
+    assert decision["reason"].startswith("flux-pro-1.1 estimated at")
+    assert decision["latency_budget_ms"] == 5000
+
+    decision = router.choose(latency_budget_ms=100)
+    assert decision["model"] == "flux-schnell"
+    assert decision["reason"].startswith("no model fits the 100ms budget")
+
+
+def test_queue_wait_counts_against_the_budget():
+    router = ModelRouter(LatencyTracker())
+    assert router.choose(latency_budget_ms=9500)["model"] == "flux-pro-1.1"
+    decision = router.choose(latency_budget_ms=9500, queue_wait=5.0)
+    assert decision["model"] == "flux-schnell" and decision["queue_wait_ms"] == 5000
+
+
+def test_observed_times_replace_the_prior():
+    tracker = LatencyTracker()
+    for seconds in (1.0, 2.0, 3.0, 4.0, 5.0):
+        tracker.record("flux-pro-1.1", seconds)
+    router = ModelRouter(tracker)
+    assert router.estimate("flux-pro-1.1") == {"ready_s": 5.0, "source": "observed", "slow": False}
+    assert router.choose(latency_budget_ms=6000)["model"] == "flux-pro-1.1"
+
+
+def test_slow_model_is_skipped_without_a_budget():
+    tracker = LatencyTracker()
+    for _ in range(40):
+        tracker.record("flux-pro-1.1", 5.0)
+    for _ in range(20):
+        tracker.record("flux-pro-1.1", 20.0)
+    decision = ModelRouter(tracker).choose()
+    assert decision["candidates"]["flux-pro-1.1"]["slow"]
+    assert decision["model"] == "flux-dev"
+    assert decision["reason"] == "flux-pro-1.1 is running slow; fell back to flux-dev"
@@ -0,0 +1,68 @@
+import pytest
+
+from admission import AdmissionController
+from scheduler import PRIORITIES, FairQueue
+
+
+def drain(queue):
+    order = []
+    while (ticket := queue.pop()) is not None:
+        order.append((ticket.priority, ticket.client))
+    return order
+
+
+def test_interactive_is_admitted_before_bulk():
+    queue = FairQueue()
+    queue.push("bulk", "a")
+    queue.push("interactive", "b")
+    queue.push("bulk", "a")
+    assert drain(queue) == [("interactive", "b"), ("bulk", "a"), ("bulk", "a")]
+    assert queue.stats()["overtaken"]["bulk"] == 1
+
+
+def test_clients_alternate_by_weight():
+    queue = FairQueue(weights={"heavy": 2})
+    for _ in range(4):
+        queue.push("interactive", "many")
+    for _ in range(4):
+        queue.push("interactive", "heavy")
+    queue.push("interactive", "one")
+    order = [client for _, client in drain(queue)]
+    # Tickets are spaced 1/weight apart in virtual time: the single request
+    # is not stuck behind the backlogs, and "heavy" gets two turns per turn
+    # of "many" while both have work queued.
+    assert order == ["heavy", "many", "heavy", "one", "heavy", "many", "heavy", "many", "many"]
+
+
+def test_bulk_ticket_goes_first_once_aged():
+    queue = FairQueue(max_wait=30)
+    old = queue.push("bulk", "a")
+    old.enqueued_at -= 60
+    queue.push("interactive", "b")
+    assert drain(queue) == [("bulk", "a"), ("interactive", "b")]
+
+
+def test_discarded_tickets_are_skipped():
+    queue = FairQueue()
+    gone = queue.push("interactive", "a")
+    queue.push("interactive", "b")
+    queue.discard(gone)
+    assert len(queue) == 1
+    assert drain(queue) == [("interactive", "b")]
+
+
+def test_unknown_priority():
+    with pytest.raises(ValueError):
+        FairQueue().push("urgent", "a")
+
+
+async def test_admitted_tickets_are_not_retained():
+    admission = AdmissionController(rate=1e9, burst=10, max_active=10)
+    for i in range(10_000):
+        await admission.acquire(PRIORITIES[i % 2], f"client-{i % 7}")
+        admission.release()
+    queue = admission._queue
+    assert len(queue) == 0
+    for priority in PRIORITIES:
+        assert len(queue._arrivals[priority]) == 0
+        assert len(queue._heaps[priority]) == 0
@@ -0,0 +1,106 @@
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+
+from admission import AdmissionController
+from shared import SharedState
+
+
+@pytest.fixture
+def workers(tmp_path):
+    """Two SharedStates on one file, as two worker processes would have."""
+    states = [SharedState(str(tmp_path / "state.sqlite3"), lease=30) for _ in range(2)]
+    for state in states:
+        state.heartbeat()
+    yield states
+    for state in states:
+        state.close()
+
+
+def controller(state, **kwargs):
+    kwargs.setdefault("rate", 1000)
+    kwargs.setdefault("burst", 1000)
+    return AdmissionController(shared=state.limits("key-1"), **kwargs)
+
+
+async def test_active_limit_holds_across_workers(workers):
+    a, b = controller(workers[0], max_active=2), controller(workers[1], max_active=2)
+    await a.acquire()
+    await a.acquire()
+    waiting = asyncio.ensure_future(b.acquire())
+    await asyncio.sleep(0.3)
+    assert not waiting.done()
+
+    a.release()
+    await asyncio.wait_for(waiting, 2)
+    assert (a.active, b.active) == (1, 1)
+    assert workers[0].snapshot("key-1", 1000, 1000)["active"] == 2
+
+
+async def test_release_survives_a_failing_store(workers, monkeypatch):
+    admission = controller(workers[0], max_active=1)
+    await admission.acquire()
+    waiting = asyncio.ensure_future(admission.acquire())
+    await asyncio.sleep(0.05)
+
+    add_active = workers[0].add_active
+    failures = []
+
+    def flaky(key, delta):
+        if not failures:
+            failures.append(delta)
+            raise sqlite3.OperationalError("database is locked")
+        add_active(key, delta)
+
+    monkeypatch.setattr(workers[0], "add_active", flaky)
+    admission.release()
+    assert admission.active == 0
+
+    # The slot reaches the store on the retry, and the queued caller gets it.
+    await asyncio.wait_for(waiting, 3)
+    assert failures and admission.store_errors >= 1
+    assert admission.active == 1
+    assert workers[0].snapshot("key-1", 1000, 1000)["active"] == 1
+
+
+async def test_store_is_not_called_on_the_event_loop(workers, monkeypatch):
+    admission = controller(workers[0], max_active=4)
+    loop_thread = threading.get_ident()
+    calls = []
+    for name in ("take", "add_active", "pause", "snapshot"):
+        method = getattr(workers[0], name)
+
+        def record(*args, _method=method, _name=name):
+            calls.append((_name, threading.get_ident()))
+            return _method(*args)
+
+        monkeypatch.setattr(workers[0], name, record)
+
+    await admission.acquire()
+    admission.throttle(0.01)
+    admission.paused_for()
+    admission.estimated_wait()
+    admission.stats()
+    admission.release()
+    await asyncio.sleep(0.1)
+
+    assert {name for name, _ in calls} == {"take", "add_active", "pause", "snapshot"}
+    assert all(thread != loop_thread for _, thread in calls)
+
+
+async def test_pause_reaches_other_workers(workers):
+    a, b = controller(workers[0]), controller(workers[1])
+    a.throttle(5)
+    await asyncio.sleep(0.1)
+    b.paused_for()
+    await asyncio.sleep(0.1)
+    assert 4 < b.paused_for() <= 5
+
+
+async def test_zero_rate_across_workers(workers):
+    first, second = (controller(w, rate=0, burst=1, max_active=10) for w in workers)
+    for _ in range(3):
+        await asyncio.wait_for(first.acquire(), 1)
+        await asyncio.wait_for(second.acquire(), 1)
@@ -0,0 +1,101 @@
+import random
+import threading
+import time
+
+import pytest
+
+from similar import PromptIndex, jaccard, prompt_tokens
+
+PARAMS = {"width": 1024, "height": 1024, "seed": 7}
+
+
+def payload(prompt, **params):
+    return {"prompt": prompt, **PARAMS, **params}
+
+
+def add(index, key, prompt, **params):
+    index.add(key, "flux-dev", payload(prompt, **params), f"http://samples/{key}.jpg", {"request_id": key})
+
+
+def test_prompt_tokens_ignore_case_punctuation_and_order():
+    assert prompt_tokens("A simple, RED circle.") == prompt_tokens("circle red simple a")
+    assert jaccard(prompt_tokens("a red circle"), prompt_tokens("A simple red circle.")) == 0.75
+
+
+def test_threshold():
+    index = PromptIndex()
+    add(index, "k1", "a red circle")
+    sample, meta, score, prompt = index.lookup("flux-dev", payload("A simple red circle."), 0.7)
+    assert (sample, meta, score, prompt) == ("http://samples/k1.jpg", {"request_id": "k1"}, 0.75, "a red circle")
+    assert index.lookup("flux-dev", payload("A simple red circle."), 0.8) is None
+    assert index.stats()["hits"] == 1 and index.stats()["misses"] == 1
+
+
+def test_other_parameters_and_input_images_never_match():
+    index = PromptIndex()
+    add(index, "k1", "a red circle")
+    assert index.lookup("flux-dev", payload("a red circle", seed=8), 0.5) is None
+    assert index.lookup("flux-pro-1.1", payload("a red circle"), 0.5) is None
+    assert index.lookup("flux-dev", payload("a red circle", input_image="data:..."), 0.5) is None
+    add(index, "k2", "a blue square", input_image="data:...")
+    assert index.stats()["entries"] == 1
+
+
+def test_recall_of_near_duplicates():
+    rng = random.Random(3)
+    vocabulary = [f"w{i}" for i in range(5000)]
+    index = PromptIndex()
+    prompts = []
+    for i in range(2000):
+        words = rng.sample(vocabulary, rng.randint(8, 16))
+        prompts.append(words)
+        add(index, f"k{i}", " ".join(words))
+
+    found = 0
+    for i in rng.sample(range(len(prompts)), 200):
+        words = list(prompts[i])
+        rng.shuffle(words)
+        words[0] = "replaced"
+        result = index.lookup("flux-dev", payload(" ".join(words)), 0.7)
+        if result is not None and result[0] == f"http://samples/k{i}.jpg":
+            found += 1
+        elif result is not None:
+            pytest.fail("a near-duplicate matched another prompt")
+    assert found >= 190
+    fresh = " ".join(rng.sample([f"x{i}" for i in range(100)], 12))
+    assert index.lookup("flux-dev", payload(fresh), 0.5) is None
+
+
+def test_oldest_entries_are_evicted_beyond_max_entries():
+    index = PromptIndex(max_entries=100)
+    for i in range(1000):  # compaction runs every 1000 adds
+        add(index, f"k{i}", f"prompt number {i}")
+    assert index.stats()["entries"] == 100
+    assert index.lookup("flux-dev", payload("prompt number 0"), 1.0) is None
+    assert index.lookup("flux-dev", payload("prompt number 999"), 1.0)[0] == "http://samples/k999.jpg"
+
+
+def test_expiry_and_downloaded_images(tmp_path, monkeypatch):
+    index = PromptIndex(ttl=60)
+    image = tmp_path / "kept.jpg"
+    image.write_bytes(b"jpeg")
+    add(index, "expiring", "a red circle")
+    index.add("kept", "flux-dev", payload("a blue square"), "http://samples/kept.jpg",
+              {"artifact": {"path": str(image)}})
+    later = time.time() + 120
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert index.lookup("flux-dev", payload("a red circle"), 1.0) is None
+    assert index.lookup("flux-dev", payload("a blue square"), 1.0)[0] == "http://samples/kept.jpg"
+    image.unlink()
+    assert index.lookup("flux-dev", payload("a blue square"), 1.0) is None
+
+
+async def test_async_calls_run_off_the_event_loop(monkeypatch):
+    index = PromptIndex()
+    threads = []
+    for name in ("add", "lookup"):
+        method = getattr(index, name)
+        monkeypatch.setattr(index, name, lambda *a, _m=method: (threads.append(threading.current_thread()), _m(*a))[1])
+    await index.aadd("k1", "flux-dev", payload("a red circle"), "http://samples/k1.jpg", {})
+    assert (await index.alookup("flux-dev", payload("a red circle"), 1.0))[0] == "http://samples/k1.jpg"
+    assert len(threads) == 2 and threading.main_thread() not in threads
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+async def test_concurrent_callers_share_one_call():
+    flights, calls = SingleFlight(), []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    results = await asyncio.gather(*(flights.do("k", work) for _ in range(5)))
+    assert results == [("result", False)] + [("result", True)] * 4
+    assert len(calls) == 1
+    assert flights.stats() == {"in_flight": 0, "started": 1, "coalesced": 4}
+    # Once finished, the next caller starts a new call.
+    await flights.do("k", work)
+    assert len(calls) == 2
+
+
+async def test_cancelled_waiter_leaves_the_call_running_for_others():
+    flights, release = SingleFlight(), asyncio.Event()
+
+    async def work():
+        await release.wait()
+        return "done"
+
+    first = asyncio.ensure_future(flights.do("k", work))
+    second = asyncio.ensure_future(flights.do("k", work))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+    assert flights.in_flight == 1
+    release.set()
+    assert await second == ("done", True)
+    assert first.cancelled()
+
+
+async def test_cancelling_the_last_waiter_cancels_the_call():
+    flights, cancelled = SingleFlight(), asyncio.Event()
+
+    async def work():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    caller = asyncio.ensure_future(flights.do("k", work))
+    await asyncio.sleep(0)
+    caller.cancel()
+    await asyncio.wait_for(cancelled.wait(), 1)
+    await asyncio.sleep(0)
+    assert flights.in_flight == 0
+
+
+async def test_exceptions_reach_every_waiter():
+    flights = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    results = await asyncio.gather(*(flights.do("k", work) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(r, ValueError) for r in results)
+    assert flights.in_flight == 0
+    with pytest.raises(ValueError):
+        await flights.do("k", work)
+
+
+async def test_caller_joining_while_the_call_is_cancelled_starts_a_new_one():
+    flights, calls = SingleFlight(), []
+
+    async def work():
+        calls.append(1)
+        try:
+            await asyncio.sleep(10 if len(calls) == 1 else 0)
+        except asyncio.CancelledError:
+            # Cleanup that takes a moment, like closing a connection.
+            await asyncio.sleep(0.01)
+            raise
+        return "fresh"
+
+    first = asyncio.ensure_future(flights.do("k", work))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+    assert await flights.do("k", work) == ("fresh", False)
+    assert len(calls) == 2
+    await asyncio.gather(first, return_exceptions=True)
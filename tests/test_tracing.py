@@ -0,0 +1,64 @@
+import json
+
+from tracing import Timeline, TraceLog
+
+
+def timeline(*events):
+    t = Timeline("flux-dev")
+    t.events = [{"t_ms": t_ms, "event": event, **fields} for t_ms, event, fields in events]
+    return t
+
+
+def test_phases_from_events():
+    t = timeline(
+        (0.0, "queued", {}),
+        (5.0, "admitted", {}),
+        (6.0, "post_start", {}),
+        (106.0, "post_end", {}),
+        (600.0, "poll", {"status": "Pending"}),
+        (1100.0, "poll", {"status": "Pending"}),
+        (1600.0, "poll", {"status": "Processing"}),
+        (2600.0, "poll", {"status": "Ready"}),
+        (2600.0, "ready", {}),
+        (2610.0, "download_start", {}),
+        (2710.0, "download_end", {}),
+    )
+    assert t.phases() == {
+        "queue_ms": 5.0,
+        "submit_ms": 100.0,
+        "wait_ms": 2494.0,
+        "download_ms": 100.0,
+        "pending_ms": 1000.0,
+        "processing_ms": 1000.0,
+        "total_ms": 2710.0,
+    }
+    assert t.to_dict()["events"] == t.events
+
+
+async def test_status_recorder_marks_polls_and_forwards():
+    forwarded = []
+
+    async def forward(body):
+        forwarded.append(body)
+
+    t = Timeline("flux-dev")
+    record = t.status_recorder(forward)
+    await record({"status": "Submitted"})
+    await record({"status": "Processing", "progress": 0.4})
+    assert len(forwarded) == 2
+    assert [(e["event"], e["status"], e["progress"]) for e in t.events] == [("poll", "Processing", 0.4)]
+
+
+def test_trace_log_rotates(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    log = TraceLog(str(path), max_bytes=100, backups=2)
+    for i in range(11):
+        log.write({"request": i, "padding": "x" * 20})
+    log.close()
+    assert log.written == 11
+    files = sorted(p.name for p in tmp_path.iterdir())
+    assert files == ["traces.jsonl", "traces.jsonl.1", "traces.jsonl.2"]
+    records = [json.loads(line) for name in reversed(files) for line in (tmp_path / name).read_text().splitlines()]
+    requests = [r["request"] for r in records]
+    # The oldest lines were rotated out; what is kept is in order.
+    assert requests == list(range(3, 11))